@@ -0,0 +1,218 @@
+"""
+Per-workspace task aggregates.
+
+The aggregate tables (WorkspaceColumnStats, WorkspaceDueDateStats and
+WorkspaceWeeklyCompletions) are kept up to date by SQLite triggers on the
+task table, so every write path - the API handlers, populate.py or a raw
+UPDATE - moves the counters in the same transaction as the task row.
+Reading the analytics for a workspace is then a handful of small indexed
+lookups instead of a scan over every task.
+
+rebuild_analytics() recomputes the tables from scratch. It pulls the few
+task columns it needs in a single query, transposes them into plain Python
+lists and aggregates column by column. It also runs as the
+"rebuild_analytics" job, for callers that should not wait for it.
+"""
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, text
+from sqlmodel import Session, delete, select
+
+from jobs import handler
+from models import (
+    StatusColumn, Task, Workflow,
+    WorkspaceColumnStats, WorkspaceDueDateStats, WorkspaceWeeklyCompletions,
+    ksa_now
+)
+
+TRACKED_TASK_COLUMNS = (
+    "workflow_id", "column_id", "due_date", "estimated_hours", "actual_hours", "completed_at", "deleted_at"
+)
+
+
+def _apply_task(row: str, sign: int) -> str:
+    """SQL that adds (sign=1) or removes (sign=-1) one task row's contribution; none for a trashed task"""
+    return f"""
+    INSERT INTO workspacecolumnstats (workspace_id, column_id, task_count, open_count, estimated_hours, actual_hours)
+    SELECT workspace_id, {row}.column_id, {sign}, {sign} * ({row}.completed_at IS NULL),
+           {sign} * COALESCE({row}.estimated_hours, 0), {sign} * COALESCE({row}.actual_hours, 0)
+    FROM workflow WHERE id = {row}.workflow_id AND {row}.deleted_at IS NULL
+    ON CONFLICT (workspace_id, column_id) DO UPDATE SET
+        task_count = task_count + excluded.task_count,
+        open_count = open_count + excluded.open_count,
+        estimated_hours = estimated_hours + excluded.estimated_hours,
+        actual_hours = actual_hours + excluded.actual_hours;
+
+    INSERT INTO workspaceduedatestats (workspace_id, due_date, open_count)
+    SELECT workspace_id, {row}.due_date, {sign}
+    FROM workflow WHERE id = {row}.workflow_id AND {row}.deleted_at IS NULL
+        AND {row}.due_date IS NOT NULL AND {row}.completed_at IS NULL
+    ON CONFLICT (workspace_id, due_date) DO UPDATE SET
+        open_count = open_count + excluded.open_count;
+
+    INSERT INTO workspaceweeklycompletions (workspace_id, week_start, completed_count)
+    SELECT workspace_id, date({row}.completed_at, '-6 days', 'weekday 1'), {sign}
+    FROM workflow WHERE id = {row}.workflow_id AND {row}.deleted_at IS NULL AND {row}.completed_at IS NOT NULL
+    ON CONFLICT (workspace_id, week_start) DO UPDATE SET
+        completed_count = completed_count + excluded.completed_count;
+    """
+
+
+ANALYTICS_TRIGGERS = {
+    "task_analytics_insert": f"""
+        CREATE TRIGGER task_analytics_insert AFTER INSERT ON task
+        BEGIN {_apply_task("NEW", 1)} END
+    """,
+    "task_analytics_delete": f"""
+        CREATE TRIGGER task_analytics_delete AFTER DELETE ON task
+        BEGIN {_apply_task("OLD", -1)} END
+    """,
+    "task_analytics_update": f"""
+        CREATE TRIGGER task_analytics_update AFTER UPDATE OF {", ".join(TRACKED_TASK_COLUMNS)} ON task
+        BEGIN {_apply_task("OLD", -1)} {_apply_task("NEW", 1)} END
+    """,
+}
+
+
+def install_analytics(engine):
+    """(Re)create the aggregate triggers and backfill the tables on first run"""
+    if engine.dialect.name != "sqlite":
+        return
+
+    with Session(engine) as session:
+        for name, ddl in ANALYTICS_TRIGGERS.items():
+            session.exec(text(f"DROP TRIGGER IF EXISTS {name}"))
+            session.exec(text(ddl))
+        session.commit()
+
+        has_stats = session.exec(select(WorkspaceColumnStats).limit(1)).first()
+        has_tasks = session.exec(select(Task.id).limit(1)).first()
+        if has_tasks and not has_stats:
+            rebuild_analytics(session)
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def rebuild_analytics(session: Session, workspace_id: Optional[int] = None):
+    """Recompute the aggregate tables, for one workspace or all of them"""
+    query = select(
+        Workflow.workspace_id, Task.column_id, Task.due_date,
+        Task.completed_at, Task.estimated_hours, Task.actual_hours
+    ).join(Workflow, Task.workflow_id == Workflow.id).where(Task.deleted_at.is_(None))
+
+    if workspace_id is not None:
+        query = query.where(Workflow.workspace_id == workspace_id)
+
+    rows = session.exec(query).all()
+    workspaces, columns, due_dates, completed, estimated, actual = (
+        [list(col) for col in zip(*rows)] if rows else [[] for _ in range(6)]
+    )
+
+    column_keys = list(zip(workspaces, columns))
+    is_open = [c is None for c in completed]
+
+    task_count = Counter(column_keys)
+    open_count = Counter(key for key, o in zip(column_keys, is_open) if o)
+    estimated_sum = defaultdict(float)
+    actual_sum = defaultdict(float)
+    for key, hours in zip(column_keys, estimated):
+        estimated_sum[key] += hours or 0.0
+    for key, hours in zip(column_keys, actual):
+        actual_sum[key] += hours or 0.0
+
+    due_open = Counter(
+        (ws, due) for ws, due, o in zip(workspaces, due_dates, is_open) if o and due is not None
+    )
+    weekly = Counter(
+        (ws, week_start(done.date() if isinstance(done, datetime) else done))
+        for ws, done in zip(workspaces, completed) if done is not None
+    )
+
+    for table in (WorkspaceColumnStats, WorkspaceDueDateStats, WorkspaceWeeklyCompletions):
+        statement = delete(table)
+        if workspace_id is not None:
+            statement = statement.where(table.workspace_id == workspace_id)
+        session.exec(statement)
+
+    session.add_all(
+        WorkspaceColumnStats(
+            workspace_id=ws, column_id=column_id, task_count=count,
+            open_count=open_count[(ws, column_id)],
+            estimated_hours=estimated_sum[(ws, column_id)],
+            actual_hours=actual_sum[(ws, column_id)]
+        )
+        for (ws, column_id), count in task_count.items()
+    )
+    session.add_all(
+        WorkspaceDueDateStats(workspace_id=ws, due_date=due, open_count=count)
+        for (ws, due), count in due_open.items()
+    )
+    session.add_all(
+        WorkspaceWeeklyCompletions(workspace_id=ws, week_start=week, completed_count=count)
+        for (ws, week), count in weekly.items()
+    )
+    session.commit()
+
+
+@handler("rebuild_analytics")
+def rebuild_analytics_job(session: Session, payload: dict):
+    rebuild_analytics(session, payload.get("workspace_id"))
+
+
+def workspace_analytics(session: Session, workspace_id: int, weeks: int = 12) -> dict:
+    """Read the precomputed aggregates of a workspace"""
+    today = ksa_now().date()
+
+    column_rows = session.exec(
+        select(WorkspaceColumnStats, StatusColumn.name)
+        .join(StatusColumn, WorkspaceColumnStats.column_id == StatusColumn.id, isouter=True)
+        .where(WorkspaceColumnStats.workspace_id == workspace_id, WorkspaceColumnStats.task_count > 0)
+        .order_by(StatusColumn.position)
+    ).all()
+
+    columns = [
+        {
+            "column_id": stats.column_id,
+            "name": name,
+            "task_count": stats.task_count,
+            "open_count": stats.open_count,
+            "estimated_hours": round(stats.estimated_hours, 2),
+            "actual_hours": round(stats.actual_hours, 2)
+        }
+        for stats, name in column_rows
+    ]
+
+    overdue = session.exec(
+        select(func.coalesce(func.sum(WorkspaceDueDateStats.open_count), 0))
+        .where(WorkspaceDueDateStats.workspace_id == workspace_id, WorkspaceDueDateStats.due_date < today)
+    ).one()
+
+    completions = session.exec(
+        select(WorkspaceWeeklyCompletions)
+        .where(
+            WorkspaceWeeklyCompletions.workspace_id == workspace_id,
+            WorkspaceWeeklyCompletions.week_start > week_start(today) - timedelta(weeks=weeks)
+        )
+        .order_by(WorkspaceWeeklyCompletions.week_start)
+    ).all()
+
+    return {
+        "workspace_id": workspace_id,
+        "generated_at": ksa_now(),
+        "columns": columns,
+        "totals": {
+            "task_count": sum(c["task_count"] for c in columns),
+            "open_count": sum(c["open_count"] for c in columns),
+            "estimated_hours": round(sum(c["estimated_hours"] for c in columns), 2),
+            "actual_hours": round(sum(c["actual_hours"] for c in columns), 2)
+        },
+        "overdue_tasks": overdue,
+        "completions_per_week": [
+            {"week_start": row.week_start, "completed": row.completed_count}
+            for row in completions if row.completed_count > 0
+        ]
+    }
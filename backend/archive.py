@@ -0,0 +1,369 @@
+"""
+Workspace export and import as a streaming zip archive.
+
+An archive holds one deflated NDJSON member per table, `tables/<table>.ndjson`,
+each line being a row with its original ids. Attachment blobs are stored as
+`files/<attachment id>`, and `manifest.json` at the end carries the format
+version and row counts.
+
+export_workspace() is a generator. It reads each table with yield_per
+batches inside one read transaction, so the archive is a consistent snapshot
+that does not block writers under WAL. The rows go through a zipfile writer
+onto a sink that is drained after every batch, so memory stays at one batch
+plus one file chunk whatever the workspace size. Served from a
+StreamingResponse, each step runs in the threadpool, off the event loop.
+
+import_workspace() loads an archive through bulk_loader.BulkLoader and gives
+every row a fresh id. Foreign keys are remapped from the table metadata.
+Members are matched to existing accounts by email, and status templates by
+name (their columns by position).
+"""
+import json
+import re
+import shutil
+import uuid
+import zipfile
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+from sqlalchemy import or_, select, union
+
+from bulk_loader import BulkLoader, chunks
+from serializers import dumps
+from models import (
+    ActivityLog, Attachment, ChatMessage, Member, StatusColumn, StatusTemplate, Subtask, Task, TaskDependency,
+    TaskMemberLink, Workflow, WorkflowDailySnapshot, WorkflowMemberLink, Workspace, WorkspaceMemberLink
+)
+
+ARCHIVE_FORMAT = "workspaceflow-archive"
+ARCHIVE_VERSION = 1
+MEDIA_TYPE = "application/zip"
+EXPORT_BATCH = 1000
+FILE_CHUNK = 1024 * 1024
+
+# Tables whose ids other rows point at; the rest get autoincremented ids on import
+REMAPPED_TABLES = ("member", "statustemplate", "statuscolumn", "workspace", "workflow", "task")
+# ActivityLog.entity_id is a plain integer whose table depends on entity_type
+ENTITY_TABLES = {"workspace": "workspace", "workflow": "workflow", "task": "task"}
+# Attachment extensions kept on import; anything else is dropped from the stored name
+SAFE_EXTENSION = re.compile(r"\.[A-Za-z0-9]{1,16}")
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+class _StreamSink:
+    """Write-only file object for zipfile, drained by the generator between yields"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _export_plan(workspace_id: int) -> list:
+    """(model, where clause) for every table in a workspace archive, in import order"""
+    workflow_ids = select(Workflow.id).where(Workflow.workspace_id == workspace_id)
+    task_ids = select(Task.id).where(Task.workflow_id.in_(workflow_ids))
+    template_ids = select(StatusColumn.template_id).where(
+        StatusColumn.id.in_(select(Task.column_id).where(Task.workflow_id.in_(workflow_ids)))
+    )
+    plan = [
+        (StatusTemplate, StatusTemplate.id.in_(template_ids)),
+        (StatusColumn, StatusColumn.template_id.in_(template_ids)),
+        (Workspace, Workspace.id == workspace_id),
+        (WorkspaceMemberLink, WorkspaceMemberLink.workspace_id == workspace_id),
+        (Workflow, Workflow.workspace_id == workspace_id),
+        (WorkflowMemberLink, WorkflowMemberLink.workflow_id.in_(workflow_ids)),
+        (Task, Task.workflow_id.in_(workflow_ids)),
+        (TaskMemberLink, TaskMemberLink.task_id.in_(task_ids)),
+        (TaskDependency, TaskDependency.successor_id.in_(task_ids) & TaskDependency.predecessor_id.in_(task_ids)),
+        (Subtask, Subtask.task_id.in_(task_ids)),
+        (ChatMessage, ChatMessage.task_id.in_(task_ids)),
+        (Attachment, Attachment.task_id.in_(task_ids)),
+        (ActivityLog, or_(ActivityLog.workspace_id == workspace_id, ActivityLog.task_id.in_(task_ids))),
+        (WorkflowDailySnapshot, WorkflowDailySnapshot.workflow_id.in_(workflow_ids)),
+    ]
+    # Every member any exported row points at, found through the foreign keys
+    member_ids = union(*(
+        select(column).where(condition)
+        for model, condition in plan
+        for column in model.__table__.columns
+        if any(key.column.table is Member.__table__ for key in column.foreign_keys)
+    ))
+    return [(Member, Member.id.in_(member_ids))] + plan
+
+
+def _python_type(column):
+    # TypeDecorators such as SQLModel's UTCDateTime only know their type through impl
+    try:
+        return getattr(column.type, "impl", column.type).python_type
+    except NotImplementedError:
+        return None
+
+
+def export_workspace(engine, workspace_id: int) -> Iterator[bytes]:
+    """Yield the zip archive of a workspace chunk by chunk"""
+    sink = _StreamSink()
+    counts, missing_files = {}, []
+    with engine.connect() as connection, zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        if engine.dialect.name == "sqlite":
+            # pysqlite would run every SELECT in its own implicit snapshot
+            connection.exec_driver_sql("BEGIN")
+
+        plan = _export_plan(workspace_id)
+        for model, condition in plan:
+            table = model.__table__
+            counts[table.name] = 0
+            query = select(table).where(condition).execution_options(yield_per=EXPORT_BATCH)
+            with archive.open(f"tables/{table.name}.ndjson", "w", force_zip64=True) as member:
+                result = connection.execute(query)
+                keys = list(result.keys())
+                for rows in result.partitions():
+                    member.write(b"".join(dumps(dict(zip(keys, row))) + b"\n" for row in rows))
+                    counts[table.name] += len(rows)
+                    yield sink.drain()
+
+        attachments = select(Attachment.id, Attachment.file_path).where(dict(plan)[Attachment])
+        for attachment_id, file_path in connection.execute(attachments.execution_options(yield_per=EXPORT_BATCH)):
+            path = Path(file_path)
+            if not path.is_file():
+                missing_files.append(attachment_id)
+                continue
+            info = zipfile.ZipInfo(f"files/{attachment_id}", datetime.now(timezone.utc).timetuple()[:6])
+            # Uploads are usually compressed already
+            info.compress_type = zipfile.ZIP_STORED
+            with path.open("rb") as source, archive.open(info, "w", force_zip64=True) as member:
+                while chunk := source.read(FILE_CHUNK):
+                    member.write(chunk)
+                    yield sink.drain()
+
+        archive.writestr("manifest.json", json.dumps({
+            "format": ARCHIVE_FORMAT,
+            "version": ARCHIVE_VERSION,
+            "workspace_id": workspace_id,
+            "exported_at": datetime.now(timezone.utc).isoformat(),
+            "tables": counts,
+            "missing_files": missing_files,
+        }, indent=2))
+        connection.rollback()
+    yield sink.drain()
+
+
+class _Importer:
+    def __init__(self, loader: BulkLoader, archive: zipfile.ZipFile, upload_dir: Path, written_files: List[Path]):
+        self.loader = loader
+        self.connection = loader.connection
+        self.archive = archive
+        self.upload_dir = upload_dir
+        self.written_files = written_files
+        self.ids: Dict[str, Dict[int, int]] = {name: {} for name in REMAPPED_TABLES}
+        self.task_workflow: Dict[int, int] = {}
+
+    def rows(self, table) -> Iterator[dict]:
+        """Decoded rows of a table, limited to the columns this schema has"""
+        name = f"tables/{table.name}.ndjson"
+        if name not in self.archive.NameToInfo:
+            return
+        parsers = {}
+        for column in table.columns:
+            python_type = _python_type(column)
+            if python_type is datetime:
+                parsers[column.name] = datetime.fromisoformat
+            elif python_type is date:
+                parsers[column.name] = date.fromisoformat
+        with self.archive.open(name) as source:
+            for line in source:
+                row = json.loads(line)
+                yield {
+                    key: parsers[key](value) if value is not None and key in parsers else value
+                    for key, value in row.items() if key in table.columns
+                }
+
+    def remap(self, table, row: dict) -> dict:
+        for column in table.columns:
+            value = row.get(column.name)
+            for key in column.foreign_keys:
+                mapping = self.ids.get(key.column.table.name)
+                if value is None or mapping is None:
+                    continue
+                if value not in mapping:
+                    if not column.nullable:
+                        raise ArchiveError(f"{table.name}.{column.name} points at {key.column.table.name} {value}, "
+                                           f"which is not in the archive")
+                    row[column.name] = None
+                else:
+                    row[column.name] = mapping[value]
+        return row
+
+    def assign_ids(self, model, rows: List[dict]):
+        mapping = self.ids[model.__tablename__]
+        next_id = self.loader.next_id(model)
+        for row in rows:
+            mapping[row["id"]] = row["id"] = next_id
+            next_id += 1
+
+    def import_members(self):
+        for batch in chunks(self.rows(Member.__table__), self.loader.batch_size):
+            existing = dict(self.connection.execute(
+                select(Member.email, Member.id).where(Member.email.in_([row["email"] for row in batch]))
+            ).all())
+            taken_phones = set(self.connection.execute(
+                select(Member.phoneNumber).where(Member.phoneNumber.in_([row["phoneNumber"] for row in batch]))
+            ).scalars())
+            new_members = []
+            for row in batch:
+                if row["email"] in existing:
+                    self.ids["member"][row["id"]] = existing[row["email"]]
+                else:
+                    if row["phoneNumber"] in taken_phones:
+                        row["phoneNumber"] = None
+                    new_members.append(row)
+            self.assign_ids(Member, new_members)
+            self.loader.insert(Member, new_members)
+
+    def import_templates(self):
+        templates = [self.remap(StatusTemplate.__table__, row) for row in self.rows(StatusTemplate.__table__)]
+        existing = dict(self.connection.execute(
+            select(StatusTemplate.name, StatusTemplate.id).where(StatusTemplate.name.in_([row["name"] for row in templates]))
+        ).all())
+        new_templates = [row for row in templates if row["name"] not in existing]
+        for row in templates:
+            if row["name"] in existing:
+                self.ids["statustemplate"][row["id"]] = existing[row["name"]]
+        self.assign_ids(StatusTemplate, new_templates)
+        self.loader.insert(StatusTemplate, new_templates)
+
+        existing_columns = {
+            (template_id, position): column_id
+            for column_id, template_id, position in self.connection.execute(
+                select(StatusColumn.id, StatusColumn.template_id, StatusColumn.position)
+                .where(StatusColumn.template_id.in_(existing.values()))
+            )
+        }
+        new_columns = []
+        for row in self.rows(StatusColumn.__table__):
+            self.remap(StatusColumn.__table__, row)
+            key = (row["template_id"], row["position"])
+            if key in existing_columns:
+                self.ids["statuscolumn"][row["id"]] = existing_columns[key]
+            else:
+                new_columns.append(row)
+        self.assign_ids(StatusColumn, new_columns)
+        self.loader.insert(StatusColumn, new_columns)
+
+    def import_table(self, model):
+        table = model.__table__
+        remapped = table.name in self.ids
+        for batch in chunks(self.rows(table), self.loader.batch_size):
+            for row in batch:
+                self.remap(table, row)
+                if model is ActivityLog and row["entity_type"] in ENTITY_TABLES:
+                    row["entity_id"] = self.ids[ENTITY_TABLES[row["entity_type"]]].get(row["entity_id"], row["entity_id"])
+            if remapped:
+                self.assign_ids(model, batch)
+            elif "id" in table.columns:
+                for row in batch:
+                    del row["id"]
+            if model is Task:
+                self.task_workflow.update((row["id"], row["workflow_id"]) for row in batch)
+            self.loader.insert(model, batch)
+
+    def import_attachments(self, workspace_id: int):
+        table = Attachment.__table__
+        upload_root = self.upload_dir.resolve()
+        for batch in chunks(self.rows(table), self.loader.batch_size):
+            for row in batch:
+                old_id = row.pop("id", None)
+                self.remap(table, row)
+                workflow_id = self.task_workflow.get(row.get("task_id"))
+                if workflow_id is None:
+                    raise ArchiveError(f"Attachment {old_id} belongs to no task in the archive")
+                directory = self.upload_dir / f"Workspace{workspace_id}" / f"Workflow{workflow_id}" / f"Task{row['task_id']}"
+                # The archived file name is never used for the path: a fresh one, as an upload would get
+                extension = row.get("file_extension") or ""
+                if not SAFE_EXTENSION.fullmatch(extension):
+                    extension = ""
+                row["file_extension"] = extension
+                row["unique_filename"] = f"{uuid.uuid4().hex}{extension}"
+                path = directory / row["unique_filename"]
+                if not path.resolve().is_relative_to(upload_root):
+                    raise ArchiveError(f"Attachment {old_id} would be written outside the upload directory")
+                row["file_path"] = str(path)
+                if f"files/{old_id}" in self.archive.NameToInfo:
+                    directory.mkdir(parents=True, exist_ok=True)
+                    with self.archive.open(f"files/{old_id}") as source, path.open("wb") as target:
+                        self.written_files.append(path)
+                        shutil.copyfileobj(source, target, FILE_CHUNK)
+            self.loader.insert(Attachment, batch)
+
+    def run(self, name: Optional[str]) -> int:
+        self.import_members()
+        self.import_templates()
+
+        workspaces = list(self.rows(Workspace.__table__))
+        if len(workspaces) != 1:
+            raise ArchiveError("Archive must contain exactly one workspace")
+        workspace = self.remap(Workspace.__table__, workspaces[0])
+        if name:
+            workspace["name"] = name
+        self.assign_ids(Workspace, [workspace])
+        self.loader.insert(Workspace, [workspace])
+        self.loader.workspace_id = workspace["id"]
+
+        for model in (WorkspaceMemberLink, Workflow, WorkflowMemberLink, Task, TaskMemberLink, TaskDependency,
+                      Subtask, ChatMessage):
+            self.import_table(model)
+        self.import_attachments(workspace["id"])
+        for model in (ActivityLog, WorkflowDailySnapshot):
+            self.import_table(model)
+        return workspace["id"]
+
+
+def import_workspace(engine, source: BinaryIO, upload_dir: Path, name: Optional[str] = None) -> dict:
+    """Load an export_workspace archive as a new workspace; returns its id and the rows written per table"""
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile as exc:
+        raise ArchiveError(f"Not a workspace archive: {exc}")
+
+    with archive:
+        try:
+            manifest = json.loads(archive.read("manifest.json"))
+        except (KeyError, ValueError):
+            raise ArchiveError("Archive has no readable manifest.json")
+        if manifest.get("format") != ARCHIVE_FORMAT or manifest.get("version") != ARCHIVE_VERSION:
+            raise ArchiveError(f"Unsupported archive format {manifest.get('format')!r} "
+                               f"version {manifest.get('version')!r}")
+
+        written_files: List[Path] = []
+        try:
+            # Indexes stay: rebuilding them would walk every row of the existing tables
+            with BulkLoader(engine, defer_indexes=False) as loader:
+                workspace_id = _Importer(loader, archive, upload_dir, written_files).run(name)
+        except BaseException as exc:
+            for path in written_files:
+                path.unlink(missing_ok=True)
+            # Rows come from the archive, so a missing key is a malformed archive
+            if isinstance(exc, KeyError):
+                raise ArchiveError(f"Archive row is missing {exc}") from exc
+            raise
+
+    return {"workspace_id": workspace_id, "rows": loader.counts, "files": len(written_files)}
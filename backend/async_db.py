@@ -0,0 +1,28 @@
+"""
+Async engine and sessions for the hot read routes.
+
+Sync routes run in Starlette's threadpool, which caps in-flight requests at
+its size and costs a thread hop per request. Routes declared `async def` that
+use get_async_session stay on the event loop: SQLite goes through aiosqlite
+and Postgres through asyncpg, picked from the sync DATABASE_URL.
+"""
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_url(database_url: str) -> str:
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def make_async_engine(database_url: str, **kwargs) -> AsyncEngine:
+    return create_async_engine(async_url(database_url), **kwargs)
+
@@ -0,0 +1,263 @@
+"""
+Workspace membership checks from an in-process cache.
+
+With AUTHZ=1, every request naming a workspace, workflow, task, subtask,
+chat message or attachment (a path or query parameter such as task_id, or a
+body field checked by the route) must come from a member of the owning
+workspace, identified by the bearer token: viewers may read, members may
+also write, and admins and owners may change the workspace itself. A
+member's own profile, inbox and notifications answer only that member, a
+route acting as created_by or author_id acts only as the caller, and
+importing a workspace needs a token.
+
+Authorizer keeps two maps per process:
+
+- ancestry, each resource's parent: subtask -> task -> workflow ->
+  workspace. A miss loads the whole chain up from that resource in one
+  query. Parents never change through the API, so entries only go stale
+  when a deleted row's id is reused.
+- memberships, member -> {workspace: role}, loaded in one query per member.
+
+A check that hits both costs a few dictionary lookups and no SQL. Writers
+that add or remove memberships or delete a cached resource call
+invalidate() in their transaction: it bumps an authz:<scope> CacheVersion
+row, and the writing process drops the entry on commit. Other processes see
+the bump within AUTHZ_REFRESH_SECONDS through AuthzRefresher, which polls
+the versions and drops the scopes that moved.
+
+Without AUTHZ every check is skipped and invalidate() does nothing.
+"""
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlmodel import Session
+
+from cache import bump_version
+from logs import logger
+from models import Attachment, CacheVersion, ChatMessage, Subtask, Task, Workflow, WorkspaceMemberLink
+
+AUTHZ_ENABLED = os.environ.get("AUTHZ", "").lower() in ("1", "true", "yes")
+AUTHZ_REFRESH_SECONDS = float(os.environ.get("AUTHZ_REFRESH_SECONDS", "1"))
+AUTHZ_CACHE_ENTRIES = int(os.environ.get("AUTHZ_CACHE_ENTRIES", "100000"))
+
+VIEWER, MEMBER, ADMIN = 1, 2, 3
+ROLE_LEVELS = {"viewer": VIEWER, "member": MEMBER, "admin": ADMIN, "owner": ADMIN}
+
+# Resource kind -> (model, column holding its parent's id, parent kind)
+PARENTS = {
+    "subtask": (Subtask, "task_id", "task"),
+    "chatmessage": (ChatMessage, "task_id", "task"),
+    "attachment": (Attachment, "task_id", "task"),
+    "task": (Task, "workflow_id", "workflow"),
+    "workflow": (Workflow, "workspace_id", "workspace"),
+}
+SCOPES = tuple(PARENTS) + ("member",)
+VERSION_PREFIX = "authz:"
+
+# Request parameters naming a resource
+RESOURCE_PARAMS = {
+    "workspace_id": "workspace",
+    "workflow_id": "workflow",
+    "task_id": "task",
+    "subtask_id": "subtask",
+    "message_id": "chatmessage",
+    "attachment_id": "attachment",
+}
+# Routes that change or hand out a whole workspace
+ADMIN_ROUTES = {
+    ("PUT", "/workspaces/{workspace_id}"),
+    ("PATCH", "/workspaces/{workspace_id}"),
+    ("DELETE", "/workspaces/{workspace_id}"),
+    ("GET", "/workspaces/{workspace_id}/export"),
+    ("PUT", "/workspaces/{workspace_id}/members/{member_id}"),
+    ("DELETE", "/workspaces/{workspace_id}/members/{member_id}"),
+}
+READ_METHODS = {"GET", "HEAD"}
+
+ALLOW, DENY, UNKNOWN = "allow", "deny", "unknown"
+_MISSING = object()
+
+_authorizers = []
+
+
+class _Lru:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+@lru_cache(maxsize=None)
+def _ancestry_query(kind: str):
+    """SELECT of the parent ids from kind's parent up to the workspace"""
+    model, column, parent = PARENTS[kind]
+    current = getattr(model, column)
+    query = select(current).select_from(model)
+    while parent in PARENTS:
+        parent_model, parent_column, parent = PARENTS[parent]
+        query = query.join(parent_model, parent_model.id == current)
+        current = getattr(parent_model, parent_column)
+        query = query.add_columns(current)
+    return query
+
+
+class Authorizer:
+    def __init__(self, engine, max_entries: int = AUTHZ_CACHE_ENTRIES):
+        self.engine = engine
+        self.parents = {kind: _Lru(max_entries) for kind in PARENTS}
+        self.roles = _Lru(max_entries)
+        self.versions: Dict[str, int] = {}
+        self.refreshed = False
+        _authorizers.append(self)
+
+    # Cache reads: no SQL
+
+    def cached_workspace(self, kind: str, resource_id: int):
+        while kind in PARENTS:
+            parent_id = self.parents[kind].get(resource_id)
+            if parent_id is _MISSING:
+                return _MISSING
+            kind, resource_id = PARENTS[kind][2], parent_id
+        return resource_id
+
+    def cached_decision(self, member_id: int, kind: str, resource_id: int, level: int) -> Optional[str]:
+        """ALLOW or DENY, or None when the cache cannot tell"""
+        workspace_id = self.cached_workspace(kind, resource_id)
+        if workspace_id is _MISSING:
+            return None
+        roles = self.roles.get(member_id)
+        if roles is _MISSING:
+            return None
+        return ALLOW if ROLE_LEVELS.get(roles.get(workspace_id), 0) >= level else DENY
+
+    # Loads: one query each
+
+    def load_ancestry(self, kind: str, resource_id: int) -> bool:
+        """Cache the parents of a resource; False when it does not exist"""
+        model = PARENTS[kind][0]
+        with Session(self.engine) as session:
+            row = session.exec(_ancestry_query(kind).where(model.id == resource_id)).first()
+        # Missing resources are not cached: the id may be taken by the next insert
+        if row is None:
+            return False
+        for parent_id in row:
+            self.parents[kind].set(resource_id, parent_id)
+            kind, resource_id = PARENTS[kind][2], parent_id
+        return True
+
+    def load_roles(self, member_id: int):
+        with Session(self.engine) as session:
+            rows = session.exec(
+                select(WorkspaceMemberLink.workspace_id, WorkspaceMemberLink.role)
+                .where(WorkspaceMemberLink.member_id == member_id)
+            ).all()
+        self.roles.set(member_id, dict(rows))
+
+    def decision(self, member_id: int, kind: str, resource_id: int, level: int) -> str:
+        """ALLOW, DENY or UNKNOWN (no such resource), loading what the cache lacks; runs SQL"""
+        missing_kind, missing_id = self._first_missing(kind, resource_id)
+        if missing_kind is not None and not self.load_ancestry(missing_kind, missing_id):
+            return UNKNOWN
+        if self.roles.get(member_id) is _MISSING:
+            self.load_roles(member_id)
+        # None only if the entries were evicted again at once; refuse rather than loop
+        return self.cached_decision(member_id, kind, resource_id, level) or DENY
+
+    def _first_missing(self, kind: str, resource_id: int) -> Tuple[Optional[str], Optional[int]]:
+        while kind in PARENTS:
+            parent_id = self.parents[kind].get(resource_id)
+            if parent_id is _MISSING:
+                return kind, resource_id
+            kind, resource_id = PARENTS[kind][2], parent_id
+        return None, None
+
+    # Invalidation
+
+    def drop(self, scope: str, key: Optional[int] = None):
+        cache = self.roles if scope == "member" else self.parents[scope]
+        if key is None:
+            cache.clear()
+        else:
+            cache.pop(key)
+
+    def refresh(self, session: Session):
+        """Drop the scopes whose version another process bumped"""
+        rows = session.exec(
+            select(CacheVersion.name, CacheVersion.version).where(CacheVersion.name.startswith(VERSION_PREFIX))
+        ).all()
+        for name, version in rows:
+            known = self.versions.get(name)
+            # A scope first bumped since the last refresh has no known version yet
+            if known != version and (known is not None or self.refreshed):
+                self.drop(name[len(VERSION_PREFIX):])
+            self.versions[name] = version
+        self.refreshed = True
+
+    def clear(self):
+        for scope in SCOPES:
+            self.drop(scope)
+
+
+def invalidate(session: Session, scope: str, key: Optional[int] = None):
+    """Drop a cached membership (scope "member") or resource everywhere once session commits"""
+    if not AUTHZ_ENABLED:
+        return
+    bump_version(session, VERSION_PREFIX + scope)
+
+    def drop(_):
+        for authorizer in _authorizers:
+            authorizer.drop(scope, key)
+    event.listen(session, "after_commit", drop, once=True)
+
+
+def required_level(method: str, route_path: str) -> int:
+    if (method, route_path) in ADMIN_ROUTES:
+        return ADMIN
+    return VIEWER if method in READ_METHODS else MEMBER
+
+
+class AuthzRefresher(threading.Thread):
+    """Pick up invalidations from other processes every interval seconds"""
+
+    def __init__(self, authorizer: Authorizer, interval: float = AUTHZ_REFRESH_SECONDS):
+        super().__init__(name="authz-refresher", daemon=True)
+        self.authorizer, self.interval = authorizer, interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                with Session(self.authorizer.engine) as session:
+                    self.authorizer.refresh(session)
+            except Exception:
+                logger.exception("Authorization cache refresh failed")
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
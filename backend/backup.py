@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Online snapshots of the SQLite database and the attachment tree.
+
+copy_database() uses SQLite's online backup API in steps of BACKUP_PAGES
+pages with BACKUP_SLEEP seconds between them. Each step holds the source's
+read lock only briefly, so writers are not held up for the whole copy. A
+write from another connection restarts the backup. After MAX_RESTARTS the
+rest is copied in a single step, which under WAL still only holds a read
+snapshot. The copy is switched to a rollback journal, so a snapshot is one
+self-contained file, and it is checked with PRAGMA integrity_check before
+it counts.
+
+A snapshot is a directory in BACKUP_DIR named after its UTC time, holding
+workspaceflow.db, files/ and manifest.json. Uploaded files never change
+after they are written, so any file whose size and mtime match the previous
+snapshot is hardlinked instead of copied. Each snapshot then costs only the
+new uploads, and rotating old snapshots away never loses data another one
+still links to. Only BACKUP_KEEP snapshots are kept.
+
+With BACKUP_INTERVAL_MINUTES set, the API runs BackupScheduler in every
+worker. A file lock in BACKUP_DIR makes sure only one of them backs up at
+a time.
+
+    python backup.py create
+    python backup.py list
+    python backup.py verify backups/20250101T000000Z
+    python backup.py restore backups/20250101T000000Z   # with the API stopped
+"""
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from logs import logger
+
+BACKUP_DIR = Path(os.environ.get("BACKUP_DIR", "backups"))
+BACKUP_KEEP = int(os.environ.get("BACKUP_KEEP", "7"))
+BACKUP_INTERVAL_MINUTES = float(os.environ.get("BACKUP_INTERVAL_MINUTES", "0"))
+BACKUP_PAGES = int(os.environ.get("BACKUP_PAGES", "1024"))
+BACKUP_SLEEP = float(os.environ.get("BACKUP_SLEEP", "0.005"))
+MAX_RESTARTS = 3
+
+SNAPSHOT_FORMAT = "%Y%m%dT%H%M%SZ"
+DATABASE_NAME = "workspaceflow.db"
+FILES_NAME = "files"
+MANIFEST_NAME = "manifest.json"
+
+
+class BackupError(RuntimeError):
+    pass
+
+
+class BackupBusy(BackupError):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def copy_database(source_path, target_path, pages: int = BACKUP_PAGES, sleep: float = BACKUP_SLEEP) -> dict:
+    """Copy a live database into target_path; returns the steps taken and restarts seen"""
+    stats = {"steps": 0, "restarts": 0, "single_step": pages <= 0}
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal last_remaining
+        stats["steps"] += 1
+        if last_remaining is not None and remaining > last_remaining:
+            stats["restarts"] += 1
+            if stats["restarts"] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+
+    source = sqlite3.connect(source_path, timeout=30)
+    target = sqlite3.connect(target_path)
+    try:
+        try:
+            source.backup(target, pages=pages if pages > 0 else -1, progress=progress, sleep=sleep)
+        except _TooManyRestarts:
+            stats["single_step"] = True
+            source.backup(target)
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+        source.close()
+    return stats
+
+
+def verify_database(path) -> List[str]:
+    """PRAGMA integrity_check of path; ["ok"] when the database is sound"""
+    if not Path(path).is_file():
+        return [f"{path} does not exist"]
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return [row[0] for row in connection.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as exc:
+        return [str(exc)]
+    finally:
+        connection.close()
+
+
+def copy_files(source_dir: Path, target_dir: Path, previous_dir: Optional[Path] = None) -> Tuple[int, int, int]:
+    """Mirror source_dir into target_dir, hardlinking unchanged files from previous_dir; (copied, linked, bytes copied)"""
+    copied = linked = copied_bytes = 0
+    if not source_dir.is_dir():
+        return copied, linked, copied_bytes
+
+    for root, _, names in os.walk(source_dir):
+        relative_root = Path(root).relative_to(source_dir)
+        (target_dir / relative_root).mkdir(parents=True, exist_ok=True)
+        for name in names:
+            source = Path(root) / name
+            target = target_dir / relative_root / name
+            status = source.stat()
+            if previous_dir is not None:
+                previous = previous_dir / relative_root / name
+                try:
+                    previous_status = previous.stat()
+                    if (previous_status.st_size, previous_status.st_mtime_ns) == (status.st_size, status.st_mtime_ns):
+                        os.link(previous, target)
+                        linked += 1
+                        continue
+                except OSError:
+                    pass
+            shutil.copy2(source, target)
+            copied += 1
+            copied_bytes += status.st_size
+    return copied, linked, copied_bytes
+
+
+def list_snapshots(backup_dir: Path = BACKUP_DIR) -> List[Path]:
+    """Complete snapshots, oldest first"""
+    if not backup_dir.is_dir():
+        return []
+    return sorted(path for path in backup_dir.iterdir() if (path / MANIFEST_NAME).is_file())
+
+
+def snapshot_time(snapshot: Path) -> datetime:
+    return datetime.strptime(snapshot.name, SNAPSHOT_FORMAT).replace(tzinfo=timezone.utc)
+
+
+@contextmanager
+def backup_lock(backup_dir: Path):
+    """Exclusive lock across processes; raises BackupBusy when another backup holds it"""
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    with open(backup_dir / ".lock", "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise BackupBusy(f"Another backup is running in {backup_dir}")
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def rotate(backup_dir: Path = BACKUP_DIR, keep: int = BACKUP_KEEP) -> List[Path]:
+    removed = list_snapshots(backup_dir)[:-keep] if keep > 0 else []
+    for snapshot in removed:
+        shutil.rmtree(snapshot)
+    return removed
+
+
+def create_snapshot(
+    db_path, files_dir=FILES_NAME, backup_dir: Path = BACKUP_DIR, keep: int = BACKUP_KEEP,
+    pages: int = BACKUP_PAGES, sleep: float = BACKUP_SLEEP
+) -> dict:
+    """Back up the database and attachment tree into a new snapshot; returns its manifest"""
+    backup_dir = Path(backup_dir)
+    with backup_lock(backup_dir):
+        # Leftovers of a backup interrupted by a crash or shutdown
+        for partial in backup_dir.glob(".*.partial"):
+            shutil.rmtree(partial, ignore_errors=True)
+
+        started = time.perf_counter()
+        name = datetime.now(timezone.utc).strftime(SNAPSHOT_FORMAT)
+        snapshots = list_snapshots(backup_dir)
+        if snapshots and snapshots[-1].name == name:
+            raise BackupBusy(f"Snapshot {name} already exists")
+        previous = snapshots[-1] if snapshots else None
+        partial = backup_dir / f".{name}.partial"
+        partial.mkdir()
+
+        try:
+            database = copy_database(db_path, partial / DATABASE_NAME, pages, sleep)
+            database_seconds = time.perf_counter() - started
+            integrity = verify_database(partial / DATABASE_NAME)
+            if integrity != ["ok"]:
+                raise BackupError(f"Snapshot failed integrity check: {integrity[:5]}")
+            copied, linked, copied_bytes = copy_files(
+                Path(files_dir), partial / FILES_NAME, previous / FILES_NAME if previous else None
+            )
+            manifest = {
+                "name": name,
+                "source": str(Path(db_path).resolve()),
+                "database_bytes": (partial / DATABASE_NAME).stat().st_size,
+                "database_seconds": round(database_seconds, 3),
+                "backup_steps": database["steps"],
+                "backup_restarts": database["restarts"],
+                "single_step": database["single_step"],
+                "integrity": "ok",
+                "files_copied": copied,
+                "files_linked": linked,
+                "files_copied_bytes": copied_bytes,
+                "seconds": round(time.perf_counter() - started, 3),
+            }
+            (partial / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+            partial.rename(backup_dir / name)
+        except BaseException:
+            shutil.rmtree(partial, ignore_errors=True)
+            raise
+
+        removed = rotate(backup_dir, keep)
+    logger.info("Backup created", extra={
+        "snapshot": name, "seconds": manifest["seconds"], "restarts": manifest["backup_restarts"],
+        "files_copied": copied, "files_linked": linked, "rotated": [snapshot.name for snapshot in removed],
+    })
+    return manifest
+
+
+def restore_snapshot(snapshot: Path, db_path, files_dir=FILES_NAME) -> dict:
+    """Copy a verified snapshot over db_path and files_dir; run it with the API stopped"""
+    snapshot = Path(snapshot)
+    integrity = verify_database(snapshot / DATABASE_NAME)
+    if integrity != ["ok"]:
+        raise BackupError(f"Snapshot {snapshot} failed integrity check: {integrity[:5]}")
+
+    copy_database(snapshot / DATABASE_NAME, db_path, pages=-1)
+    integrity = verify_database(db_path)
+    if integrity != ["ok"]:
+        raise BackupError(f"Restored database failed integrity check: {integrity[:5]}")
+
+    # Files uploaded after the snapshot are left in place; no restored row points at them
+    copied, _, copied_bytes = copy_files(snapshot / FILES_NAME, Path(files_dir))
+    logger.info("Backup restored", extra={"snapshot": snapshot.name, "files_copied": copied})
+    return {"snapshot": snapshot.name, "integrity": "ok", "files_copied": copied, "files_copied_bytes": copied_bytes}
+
+
+class BackupScheduler(threading.Thread):
+    """Take a snapshot whenever the newest one is older than interval seconds"""
+
+    def __init__(self, db_path, files_dir, backup_dir: Path = BACKUP_DIR, interval: float = 3600,
+                 keep: int = BACKUP_KEEP, check_every: float = 60):
+        super().__init__(name="backup-scheduler", daemon=True)
+        self.db_path, self.files_dir, self.backup_dir = db_path, files_dir, Path(backup_dir)
+        self.interval, self.keep, self.check_every = interval, keep, check_every
+        self.stopped = threading.Event()
+
+    def due(self) -> bool:
+        snapshots = list_snapshots(self.backup_dir)
+        if not snapshots:
+            return True
+        age = datetime.now(timezone.utc) - snapshot_time(snapshots[-1])
+        return age.total_seconds() >= self.interval
+
+    def run(self):
+        while not self.stopped.wait(min(self.check_every, self.interval)):
+            try:
+                if self.due():
+                    create_snapshot(self.db_path, self.files_dir, self.backup_dir, self.keep)
+            except BackupBusy:
+                pass
+            except Exception:
+                logger.exception("Scheduled backup failed")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def main():
+    from sqlalchemy.engine import make_url
+    from models import DATABASE_URL
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["create", "list", "verify", "restore", "schedule"])
+    parser.add_argument("snapshot", nargs="?", help="snapshot directory for verify and restore")
+    parser.add_argument("--db", default=make_url(DATABASE_URL).database)
+    parser.add_argument("--files", default=FILES_NAME)
+    parser.add_argument("--dir", type=Path, default=BACKUP_DIR)
+    parser.add_argument("--keep", type=int, default=BACKUP_KEEP)
+    parser.add_argument("--pages", type=int, default=BACKUP_PAGES, help="pages per backup step, 0 for one step")
+    parser.add_argument("--interval-minutes", type=float, default=BACKUP_INTERVAL_MINUTES or 60)
+    args = parser.parse_args()
+
+    if args.command == "create":
+        print(json.dumps(create_snapshot(args.db, args.files, args.dir, args.keep, args.pages), indent=2))
+    elif args.command == "list":
+        for snapshot in list_snapshots(args.dir):
+            manifest = json.loads((snapshot / MANIFEST_NAME).read_text())
+            print(f"{snapshot.name}  {manifest['database_bytes'] / 2**20:>9.1f} MB  "
+                  f"{manifest['files_copied']:>6} copied  {manifest['files_linked']:>6} linked")
+    elif not args.snapshot and args.command in ("verify", "restore"):
+        parser.error(f"{args.command} needs a snapshot directory")
+    elif args.command == "verify":
+        integrity = verify_database(Path(args.snapshot) / DATABASE_NAME)
+        print("\n".join(integrity))
+        sys.exit(0 if integrity == ["ok"] else 1)
+    elif args.command == "restore":
+        print(json.dumps(restore_snapshot(Path(args.snapshot), args.db, args.files), indent=2))
+    else:
+        scheduler = BackupScheduler(args.db, args.files, args.dir, args.interval_minutes * 60, args.keep)
+        scheduler.start()
+        try:
+            scheduler.join()
+        except KeyboardInterrupt:
+            scheduler.stop()
+
+
+if __name__ == "__main__":
+    from logs import configure_logging
+
+    configure_logging()
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Per-request cost of workspace authorization.
+
+Each target is served by uvicorn on its own copy of --db, where every
+workspace's creator is made its owner, and driven for --duration seconds with
+the reads a task panel makes, each with the owner's bearer token:
+
+    GET /tasks/{task_id}
+    GET /subtasks?task_id={task_id}
+    GET /chat-messages/{task_id}
+
+    off   main:app as shipped (AUTHZ unset)
+    on    main:app with AUTHZ=1
+
+The report shows throughput, latency and the SQL statements per request,
+read from the server's /metrics; with a warm cache "on" should run no more
+statements than "off". It ends with the check itself timed in-process: a
+cached decision, and one that has to load the ancestry and roles.
+
+    python bench_authz.py --db bench.db
+    python bench_authz.py --db bench.db --concurrency 64 --duration 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import timedelta
+
+from bench_load import DEFAULT_DB, run_load, wait_ready
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_SIZE = 1000
+ROUTES = ("/tasks/{task_id}", "/subtasks?task_id={task_id}", "/chat-messages/{task_id}")
+TARGETS = {"off": {}, "on": {"AUTHZ": "1"}}
+MICRO_CHECKS = 100000
+
+
+def load_main(db_path: str):
+    """Import main on db_path, which brings that copy's schema up to date; main works in its directory"""
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.chdir(os.path.dirname(db_path))
+    import main
+    main.engine.dispose()
+    return main
+
+
+def prepare_db(db_path: str) -> list:
+    """Make each workspace creator its owner; (member id, task id) for up to SAMPLE_SIZE live tasks"""
+    with sqlite3.connect(db_path) as connection:
+        connection.execute(
+            "INSERT OR IGNORE INTO workspacememberlink (workspace_id, member_id, role, joined_at) "
+            "SELECT id, created_by, 'owner', CURRENT_TIMESTAMP FROM workspace WHERE created_by IS NOT NULL"
+        )
+        pairs = connection.execute(
+            "SELECT workspace.created_by, task.id FROM task "
+            "JOIN workflow ON workflow.id = task.workflow_id "
+            "JOIN workspace ON workspace.id = workflow.workspace_id "
+            "WHERE task.deleted_at IS NULL AND workspace.created_by IS NOT NULL"
+        ).fetchall()
+    if not pairs:
+        raise SystemExit("No live task in a workspace with a creator")
+    return random.Random(42).sample(pairs, min(SAMPLE_SIZE, len(pairs)))
+
+
+def make_tokens(main, member_ids) -> dict:
+    """Bearer tokens signed with the server's key"""
+    return {member_id: main.create_access_token({"sub": member_id}, timedelta(days=1)) for member_id in member_ids}
+
+
+def make_read(pairs: list, tokens: dict):
+    def read(index):
+        member_id, task_id = pairs[index // len(ROUTES) % len(pairs)]
+        path = ROUTES[index % len(ROUTES)].format(task_id=task_id)
+        return "GET", path, b"", {"Authorization": f"Bearer {tokens[member_id]}"}
+    return read
+
+
+def queries_per_request(base_url: str) -> float:
+    """Mean SQL statements per request over the benchmarked routes, from /metrics"""
+    with urllib.request.urlopen(f"{base_url}/metrics") as response:
+        text = response.read().decode()
+    totals = {"sum": 0.0, "count": 0.0}
+    for part in totals:
+        for match in re.finditer(rf'^http_request_db_queries_{part}\{{method="GET",route="(\S+?)"\}} (\S+)$', text, re.M):
+            if match.group(1) != "/metrics":
+                totals[part] += float(match.group(2))
+    return totals["sum"] / totals["count"] if totals["count"] else float("nan")
+
+
+def measure(label: str, db_path: str, pairs: list, tokens: dict, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"bench_authz_{label}_")
+    shutil.copy(db_path, os.path.join(workdir, "workspaceflow.db"))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=workdir, env=dict(os.environ, PYTHONPATH=BACKEND_DIR, LOG_LEVEL="WARNING", RATE_LIMIT="0",
+                              JOB_WORKERS="0", **TARGETS[label]),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    read = make_read(pairs, tokens)
+    try:
+        asyncio.run(wait_ready(base_url))
+        # The warm-up also fills the authorization cache
+        asyncio.run(run_load(base_url, None, min(args.concurrency, 4), 1, read))
+        result = asyncio.run(run_load(base_url, None, args.concurrency, args.duration, read))
+        result["queries"] = queries_per_request(base_url)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def time_checks(db_path: str, pairs: list):
+    """Microseconds per cached check and per check that loads from db_path"""
+    from sqlmodel import create_engine
+
+    from authz import VIEWER, Authorizer
+    authorizer = Authorizer(create_engine(f"sqlite:///{db_path}"))
+
+    start = time.perf_counter()
+    for member_id, task_id in pairs:
+        authorizer.clear()
+        authorizer.decision(member_id, "task", task_id, VIEWER)
+    loaded = (time.perf_counter() - start) / len(pairs)
+
+    for member_id, task_id in pairs:
+        authorizer.decision(member_id, "task", task_id, VIEWER)
+    start = time.perf_counter()
+    for index in range(MICRO_CHECKS):
+        member_id, task_id = pairs[index % len(pairs)]
+        authorizer.cached_decision(member_id, "task", task_id, VIEWER)
+    cached = (time.perf_counter() - start) / MICRO_CHECKS
+    return cached * 1e6, loaded * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DEFAULT_DB)
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument("--port", type=int, default=8151)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench_authz_")
+    db_path = os.path.join(scratch, "workspaceflow.db")
+    try:
+        shutil.copy(args.db, db_path)
+        main_module = load_main(db_path)
+        pairs = prepare_db(db_path)
+        tokens = make_tokens(main_module, {member_id for member_id, _ in pairs})
+        print(f"{args.concurrency} connections, {args.duration:.0f}s per target, {len(pairs)} tasks\n")
+        print(f"{'target':<8}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'queries':>9}")
+        for target in args.targets:
+            result = measure(target, db_path, pairs, tokens, args)
+            print(f"{target:<8}{result['requests']:>10}{result['errors'] + result['client_errors']:>8}"
+                  f"{result['rps']:>9.0f}{result['p50_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['queries']:>9.2f}",
+                  flush=True)
+
+        cached, loaded = time_checks(db_path, pairs)
+        print(f"\ncheck, cached   {cached:8.2f} us")
+        print(f"check, loading  {loaded:8.2f} us")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
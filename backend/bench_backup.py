@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Write latency while an online backup runs.
+
+Starts `run_api.py --prod` on a copy of --db and drives the task_update
+scenario from benchmark.py (PUT /tasks/{id}) for --duration seconds, first
+with no backup running, then once per --pages value while a thread takes
+snapshots back to back. Each --pages value is a backup step size; 0 copies
+the whole database in one step, which holds the read lock for the whole copy.
+
+    python bench_backup.py --db bench.db --pages 0 1024 100
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from backup import BACKUP_SLEEP, create_snapshot
+from bench_load import DEFAULT_DB, run_load
+from bench_workers import wait_ready
+from benchmark import build_scenarios
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class BackupLoop(threading.Thread):
+    """Take snapshots back to back until stopped"""
+
+    def __init__(self, db_path: str, files_dir: str, backup_dir: Path, pages: int, sleep: float):
+        super().__init__(daemon=True)
+        self.db_path, self.files_dir, self.backup_dir = db_path, files_dir, backup_dir
+        self.pages, self.sleep = pages, sleep
+        self.seconds, self.restarts = [], 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            manifest = create_snapshot(self.db_path, self.files_dir, self.backup_dir, 1, self.pages, self.sleep)
+            self.seconds.append(manifest["database_seconds"])
+            self.restarts += manifest["backup_restarts"]
+            # Snapshot names have one-second resolution
+            self.stopped.wait(1)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DEFAULT_DB)
+    parser.add_argument("--pages", type=int, nargs="+", default=[0, 1024, 100])
+    parser.add_argument("--sleep", type=float, default=BACKUP_SLEEP)
+    parser.add_argument("--port", type=int, default=8131)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_backup_")
+    db_path = os.path.join(workdir, "workspaceflow.db")
+    shutil.copy(args.db, db_path)
+    make_request = build_scenarios(db_path, args.seed, 1)["task_update"]
+
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "run_api.py"), "--prod", "--host", "127.0.0.1",
+         "--port", str(args.port)],
+        cwd=workdir, env=dict(os.environ, PYTHONPATH=BACKEND_DIR, DATABASE_URL=f"sqlite:///{db_path}",
+                              LOG_LEVEL="WARNING", RATE_LIMIT="0"),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    print(f"{args.concurrency} connections, {args.duration:.0f}s per run, "
+          f"{os.path.getsize(db_path) / 2**20:.0f} MB database\n")
+    print(f"{'backup':<14}{'requests':>9}{'5xx':>7}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'backups':>9}{'avg s':>8}{'restarts':>10}")
+    try:
+        asyncio.run(wait_ready(base_url))
+        asyncio.run(run_load(base_url, None, min(args.concurrency, 8), 1, make_request))
+        for pages in [None, *args.pages]:
+            loop = None
+            if pages is not None:
+                loop = BackupLoop(db_path, os.path.join(workdir, "files"), Path(workdir) / "backups",
+                                  pages, args.sleep)
+                loop.start()
+            started = time.perf_counter()
+            result = asyncio.run(run_load(base_url, None, args.concurrency, args.duration, make_request))
+            label = "none" if pages is None else ("one step" if pages <= 0 else f"{pages} pages")
+            backups = ""
+            if loop is not None:
+                loop.stop()
+                average = sum(loop.seconds) / len(loop.seconds) if loop.seconds else time.perf_counter() - started
+                backups = f"{len(loop.seconds):>9}{average:>8.2f}{loop.restarts:>10}"
+            print(f"{label:<14}{result['requests']:>9}{result['errors']:>7}{result['rps']:>9.0f}"
+                  f"{result['p50_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['max_ms']:>9.1f}{backups}", flush=True)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Drag-and-drop column moves per second.
+
+Each target is served by uvicorn on its own copy of --db and driven for
+--duration seconds with moves of sampled tasks to another column of their
+workflow, the request the board sends when a card is dropped:
+
+    put      PUT /tasks/{id} {"column_id": ...}, answered with the whole task
+    patch    PATCH /tasks/{id} {"column_id": ...}, answered with the changed fields
+    base     PUT against the backend of --baseline REV, extracted with git archive
+
+Besides throughput and latency the report shows the SQL statements per move
+and response bytes per move, read from the server's /metrics where the
+revision has one.
+
+    python bench_drag.py --db bench.db
+    python bench_drag.py --db bench.db --baseline HEAD~2 --targets base put patch
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tarfile
+import tempfile
+import urllib.request
+from collections import defaultdict
+
+from bench_load import DEFAULT_DB, run_load, wait_ready
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_SIZE = 1000
+ROUTE = "/tasks/{task_id}"
+
+
+def sample_moves(db_path: str, seed: int) -> list:
+    """(task id, columns of its workflow) for up to SAMPLE_SIZE tasks whose workflow has several columns"""
+    import sqlite3
+
+    with sqlite3.connect(db_path) as connection:
+        tasks = connection.execute("SELECT id, workflow_id FROM task").fetchall()
+        columns = defaultdict(list)
+        for workflow_id, column_id in connection.execute("SELECT DISTINCT workflow_id, column_id FROM task"):
+            columns[workflow_id].append(column_id)
+    tasks = [(task_id, columns[workflow_id]) for task_id, workflow_id in tasks if len(columns[workflow_id]) > 1]
+    if not tasks:
+        raise SystemExit("No workflow with tasks in more than one column")
+    rng = random.Random(seed)
+    return rng.sample(tasks, min(SAMPLE_SIZE, len(tasks)))
+
+
+def make_drag(method: str, moves: list):
+    def drag(index):
+        task_id, columns = moves[index % len(moves)]
+        body = json.dumps({"column_id": columns[index // len(moves) % len(columns)]}).encode()
+        return method, f"/tasks/{task_id}", body, {"Content-Type": "application/json"}
+    return drag
+
+
+def extract_backend(revision: str, target_dir: str) -> str:
+    top_level = subprocess.run(
+        ["git", "rev-parse", "--show-toplevel"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout.strip()
+    # REV:<path> is this directory's tree at REV, with paths relative to it; git archive runs from the top level
+    tree = f"{revision}:{os.path.relpath(BACKEND_DIR, top_level)}"
+    archive = subprocess.run(
+        ["git", "archive", "--format=tar", tree], cwd=top_level, capture_output=True, check=True
+    ).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(target_dir)
+    return target_dir
+
+
+def route_metrics(base_url: str, method: str) -> dict:
+    """Mean statements and response bytes per request of method ROUTE, from /metrics; {} without it"""
+    try:
+        with urllib.request.urlopen(f"{base_url}/metrics") as response:
+            text = response.read().decode()
+    except OSError:
+        return {}
+    labels = f'method="{method}",route="{ROUTE}"'
+    values = {}
+    for metric in ("http_request_db_queries", "http_response_size_bytes"):
+        total = re.search(rf"^{metric}_sum\{{{re.escape(labels)}\}} (\S+)$", text, re.M)
+        count = re.search(rf"^{metric}_count\{{{re.escape(labels)}\}} (\S+)$", text, re.M)
+        if total and count and float(count.group(1)):
+            values[metric] = float(total.group(1)) / float(count.group(1))
+    return values
+
+
+def measure(label: str, method: str, backend_dir: str, moves: list, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"bench_drag_{label}_")
+    db_path = os.path.join(workdir, "workspaceflow.db")
+    shutil.copy(args.db, db_path)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=workdir, env=dict(os.environ, PYTHONPATH=backend_dir, DATABASE_URL=f"sqlite:///{db_path}",
+                              LOG_LEVEL="WARNING", RATE_LIMIT="0"),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    drag = make_drag(method, moves)
+    try:
+        asyncio.run(wait_ready(base_url))
+        asyncio.run(run_load(base_url, None, min(args.concurrency, 4), 1, drag))
+        result = asyncio.run(run_load(base_url, None, args.concurrency, args.duration, drag))
+        result.update(route_metrics(base_url, method))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DEFAULT_DB)
+    parser.add_argument("--targets", nargs="+", default=["put", "patch"], choices=["base", "put", "patch"])
+    parser.add_argument("--baseline", metavar="REV", help="git revision served as the base target")
+    parser.add_argument("--port", type=int, default=8141)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if "base" in args.targets and not args.baseline:
+        parser.error("the base target needs --baseline REV")
+
+    moves = sample_moves(args.db, args.seed)
+    extract_dir = tempfile.mkdtemp(prefix="bench_drag_baseline_") if args.baseline else None
+    print(f"{args.concurrency} connections, {args.duration:.0f}s per target, {len(moves)} tasks\n")
+    print(f"{'target':<10}{'moves':>8}{'errors':>8}{'moves/s':>9}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'queries':>9}{'bytes':>8}")
+    try:
+        for target in args.targets:
+            if target == "base":
+                method, backend_dir = "PUT", extract_backend(args.baseline, extract_dir)
+            else:
+                method, backend_dir = target.upper(), BACKEND_DIR
+            result = measure(target, method, backend_dir, moves, args)
+            queries = result.get("http_request_db_queries")
+            size = result.get("http_response_size_bytes")
+            print(f"{target:<10}{result['requests']:>8}{result['errors'] + result['client_errors']:>8}"
+                  f"{result['rps']:>9.0f}{result['p50_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                  f"{queries if queries is not None else float('nan'):>9.1f}{size if size is not None else float('nan'):>8.0f}",
+                  flush=True)
+    finally:
+        if extract_dir:
+            shutil.rmtree(extract_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
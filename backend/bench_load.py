@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Concurrent load test for the hot read routes.
+
+--concurrency clients (default 500) each hold one keep-alive connection and
+loop over --paths for --duration seconds against every target, reporting
+throughput and p50/p99 latency. The clients speak HTTP/1.1 directly over
+asyncio streams; httpx's connection pool saturates a core well before a few
+hundred connections and would otherwise be what gets measured.
+
+With --serve the script starts two uvicorn servers on a copy of --db:
+"async" is main:app as shipped, "threadpool" is build_sync_app below, the
+same routes written as sync `def` handlers on the sync Session, i.e. the
+model every route used before the async layer. Other deployments can be
+added with --target label=http://host:port.
+
+    python bench_load.py --serve --concurrency 500 --duration 15
+    python bench_load.py --target prod=http://10.0.0.5:8000 --paths /tasks?workflow_id=1
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(BACKEND_DIR, "..", "workspaceflow.db")
+DEFAULT_PATHS = ["/tasks?workflow_id=1", "/tasks/1", "/workflows/1", "/members", "/chat-messages/1"]
+
+
+def build_sync_app():
+    """The hot routes as sync handlers, served from Starlette's threadpool"""
+    from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+    from sqlalchemy import func
+    from sqlmodel import Session
+
+    import main
+    from conditional import REVALIDATE, collection_etag, not_modified, row_etag
+    from models import ChatMessage, Member, Task, Workflow
+    from serializers import FastJSONResponse, member_serializer, message_serializer, task_serializer
+
+    sync_app = FastAPI()
+    sync_app.user_middleware = list(main.app.user_middleware)
+
+    @sync_app.get("/")
+    def root():
+        return {"message": "threadpool baseline"}
+
+    @sync_app.get("/tasks")
+    def get_tasks(workflow_id: Optional[int] = Query(None), session: Session = Depends(main.get_session)):
+        query = task_serializer.select()
+        if workflow_id:
+            query = query.where(Task.workflow_id == workflow_id)
+        return FastJSONResponse(task_serializer.from_rows(session.exec(query).all()))
+
+    @sync_app.get("/tasks/{task_id}", response_model=Task)
+    def get_task(task_id: int, request: Request, response: Response, session: Session = Depends(main.get_session)):
+        if cached := not_modified(request, response, row_etag(session, Task, task_id)):
+            return cached
+        task = session.get(Task, task_id)
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+        return task
+
+    @sync_app.get("/workflows/{workflow_id}", response_model=Workflow)
+    def get_workflow(workflow_id: int, request: Request, response: Response, session: Session = Depends(main.get_session)):
+        if cached := not_modified(request, response, row_etag(session, Workflow, workflow_id)):
+            return cached
+        workflow = session.get(Workflow, workflow_id)
+        if not workflow:
+            raise HTTPException(status_code=404, detail="Workflow not found")
+        return workflow
+
+    @sync_app.get("/members")
+    def get_members(request: Request, response: Response, session: Session = Depends(main.get_session)):
+        etag = collection_etag(session, "members", func.count(Member.id), func.max(Member.updated_at))
+        if cached := not_modified(request, response, etag):
+            return cached
+        members = member_serializer.from_rows(session.exec(member_serializer.select()).all())
+        return FastJSONResponse(members, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
+    @sync_app.get("/chat-messages/{task_id}")
+    def get_messages(task_id: int, session: Session = Depends(main.get_session)):
+        query = message_serializer.select().where(ChatMessage.task_id == task_id).order_by(ChatMessage.created_at)
+        return FastJSONResponse(message_serializer.from_rows(session.exec(query).all()))
+
+    return sync_app
+
+
+def start_server(app: str, port: int, workdir: str, factory: bool = False) -> subprocess.Popen:
+    command = [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning", "--no-access-log"]
+    if factory:
+        command.append("--factory")
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, RATE_LIMIT="0")
+    return subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL)
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection"""
+
+    def __init__(self, base_url: str):
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.reader = self.writer = None
+
+    async def get(self, path: str) -> int:
+        return await self.request("GET", path)
+
+    async def request(self, method: str, path: str, body: bytes = b"", headers: Optional[dict] = None) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nAccept-Encoding: gzip\r\n"
+        if body:
+            head += f"Content-Length: {len(body)}\r\n"
+        for name, value in (headers or {}).items():
+            head += f"{name}: {value}\r\n"
+        self.writer.write(head.encode() + b"\r\n" + body)
+        await self.writer.drain()
+
+        response_head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = response_head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        response_headers = dict(line.lower().split(": ", 1) for line in lines[1:] if ": " in line)
+
+        if "content-length" in response_headers:
+            await self.reader.readexactly(int(response_headers["content-length"]))
+        elif response_headers.get("transfer-encoding") == "chunked":
+            while size := int((await self.reader.readline()).split(b";")[0], 16):
+                await self.reader.readexactly(size + 2)
+            await self.reader.readline()
+        if response_headers.get("connection") == "close":
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def wait_ready(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    connection = Connection(base_url)
+    while time.monotonic() < deadline:
+        try:
+            await connection.get("/")
+            connection.close()
+            return
+        except OSError:
+            connection.close()
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{base_url} did not start within {timeout}s")
+
+
+async def run_load(base_url: str, paths, concurrency: int, duration: float, make_request=None) -> dict:
+    """Drive base_url with GETs cycling through paths, or with make_request(index) -> (method, path, body, headers)"""
+    latencies, errors, client_errors = [], 0, 0
+    deadline = time.monotonic() + duration
+
+    async def worker(offset: int):
+        nonlocal errors, client_errors
+        connection = Connection(base_url)
+        index = offset
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                if make_request is None:
+                    status = await connection.get(paths[index % len(paths)])
+                else:
+                    status = await connection.request(*make_request(index))
+                if status >= 500:
+                    errors += 1
+                elif status >= 400:
+                    client_errors += 1
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+                connection.close()
+            latencies.append(time.perf_counter() - start)
+            index += 1
+        connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "client_errors": client_errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": quantiles[49] * 1000,
+        "p90_ms": quantiles[89] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", action="append", default=[], metavar="LABEL=URL")
+    parser.add_argument("--serve", action="store_true", help="start the async and threadpool servers locally")
+    parser.add_argument("--db", default=DEFAULT_DB, help="database copied for --serve")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    targets = [target.split("=", 1) for target in args.target]
+    servers = []
+    if args.serve:
+        for offset, (label, app, factory) in enumerate((
+            ("threadpool", "bench_load:build_sync_app", True),
+            ("async", "main:app", False),
+        )):
+            workdir = tempfile.mkdtemp(prefix=f"bench_load_{label}_")
+            shutil.copy(args.db, os.path.join(workdir, "workspaceflow.db"))
+            port = args.port + offset
+            servers.append(start_server(app, port, workdir, factory))
+            targets.append((label, f"http://127.0.0.1:{port}"))
+
+    if not targets:
+        parser.error("give at least one --target or --serve")
+
+    try:
+        results = []
+        for label, base_url in targets:
+            await wait_ready(base_url)
+            await run_load(base_url, args.paths, min(args.concurrency, 20), 1)
+            results.append((label, await run_load(base_url, args.paths, args.concurrency, args.duration)))
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+    print(f"{args.concurrency} clients, {args.duration:.0f}s, paths: {' '.join(args.paths)}\n")
+    print(f"{'target':<14}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for label, result in results:
+        print(f"{label:<14}{result['requests']:>10}{result['errors']:>8}{result['rps']:>10.0f}"
+              f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
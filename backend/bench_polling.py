@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Bytes and CPU per 30-second poll cycle, with and without conditional GET.
+
+Runs the app in-process against a throwaway database seeded with
+--members members and --attachments attachments, then replays the frontend's
+poll cycle (workspace, workflow, task, members, attachments) --cycles times:
+once as a client that ignores ETags, once as a client that sends
+If-None-Match with the tags it got last time.
+
+    python bench_polling.py --cycles 200 --members 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def seed(session, members: int, attachments: int):
+    from models import Attachment, Member, StatusColumn, StatusTemplate, Task, Workflow, Workspace
+
+    session.add_all(
+        Member(first_name=f"First{i}", last_name=f"Last{i}", email=f"member{i}@example.com",
+               phoneNumber=None, password="x")
+        for i in range(members)
+    )
+    session.add(Workspace(name="Bench", created_by=1))
+    session.add(StatusTemplate(name="Bench", category="Bench", description="", created_by=1))
+    session.commit()
+    session.add(StatusColumn(name="Todo", position=1, template_id=1))
+    session.add(Workflow(name="Bench", workspace_id=1, created_by=1))
+    session.commit()
+    session.add(Task(title="Bench task", description="x" * 500, workflow_id=1, column_id=1,
+                     estimated_hours=1, created_by=1))
+    session.commit()
+    session.add_all(
+        Attachment(unique_filename=f"{i}.txt", original_filename=f"file{i}", file_extension=".txt",
+                   file_path=f"files/{i}.txt", file_size=1024 * i, task_id=1, uploaded_by=1 + i % members)
+        for i in range(attachments)
+    )
+    session.commit()
+
+
+def run_cycles(client, urls, cycles: int, conditional: bool):
+    etags = {}
+    received = 0
+    statuses = {}
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+
+    for _ in range(cycles):
+        for url in urls:
+            headers = {"If-None-Match": etags[url]} if conditional and url in etags else {}
+            response = client.get(url, headers=headers)
+            received += len(response.content) + sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if "etag" in response.headers:
+                etags[url] = response.headers["etag"]
+
+    return {
+        "bytes_per_cycle": received / cycles,
+        "cpu_ms_per_cycle": (time.process_time() - cpu_start) * 1000 / cycles,
+        "wall_ms_per_cycle": (time.perf_counter() - wall_start) * 1000 / cycles,
+        "statuses": statuses
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cycles", type=int, default=100)
+    parser.add_argument("--members", type=int, default=200)
+    parser.add_argument("--attachments", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_polling_")
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ["RATE_LIMIT"] = "0"
+
+    import main as api
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session
+
+    with Session(api.engine) as session:
+        seed(session, args.members, args.attachments)
+
+    urls = ["/workspaces/1", "/workflows/1", "/tasks/1", "/members", "/attachments?task_id=1"]
+    client = TestClient(api.app)
+    run_cycles(client, urls, 5, conditional=False)
+
+    plain = run_cycles(client, urls, args.cycles, conditional=False)
+    conditional = run_cycles(client, urls, args.cycles, conditional=True)
+
+    print(f"{'':<14}{'bytes/cycle':>14}{'cpu ms/cycle':>14}{'wall ms/cycle':>15}  statuses")
+    for label, result in (("full 200", plain), ("conditional", conditional)):
+        print(f"{label:<14}{result['bytes_per_cycle']:>14.0f}{result['cpu_ms_per_cycle']:>14.2f}"
+              f"{result['wall_ms_per_cycle']:>15.2f}  {result['statuses']}")
+    print(f"\nbytes saved: {100 * (1 - conditional['bytes_per_cycle'] / plain['bytes_per_cycle']):.1f}%  "
+          f"cpu saved: {100 * (1 - conditional['cpu_ms_per_cycle'] / plain['cpu_ms_per_cycle']):.1f}%")
+    print(f"database: {os.path.join(workdir, 'workspaceflow.db')}")
+
+
+if __name__ == "__main__":
+    main()
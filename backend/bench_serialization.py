@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Serialization microbenchmarks for list responses.
+
+Loads --rows synthetic rows of Task, Member, ChatMessage and ActivityLog
+into an in-memory SQLite database and times each path a list endpoint can
+take from the query to response bytes:
+
+  response_model   ORM objects, validated into the response model, then dumped
+  jsonable         ORM objects, jsonable_encoder + json.dumps
+  fast objects     ORM objects, RowSerializer.from_objects + serializers.dumps
+  fast rows        Core select of the columns, RowSerializer.from_rows + dumps
+
+and reports the gzip ratio of the result.
+
+    python bench_serialization.py --rows 5000 --repeat 5
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from models import ActivityLog, ChatMessage, Member, Task
+from serializers import (
+    activity_serializer, dumps, member_serializer, message_serializer, orjson, task_serializer
+)
+
+
+def make_rows(count: int):
+    now = datetime.now(timezone.utc)
+    return {
+        "Task": (Task, task_serializer, [
+            Task(id=i, title=f"Task {i}", description="Lorem ipsum " * 20, workflow_id=1 + i % 10,
+                 column_id=1 + i % 5, start_date=now.date(), end_date=(now + timedelta(days=5)).date(),
+                 estimated_hours=8.0, actual_hours=2.5, progress_percentage=40.0, created_by=1,
+                 created_at=now, updated_at=now)
+            for i in range(count)
+        ]),
+        "Member": (Member, member_serializer, [
+            Member(id=i, first_name=f"First{i}", last_name=f"Last{i}", email=f"m{i}@example.com",
+                   phoneNumber=str(500000000 + i), password="x" * 60, created_at=now, updated_at=now)
+            for i in range(count)
+        ]),
+        "ChatMessage": (ChatMessage, message_serializer, [
+            ChatMessage(id=i, content="Message body " * 10, task_id=1 + i % 100, author_id=1 + i % 50,
+                        created_at=now, updated_at=now)
+            for i in range(count)
+        ]),
+        "ActivityLog": (ActivityLog, activity_serializer, [
+            ActivityLog(id=i, action="status_changed", entity_type="task", entity_id=i,
+                        description=f"Status changed: Task {i}", member_id=1, workspace_id=1, task_id=i,
+                        created_at=now)
+            for i in range(count)
+        ]),
+    }
+
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"encoder: {'orjson' if orjson else 'json (install orjson for the fast path)'}, rows: {args.rows}\n")
+    print(f"{'model':<13}{'response_model':>16}{'jsonable':>12}{'fast objects':>14}{'fast rows':>12}"
+          f"{'speedup':>10}{'gzip':>8}")
+
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    datasets = make_rows(args.rows)
+    with Session(engine) as session:
+        for _, _, objects in datasets.values():
+            session.add_all(objects)
+        session.commit()
+
+    def load_objects(session, model):
+        session.expunge_all()
+        return session.exec(select(model)).all()
+
+    for name, (model, serializer, _) in datasets.items():
+        adapter = TypeAdapter(List[model])
+        with Session(engine) as session:
+            response_model = best_of(args.repeat, lambda: adapter.dump_json(
+                adapter.validate_python(load_objects(session, model), from_attributes=True)))
+            jsonable = best_of(args.repeat, lambda: json.dumps(
+                jsonable_encoder(load_objects(session, model))).encode())
+            fast_objects = best_of(args.repeat, lambda: dumps(
+                serializer.from_objects(load_objects(session, model))))
+            fast_rows = best_of(args.repeat, lambda: dumps(
+                serializer.from_rows(session.exec(serializer.select()).all())))
+            body = dumps(serializer.from_rows(session.exec(serializer.select()).all()))
+
+        ratio = len(gzip.compress(body, compresslevel=9)) / len(body)
+
+        print(f"{name:<13}{response_model:>14.1f}ms{jsonable:>10.1f}ms{fast_objects:>12.1f}ms"
+              f"{fast_rows:>10.1f}ms{min(response_model, jsonable) / fast_rows:>9.1f}x{ratio:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Read throughput against `run_api.py --prod` for a range of worker counts.
+
+For each --workers value the script starts the production server on a copy
+of --db (switched to WAL by the server), waits for /health/ready, drives it
+with --client-procs load processes from bench_load for --duration seconds,
+then stops it with SIGTERM and times the graceful shutdown.
+
+Scaling is reported against the single-worker run; on SQLite in WAL mode
+reads do not block each other, so it stays close to linear until the
+workers outnumber the cores left over by the load generators.
+
+    python bench_workers.py --workers 1 2 4 8 --concurrency 256 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+from bench_load import DEFAULT_DB, DEFAULT_PATHS, Connection, run_load
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_process(job):
+    base_url, paths, concurrency, duration = job
+    return asyncio.run(run_load(base_url, paths, concurrency, duration))
+
+
+async def wait_ready(base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        connection = Connection(base_url)
+        try:
+            if await connection.get("/health/ready") == 200:
+                return
+        except OSError:
+            pass
+        finally:
+            connection.close()
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"{base_url} not ready within {timeout}s")
+
+
+def measure(workers: int, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"bench_workers_{workers}_")
+    shutil.copy(args.db, os.path.join(workdir, "workspaceflow.db"))
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "run_api.py"), "--prod", "--workers", str(workers),
+         "--host", "127.0.0.1", "--port", str(args.port)],
+        cwd=workdir, env=dict(os.environ, PYTHONPATH=BACKEND_DIR, RATE_LIMIT="0"),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        asyncio.run(wait_ready(base_url))
+        per_process = max(args.concurrency // args.client_procs, 1)
+        with Pool(args.client_procs) as pool:
+            pool.map(load_process, [(base_url, args.paths, per_process, 1)] * args.client_procs)
+            results = pool.map(load_process, [(base_url, args.paths, per_process, args.duration)] * args.client_procs)
+    finally:
+        stop_started = time.perf_counter()
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+        shutdown_seconds = time.perf_counter() - stop_started
+
+    return {
+        "requests": sum(result["requests"] for result in results),
+        "errors": sum(result["errors"] for result in results),
+        "rps": sum(result["rps"] for result in results),
+        # Worst client process; percentiles cannot be merged exactly from summaries
+        "p50_ms": max(result["p50_ms"] for result in results),
+        "p99_ms": max(result["p99_ms"] for result in results),
+        "shutdown_s": shutdown_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--db", default=DEFAULT_DB)
+    parser.add_argument("--port", type=int, default=8111)
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--client-procs", type=int, default=max((os.cpu_count() or 2) // 2, 1))
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores, {args.client_procs} load processes, {args.concurrency} connections\n")
+    print(f"{'workers':>8}{'req/s':>10}{'scaling':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'shutdown s':>12}")
+    baseline = None
+    for workers in args.workers:
+        result = measure(workers, args)
+        baseline = baseline or result["rps"] / workers
+        print(f"{workers:>8}{result['rps']:>10.0f}{result['rps'] / (baseline * workers):>10.0%}"
+              f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['errors']:>8}{result['shutdown_s']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Reproducible end-to-end benchmark of the user-facing flows.
+
+Starts `run_api.py --prod` on a copy of --db (build one with
+generate_data.py), drives each scenario for --duration seconds with
+--concurrency keep-alive clients and writes a JSON report with throughput,
+p50/p90/p99/max latency, error counts and the server's peak resident memory,
+tagged with the git commit and the parameters of the run. Request targets are
+drawn from the database with a seeded generator, so two runs with the same
+--seed and dataset send the same traffic.
+
+Scenarios:
+    board        GET /tasks?workflow_id= and /workflows/{id}, the board load
+    chat         GET /chat-messages/{task_id}, one in five requests posts a message
+    task_update  PUT /tasks/{id} moving tasks between columns
+    upload       multipart POST /api/messages with an --upload-kb attachment
+    login        POST /login (bcrypt bound)
+
+    python generate_data.py --db bench.db --preset small
+    python benchmark.py --db bench.db --output before.json
+    python benchmark.py --db bench.db --output after.json --scenarios board chat
+    python benchmark.py --compare before.json after.json --threshold 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from bench_load import DEFAULT_DB, run_load
+from bench_workers import wait_ready
+from generate_data import BENCH_PASSWORD
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_SIZE = 1000
+# Report fields compared by --compare, and whether a higher value is better
+COMPARED = {"rps": True, "p50_ms": False, "p99_ms": False, "peak_rss_mb": False}
+
+
+def sample(connection, query: str, rng: random.Random) -> list:
+    rows = connection.execute(query).fetchall()
+    if not rows:
+        raise SystemExit(f"No rows for benchmark targets: {query}")
+    return rng.sample(rows, min(SAMPLE_SIZE, len(rows)))
+
+
+def get(path: str):
+    return "GET", path, b"", None
+
+
+def json_request(method: str, path: str, payload: dict):
+    return method, path, json.dumps(payload).encode(), {"Content-Type": "application/json"}
+
+
+def multipart(fields: dict, filename: str, content: bytes):
+    boundary = "benchmark-form-boundary"
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="attachment"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n".encode() + content + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+def build_scenarios(db_path: str, seed: int, upload_kb: int) -> dict:
+    """Scenario name -> make_request(index) -> (method, path, body, headers), targets sampled from db_path"""
+    rng = random.Random(seed)
+    with sqlite3.connect(db_path) as connection:
+        workflows = [row[0] for row in sample(connection, "SELECT id FROM workflow", rng)]
+        tasks = sample(connection, (
+            "SELECT task.id, task.workflow_id, workflow.workspace_id, task.created_by FROM task "
+            "JOIN workflow ON workflow.id = task.workflow_id"
+        ), rng)
+        columns = [row[0] for row in connection.execute(
+            "SELECT DISTINCT column_id FROM task ORDER BY column_id"
+        ).fetchall()]
+        emails = [row[0] for row in sample(connection, "SELECT email FROM member WHERE email LIKE '%@bench.example'", rng)]
+    # Chat traffic concentrates on a few busy tasks, like the generated data
+    chat_tasks = tasks[:max(len(tasks) // 20, 1)]
+    attachment = rng.randbytes(upload_kb * 1024)
+
+    def board(index):
+        workflow_id = workflows[index // 2 % len(workflows)]
+        return get(f"/tasks?workflow_id={workflow_id}") if index % 2 else get(f"/workflows/{workflow_id}")
+
+    def chat(index):
+        task_id, _, _, author_id = chat_tasks[index % len(chat_tasks)]
+        if index % 5:
+            return get(f"/chat-messages/{task_id}")
+        return json_request("POST", f"/chat-messages?author_id={author_id}",
+                            {"content": f"Benchmark message {index}", "task_id": task_id, "is_attachment": False})
+
+    def task_update(index):
+        task_id = tasks[index % len(tasks)][0]
+        return json_request("PUT", f"/tasks/{task_id}", {
+            "column_id": columns[index % len(columns)], "progress_percentage": float(index * 10 % 100)
+        })
+
+    def upload(index):
+        task_id, workflow_id, workspace_id, user_id = tasks[index % len(tasks)]
+        body, headers = multipart(
+            {"task_id": task_id, "user_id": user_id, "workspace_id": workspace_id, "workflow_id": workflow_id},
+            f"benchmark-{index}.bin", attachment
+        )
+        return "POST", "/api/messages", body, headers
+
+    def login(index):
+        return json_request("POST", "/login", {"email": emails[index % len(emails)], "password": BENCH_PASSWORD})
+
+    return {"board": board, "chat": chat, "task_update": task_update, "upload": upload, "login": login}
+
+
+def rss_bytes(pid: int) -> int:
+    """Resident memory of pid and all of its descendants, from /proc"""
+    total = 0
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1]) * 1024
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as children:
+                total += sum(rss_bytes(int(child)) for child in children.read().split())
+    except (FileNotFoundError, ProcessLookupError):
+        pass
+    return total
+
+
+class MemorySampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.25):
+        super().__init__(daemon=True)
+        self.pid, self.interval = pid, interval
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes(self.pid))
+
+    def stop(self) -> int:
+        self.stopped.set()
+        self.join()
+        return self.peak
+
+
+def git_commit() -> dict:
+    def git(*args):
+        result = subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def dataset_summary(db_path: str) -> dict:
+    with sqlite3.connect(db_path) as connection:
+        return {
+            table: connection.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+            for table in ("workspace", "member", "workflow", "task", "subtask", "chatmessage", "activitylog")
+        }
+
+
+def run(args) -> dict:
+    if args.in_place:
+        db_path, workdir = os.path.abspath(args.db), os.path.dirname(os.path.abspath(args.db))
+    else:
+        workdir = tempfile.mkdtemp(prefix="benchmark_")
+        db_path = os.path.join(workdir, "workspaceflow.db")
+        shutil.copy(args.db, db_path)
+    scenarios = build_scenarios(db_path, args.seed, args.upload_kb)
+    dataset = dataset_summary(db_path)
+
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "run_api.py"), "--prod", "--workers", str(args.workers),
+         "--host", "127.0.0.1", "--port", str(args.port)],
+        cwd=workdir, env=dict(os.environ, PYTHONPATH=BACKEND_DIR, DATABASE_URL=f"sqlite:///{db_path}",
+                              LOG_LEVEL="WARNING", RATE_LIMIT="0"),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = {}
+    try:
+        asyncio.run(wait_ready(base_url))
+        idle_rss = rss_bytes(server.pid)
+        for name in args.scenarios:
+            make_request = scenarios[name]
+            asyncio.run(run_load(base_url, None, min(args.concurrency, 8), args.warmup, make_request))
+            sampler = MemorySampler(server.pid)
+            sampler.start()
+            result = asyncio.run(run_load(base_url, None, args.concurrency, args.duration, make_request))
+            result["peak_rss_mb"] = sampler.stop() / 2**20
+            results[name] = result
+            print(f"{name:<13}{result['requests']:>9}{result['errors']:>7}{result['client_errors']:>7}"
+                  f"{result['rps']:>9.0f}{result['p50_ms']:>9.1f}{result['p90_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                  f"{result['max_ms']:>9.1f}{result['peak_rss_mb']:>9.0f}", flush=True)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    return {
+        **git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "parameters": {key: getattr(args, key) for key in (
+            "workers", "concurrency", "duration", "warmup", "seed", "upload_kb"
+        )},
+        "dataset": dataset,
+        "idle_rss_mb": idle_rss / 2**20,
+        "scenarios": results,
+    }
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    """Print per-scenario changes; the number of metrics that regressed by more than threshold percent"""
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+    print(f"{(old.get('commit') or '?')[:10]} -> {(new.get('commit') or '?')[:10]}, threshold {threshold:.0f}%\n")
+    print(f"{'scenario':<13}{'metric':<13}{'old':>10}{'new':>10}{'change':>9}")
+    regressions = 0
+    for name, new_result in new["scenarios"].items():
+        old_result = old["scenarios"].get(name)
+        if old_result is None:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            before, after = old_result.get(metric), new_result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            regressed = (-change if higher_is_better else change) > threshold
+            regressions += regressed
+            print(f"{name:<13}{metric:<13}{before:>10.1f}{after:>10.1f}{change:>+8.1f}%"
+                  f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DEFAULT_DB)
+    parser.add_argument("--in-place", action="store_true", help="run against --db itself instead of a copy")
+    parser.add_argument("--scenarios", nargs="+", default=["board", "chat", "task_update", "upload", "login"],
+                        choices=["board", "chat", "task_update", "upload", "login"])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8121)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--upload-kb", type=int, default=64)
+    parser.add_argument("--output", help="JSON report path")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two reports and exit")
+    parser.add_argument("--threshold", type=float, default=10, help="percent change counted as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        print(f"\n{regressions} regression(s)")
+        sys.exit(1 if regressions else 0)
+
+    print(f"{args.workers} worker(s), {args.concurrency} connections, {args.duration:.0f}s per scenario\n")
+    print(f"{'scenario':<13}{'requests':>9}{'5xx':>7}{'4xx':>7}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}"
+          f"{'max ms':>9}{'rss MB':>9}")
+    report = run(args)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Bulk loading for seed scripts and imports.
+
+BulkLoader runs a whole load in one transaction on one connection. Each
+table is written with Core executemany inserts of batch_size rows, with no
+ORM unit of work. While the load runs on SQLite:
+
+- the connection is tuned with LOAD_PRAGMAS;
+- the aggregate triggers from analytics.py and inbox.py are dropped, so
+  rows do not each pay for their counter updates;
+- the secondary (non-unique) indexes of every table written to are dropped,
+  so each is built once at the end instead of updated row by row.
+
+On success the indexes and triggers are recreated, and the aggregate tables
+are rebuilt from the loaded rows; only for workspace_id when a load touches
+a single workspace. All of this happens before the single commit. On error
+everything rolls back, including the dropped indexes and triggers. SQLite's write lock is held from the first statement, so
+concurrent writers wait rather than slipping past the missing triggers.
+
+    with BulkLoader(engine) as loader:
+        loader.insert(Member, member_rows)
+        loader.insert(Task, task_rows)
+"""
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+from sqlalchemy import delete, func, insert, select
+from sqlmodel import Session, SQLModel
+
+from analytics import ANALYTICS_TRIGGERS, rebuild_analytics
+from inbox import INBOX_TRIGGERS, rebuild_member_counters
+
+DEFAULT_BATCH_SIZE = 10_000
+
+# Durability is only needed at commit; a failed load is rolled back or rerun
+LOAD_PRAGMAS = {
+    "synchronous": "OFF",
+    "cache_size": "-262144",  # 256 MiB
+    "temp_store": "MEMORY",
+}
+
+DEFERRED_TRIGGERS = {**ANALYTICS_TRIGGERS, **INBOX_TRIGGERS}
+
+
+def chunks(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class BulkLoader:
+    def __init__(self, engine, batch_size: int = DEFAULT_BATCH_SIZE, defer_indexes: bool = True):
+        self.engine = engine
+        self.batch_size = batch_size
+        # Rebuilding an index walks the whole table, so small loads into big tables should keep them
+        self.defer_indexes = defer_indexes
+        self.sqlite = engine.dialect.name == "sqlite"
+        self.counts = {}
+        # Set when every loaded task belongs to this workspace, to rebuild only its aggregates
+        self.workspace_id = None
+        self._dropped_indexes = []
+        self._saved_pragmas = {}
+        self.connection = None
+
+    def __enter__(self) -> "BulkLoader":
+        self.connection = self.engine.connect()
+        if self.sqlite:
+            for name, value in LOAD_PRAGMAS.items():
+                self._saved_pragmas[name] = self.connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+                self.connection.exec_driver_sql(f"PRAGMA {name}={value}")
+            # pysqlite does not open a transaction for DDL; take the write lock explicitly
+            self.connection.exec_driver_sql("BEGIN IMMEDIATE")
+            for name in DEFERRED_TRIGGERS:
+                self.connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        else:
+            self.connection.begin()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is None:
+                self._finish()
+                self.connection.commit()
+            else:
+                self.connection.rollback()
+        finally:
+            if self.sqlite:
+                for name, value in self._saved_pragmas.items():
+                    self.connection.exec_driver_sql(f"PRAGMA {name}={value}")
+            self.connection.close()
+            self.connection = None
+
+    def _finish(self):
+        for index in self._dropped_indexes:
+            index.create(self.connection)
+        if self.sqlite:
+            for ddl in DEFERRED_TRIGGERS.values():
+                self.connection.exec_driver_sql(ddl)
+            # The rebuild helpers commit; a session joined to the open transaction only releases a savepoint
+            with Session(bind=self.connection, join_transaction_mode="create_savepoint") as session:
+                rebuild_analytics(session, self.workspace_id)
+                rebuild_member_counters(session)
+
+    def _prepare(self, table):
+        if table.name in self.counts:
+            return
+        self.counts[table.name] = 0
+        if not self.defer_indexes:
+            return
+        for index in table.indexes:
+            if not index.unique:
+                index.drop(self.connection)
+                self._dropped_indexes.append(index)
+
+    def insert(self, model, rows: Iterable[dict]) -> int:
+        """Insert rows (dicts of column values) into model's table; returns the number written"""
+        table = model.__table__
+        self._prepare(table)
+        written = 0
+        for batch in chunks(rows, self.batch_size):
+            self.connection.execute(insert(table), batch)
+            written += len(batch)
+        self.counts[table.name] += written
+        return written
+
+    def next_id(self, model) -> int:
+        """First free integer primary key of model's table, for callers that assign ids themselves"""
+        return (self.connection.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+    def clear(self, models=None):
+        """Delete every row of models (default: all tables), children first"""
+        tables = [model.__table__ for model in models] if models else SQLModel.metadata.sorted_tables
+        for table in sorted(tables, key=SQLModel.metadata.sorted_tables.index, reverse=True):
+            self.connection.execute(delete(table))
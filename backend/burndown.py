@@ -0,0 +1,263 @@
+"""
+Daily per-column task counts for burndown and cumulative-flow charts.
+
+History is reconstructed from the task table and the `status_changed`,
+`subtask_completed` and `subtask_reverted` activity rows. A task's column on
+any past day is found by starting from its current column and rewinding the
+status changes that happened after that day, so only events newer than the
+last stored day need to be read.
+
+Finished days are written once to WorkflowDailySnapshot and never change;
+each request only extends the table with the days that elapsed since the
+last call, and today's row is computed live.
+"""
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+import pytz
+from sqlalchemy import String, cast, func, insert, literal, text
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from models import ActivityLog, StatusColumn, Task, Workflow, WorkflowDailySnapshot, ksa_now
+
+STATUS_CHANGED = "status_changed"
+SUBTASK_COMPLETED = "subtask_completed"
+SUBTASK_REVERTED = "subtask_reverted"
+
+KSA = pytz.timezone('Asia/Riyadh')
+
+# Every column move is logged in the same statement as the move, whichever path made it.
+# created_at is written in the microsecond format SQLAlchemy stores datetimes in.
+STATUS_LOG_TRIGGERS = {
+    "task_status_log": f"""
+        CREATE TRIGGER task_status_log AFTER UPDATE OF column_id ON task
+        WHEN OLD.column_id != NEW.column_id
+        BEGIN
+            INSERT INTO activitylog (
+                action, entity_type, entity_id, task_id, workspace_id, description, old_value, new_value, created_at
+            )
+            SELECT '{STATUS_CHANGED}', 'task', NEW.id, NEW.id, workspace_id, 'Status changed: ' || NEW.title,
+                   CAST(OLD.column_id AS TEXT), CAST(NEW.column_id AS TEXT),
+                   strftime('%Y-%m-%d %H:%M:%f', 'now') || '000'
+            FROM workflow WHERE id = NEW.workflow_id;
+        END
+    """,
+}
+
+
+def _as_date(value) -> Optional[date]:
+    """Calendar day of a stored timestamp, in the app's local time"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(KSA)
+        return value.date()
+    return value
+
+
+def _day_start(day: date) -> datetime:
+    return KSA.localize(datetime.combine(day, time.min))
+
+
+def _replay(session: Session, workflow_id: int, first_day: date, last_day: date) -> List[WorkflowDailySnapshot]:
+    """Rebuild the end-of-day column counts of a workflow for first_day..last_day"""
+    tasks = session.exec(
+        select(Task.id, Task.column_id, Task.created_at, Task.completed_at)
+        .where(Task.workflow_id == workflow_id, Task.deleted_at.is_(None))
+    ).all()
+    if not tasks:
+        return []
+
+    events = session.exec(
+        select(ActivityLog.task_id, ActivityLog.action, ActivityLog.old_value,
+               ActivityLog.new_value, ActivityLog.created_at)
+        .join(Task, ActivityLog.task_id == Task.id)
+        .where(
+            Task.workflow_id == workflow_id,
+            Task.deleted_at.is_(None),
+            ActivityLog.action.in_([STATUS_CHANGED, SUBTASK_COMPLETED, SUBTASK_REVERTED]),
+            ActivityLog.created_at >= _day_start(first_day)
+        )
+        .order_by(ActivityLog.created_at, ActivityLog.id)
+    ).all()
+
+    # Rewind every status change made since first_day to find the columns at its start
+    column = {task_id: column_id for task_id, column_id, _, _ in tasks}
+    for task_id, action, old_value, _, _ in reversed(events):
+        if action == STATUS_CHANGED and old_value is not None:
+            column[task_id] = int(old_value)
+
+    created_on = defaultdict(list)
+    completed_on = defaultdict(list)
+    events_on = defaultdict(list)
+    for task_id, _, created_at, completed_at in tasks:
+        created_on[max(_as_date(created_at), first_day)].append(task_id)
+        if completed_at is not None:
+            completed_on[max(_as_date(completed_at), first_day)].append(task_id)
+    for event in events:
+        events_on[_as_date(event.created_at)].append(event)
+
+    present = set()
+    is_open = {}
+    task_count = Counter()
+    open_count = Counter()
+    snapshots = []
+
+    day = first_day
+    while day <= last_day:
+        subtasks_completed = Counter()
+
+        for task_id in created_on.get(day, ()):
+            present.add(task_id)
+            is_open[task_id] = True
+            task_count[column[task_id]] += 1
+            open_count[column[task_id]] += 1
+
+        for task_id, action, _, new_value, _ in events_on.get(day, ()):
+            if task_id not in present:
+                continue
+            # Anything else, such as a move to no column (column_id set to NULL), is skipped
+            if action == STATUS_CHANGED and new_value is not None:
+                old_column, new_column = column[task_id], int(new_value)
+                task_count[old_column] -= 1
+                task_count[new_column] += 1
+                if is_open[task_id]:
+                    open_count[old_column] -= 1
+                    open_count[new_column] += 1
+                column[task_id] = new_column
+            elif action == SUBTASK_COMPLETED:
+                subtasks_completed[column[task_id]] += 1
+            elif action == SUBTASK_REVERTED:
+                subtasks_completed[column[task_id]] -= 1
+
+        for task_id in completed_on.get(day, ()):
+            if is_open.get(task_id):
+                is_open[task_id] = False
+                open_count[column[task_id]] -= 1
+
+        for column_id in set(task_count) | set(subtasks_completed):
+            if task_count[column_id] or subtasks_completed[column_id]:
+                snapshots.append(WorkflowDailySnapshot(
+                    workflow_id=workflow_id, day=day, column_id=column_id,
+                    task_count=task_count[column_id], open_count=open_count[column_id],
+                    subtasks_completed=subtasks_completed[column_id]
+                ))
+        day += timedelta(days=1)
+
+    return snapshots
+
+
+def extend_snapshots(session: Session, workflow_id: int):
+    """Store snapshots for every finished day not yet in the table"""
+    yesterday = ksa_now().date() - timedelta(days=1)
+
+    last_stored = session.exec(
+        select(func.max(WorkflowDailySnapshot.day)).where(WorkflowDailySnapshot.workflow_id == workflow_id)
+    ).one()
+    if last_stored is not None:
+        first_day = last_stored + timedelta(days=1)
+    else:
+        first_created = session.exec(
+            select(func.min(Task.created_at)).where(Task.workflow_id == workflow_id, Task.deleted_at.is_(None))
+        ).one()
+        if first_created is None:
+            return
+        first_day = _as_date(first_created)
+
+    if first_day > yesterday:
+        return
+
+    session.add_all(_replay(session, workflow_id, first_day, yesterday))
+    try:
+        session.commit()
+    except IntegrityError:
+        # Another request stored the same days first
+        session.rollback()
+
+
+def flow_history(session: Session, workflow_id: int, start: date, end: date) -> Dict:
+    """Daily per-column counts and remaining open tasks for a date range"""
+    today = ksa_now().date()
+    extend_snapshots(session, workflow_id)
+
+    snapshots = list(session.exec(
+        select(WorkflowDailySnapshot)
+        .where(
+            WorkflowDailySnapshot.workflow_id == workflow_id,
+            WorkflowDailySnapshot.day >= start,
+            WorkflowDailySnapshot.day <= min(end, today - timedelta(days=1))
+        )
+    ).all())
+    if start <= today <= end:
+        snapshots.extend(_replay(session, workflow_id, today, today))
+
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    index = {day: position for position, day in enumerate(days)}
+
+    counts = defaultdict(lambda: [0] * len(days))
+    remaining = [0] * len(days)
+    subtasks_completed = [0] * len(days)
+    for snapshot in snapshots:
+        position = index[snapshot.day]
+        counts[snapshot.column_id][position] = snapshot.task_count
+        remaining[position] += snapshot.open_count
+        subtasks_completed[position] += snapshot.subtasks_completed
+
+    columns = session.exec(
+        select(StatusColumn).where(StatusColumn.id.in_(list(counts)))
+    ).all() if counts else []
+    names = {column.id: (column.name, column.position) for column in columns}
+
+    return {
+        "workflow_id": workflow_id,
+        "start": start,
+        "end": end,
+        "days": days,
+        "columns": [
+            {"column_id": column_id, "name": names.get(column_id, (None, 0))[0], "counts": counts[column_id]}
+            for column_id in sorted(counts, key=lambda c: names.get(c, (None, 0))[1])
+        ],
+        "remaining": remaining,
+        "subtasks_completed": subtasks_completed
+    }
+
+
+def install_status_log(engine):
+    """(Re)create the status-change trigger; without it callers use log_status_change"""
+    if engine.dialect.name != "sqlite":
+        return
+
+    with Session(engine) as session:
+        for name, ddl in STATUS_LOG_TRIGGERS.items():
+            session.exec(text(f"DROP TRIGGER IF EXISTS {name}"))
+            session.exec(text(ddl))
+        session.commit()
+
+
+def log_status_change(session: Session, task_id: int, column_id: int, title: Optional[str] = None,
+                      expected_version: Optional[int] = None):
+    """Record a STATUS_CHANGED row if task_id is moving to column_id, where no trigger does
+
+    Runs as INSERT ... SELECT before the task's UPDATE, so the old column is
+    read by the write itself; nothing is logged when the task is already in
+    column_id or no longer at expected_version.
+    """
+    if session.get_bind().dialect.name == "sqlite":
+        return
+    now = ksa_now()
+    source = (
+        select(
+            literal(STATUS_CHANGED), literal("task"), Task.id, Task.id, Workflow.workspace_id,
+            literal("Status changed: ") + (literal(title) if title is not None else Task.title),
+            cast(Task.column_id, String), literal(str(column_id)), literal(now, ActivityLog.created_at.type),
+        )
+        .join(Workflow, Workflow.id == Task.workflow_id)
+        .where(Task.id == task_id, Task.column_id != column_id)
+    )
+    if expected_version is not None:
+        source = source.where(Task.version == expected_version)
+    session.exec(insert(ActivityLog).from_select([
+        "action", "entity_type", "entity_id", "task_id", "workspace_id",
+        "description", "old_value", "new_value", "created_at",
+    ], source))
@@ -0,0 +1,85 @@
+"""
+Small in-process cache for computed read models.
+
+KeyedCache entries are grouped by namespace (typically a workspace id) so
+that a write can drop everything derived from that namespace in one call.
+
+VersionedCache entries are tagged with a counter stored in the CacheVersion
+table. Writers bump the counter in the same transaction as their change, and
+readers compare it (a primary-key lookup) before serving the cached value, so
+every worker process notices a change made by any other worker.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Tuple
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from models import CacheVersion
+
+
+class KeyedCache:
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: Hashable, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get((namespace, key), default)
+            if entry is not default:
+                self._entries.move_to_end((namespace, key))
+            return entry
+
+    def set(self, namespace: Hashable, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[(namespace, key)] = value
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace: Hashable):
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == namespace]:
+                del self._entries[entry_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def bump_version(session: Session, name: str) -> int:
+    """Mark everything cached under name as stale; committed with the caller's transaction. The new version"""
+    return session.exec(text(
+        "INSERT INTO cacheversion (name, version) VALUES (:name, 1) "
+        "ON CONFLICT (name) DO UPDATE SET version = cacheversion.version + 1 "
+        "RETURNING version"
+    ).bindparams(name=name)).scalar_one()
+
+
+def current_version(session: Session, name: str) -> int:
+    return session.exec(select(CacheVersion.version).where(CacheVersion.name == name)).first() or 0
+
+
+class VersionedCache:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, session: Session, name: str, loader: Callable[[Session], Any]) -> Tuple[int, Any]:
+        """Return (version, value), reloading the value when the stored version moved"""
+        version = current_version(session, name)
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is not None and entry[0] == version:
+            return entry
+
+        entry = (version, loader(session))
+        with self._lock:
+            self._entries[name] = entry
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Fail when a board or chat endpoint runs more SQL statements than its budget.
+
+Runs the app in-process against a throwaway database seeded with --rows
+tasks, messages and assignees per parent, so an endpoint that slips back
+into one query per row blows its budget by roughly --rows. Each endpoint is
+called under querydebug.query_budget and must also succeed; on failure the
+repeated statement shapes and the lines that issued them are printed and the
+exit status is 1.
+
+    python check_query_budgets.py
+    python check_query_budgets.py --rows 200 --verbose
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def endpoint_budgets(rows: int):
+    """(method, path, json body, maximum statements) for each checked endpoint"""
+    return [
+        ("GET", "/tasks?workflow_id=1", None, 1),
+        ("GET", "/tasks/1", None, 2),
+        ("GET", "/workflows/1", None, 2),
+        ("GET", "/workflows/1/gantt", None, 5),
+        ("GET", "/subtasks?task_id=1", None, 1),
+        ("GET", "/assignees?task_id=1", None, 1),
+        ("GET", "/workflows/1/assignees", None, 1),
+        ("GET", "/chat-messages/1", None, 1),
+        ("GET", "/members", None, 2),
+        ("GET", "/members/1/tasks", None, 2),
+        ("GET", "/attachments?task_id=1", None, 2),
+        ("GET", "/activities?task_id=1", None, 1),
+        ("GET", "/workspaces/1/workload", None, 4),
+        ("POST", "/tasks?created_by=1",
+         {"title": "Budget", "workflow_id": 1, "column_id": 1, "assignee_ids": list(range(1, rows + 1))}, 8),
+        ("POST", "/chat-messages?author_id=1", {"content": "Budget", "task_id": 1, "is_attachment": False}, 4),
+        ("PUT", "/tasks/1", {"title": "Budget"}, 1),
+        ("PUT", "/subtasks/1", {"completed": True}, 1),
+        ("PUT", "/workflows/1", {"name": "Budget"}, 1),
+        ("PATCH", "/tasks/1", {"column_id": 2}, 1),
+        ("DELETE", "/tasks/2", None, 3),
+        ("POST", "/tasks/2/restore", None, 3),
+        ("GET", "/members/2/notifications", None, 1),
+        ("GET", "/members/2/notifications/unread-count", None, 1),
+    ]
+
+
+def seed(session, rows: int):
+    from models import (
+        Attachment, ChatMessage, Member, StatusColumn, StatusTemplate, Subtask, Task, TaskMemberLink, Workflow,
+        Workspace, WorkspaceMemberLink
+    )
+
+    session.add_all(
+        Member(first_name=f"First{i}", last_name=f"Last{i}", email=f"member{i}@example.com", password="x")
+        for i in range(rows)
+    )
+    session.add(Workspace(name="Budget", created_by=1))
+    session.add(StatusTemplate(name="Budget", category="Budget", description="", created_by=1))
+    session.commit()
+    session.add_all(StatusColumn(name=f"Column {i}", position=i, template_id=1) for i in range(1, 4))
+    session.add(Workflow(name="Budget", workspace_id=1, created_by=1))
+    session.add_all(WorkspaceMemberLink(workspace_id=1, member_id=i) for i in range(1, rows + 1))
+    session.commit()
+    session.add_all(
+        Task(title=f"Task {i}", workflow_id=1, column_id=1 + i % 3, estimated_hours=4, created_by=1)
+        for i in range(rows)
+    )
+    session.commit()
+    session.add_all(TaskMemberLink(task_id=1 + i % rows, member_id=1 + i) for i in range(rows))
+    session.add_all(TaskMemberLink(task_id=1, member_id=1 + i) for i in range(1, rows))
+    session.add_all(Subtask(text=f"Subtask {i}", task_id=1, created_by=1) for i in range(rows))
+    session.add_all(ChatMessage(content=f"Message {i}", task_id=1, author_id=1 + i % rows) for i in range(rows))
+    session.add_all(
+        Attachment(unique_filename=f"{i}.txt", original_filename=f"file{i}", file_extension=".txt",
+                   file_path=f"files/{i}.txt", file_size=1024, task_id=1, uploaded_by=1 + i % rows)
+        for i in range(rows)
+    )
+    session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--verbose", action="store_true", help="print the statements of every endpoint")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="query_budgets_"))
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ["RATE_LIMIT"] = "0"
+
+    import main as api
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session
+    from querydebug import QueryBudgetExceeded, query_budget
+
+    with Session(api.engine) as session:
+        seed(session, args.rows)
+
+    client = TestClient(api.app)
+    budgets = endpoint_budgets(args.rows)
+    failures = 0
+    for method, path, body, budget in budgets:
+        try:
+            with query_budget(budget, f"{method} {path}") as log:
+                response = client.request(method, path, json=body)
+            status = "ok" if response.status_code < 400 else f"HTTP {response.status_code}"
+        except QueryBudgetExceeded as exc:
+            status = "OVER"
+            print(exc)
+        failures += status != "ok"
+        print(f"{status:<9}{log.count:>4}/{budget:<4}{method:<6}{path}")
+        if args.verbose:
+            print(log.report(1))
+
+    print(f"\n{len(budgets) - failures}/{len(budgets)} endpoints passed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
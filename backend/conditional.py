@@ -0,0 +1,175 @@
+"""
+Conditional request support (ETag / If-None-Match / If-Match).
+
+Read endpoints that can describe their current state cheaply compute a
+version tag first - the row's version or updated_at, or count/max(updated_at)
+for a collection - and answer 304 before loading or serializing anything.
+Rows with a version column are tagged with it verbatim, so a client can send
+the tag back in If-Match and have its update apply only to that version.
+
+ConditionalGetMiddleware covers the rest: it answers 304 for any JSON GET
+response whose ETag matches, and tags untagged JSON responses with a hash of
+their body so even those polls cost no bandwidth when nothing changed.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.datastructures import Headers, MutableHeaders
+
+REVALIDATE = "no-cache"
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2s(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" name the same representation
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(","))
+
+
+def not_modified(request: Request, response: Response, etag: Optional[str]) -> Optional[Response]:
+    """Return a 304 if the client already has etag, otherwise tag the outgoing response"""
+    if etag is None:
+        return None
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = REVALIDATE
+    return None
+
+
+def version_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def if_match_version(request: Request) -> Optional[int]:
+    """Row version named by If-Match; None without the header or for "*". Raises ValueError if malformed"""
+    if_match = request.headers.get("if-match")
+    if if_match is None or if_match.strip() == "*":
+        return None
+    return int(if_match.strip().removeprefix("W/").strip('"'))
+
+
+def _tag_column(model):
+    return model.version if hasattr(model, "version") else model.updated_at
+
+
+def _row_tag(model, row_id: int, value) -> Optional[str]:
+    if value is None:
+        return None
+    if hasattr(model, "version"):
+        return version_etag(value)
+    return make_etag(model.__tablename__, row_id, value)
+
+
+def _aggregates_query(aggregates, where):
+    query = select(*aggregates)
+    for clause in where:
+        query = query.where(clause)
+    return query
+
+
+def row_etag(session: Session, model, row_id: int) -> Optional[str]:
+    """Tag of one row from its version or updated_at, without loading the row"""
+    value = session.exec(select(_tag_column(model)).where(model.id == row_id)).first()
+    return _row_tag(model, row_id, value)
+
+
+def collection_etag(session: Session, name: str, *aggregates, where=()) -> str:
+    """Tag of a collection from aggregates such as count(id) and max(updated_at)"""
+    return make_etag(name, *session.exec(_aggregates_query(aggregates, where)).one())
+
+
+async def row_etag_async(session: AsyncSession, model, row_id: int) -> Optional[str]:
+    value = (await session.exec(select(_tag_column(model)).where(model.id == row_id))).first()
+    return _row_tag(model, row_id, value)
+
+
+async def collection_etag_async(session: AsyncSession, name: str, *aggregates, where=()) -> str:
+    return make_etag(name, *(await session.exec(_aggregates_query(aggregates, where))).one())
+
+
+class ConditionalGetMiddleware:
+    def __init__(self, app, max_body_size: int = 1024 * 1024):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        state = {"mode": None, "start": None, "body": []}
+
+        async def send_not_modified(headers: MutableHeaders):
+            kept = [(k, v) for k, v in headers.raw if k.lower() in (b"etag", b"cache-control", b"vary")]
+            await send({"type": "http.response.start", "status": 304, "headers": kept})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                is_json = headers.get("content-type", "").startswith("application/json")
+
+                if message["status"] != 200 or not is_json:
+                    state["mode"] = "pass"
+                    await send(message)
+                elif "etag" in headers:
+                    if "cache-control" not in headers:
+                        headers["Cache-Control"] = REVALIDATE
+                    if etag_matches(if_none_match, headers["etag"]):
+                        state["mode"] = "drop"
+                        await send_not_modified(headers)
+                    else:
+                        state["mode"] = "pass"
+                        await send(message)
+                else:
+                    state["mode"] = "buffer"
+                    state["start"] = message
+                return
+
+            if state["mode"] == "pass":
+                await send(message)
+                return
+            if state["mode"] == "drop":
+                return
+
+            state["body"].append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+            size = sum(len(part) for part in state["body"])
+
+            if more_body and size <= self.max_body_size:
+                return
+
+            start = state["start"]
+            body = b"".join(state["body"])
+            state["mode"], state["body"] = "pass", []
+
+            if more_body:
+                # Too large to hash in memory; stream it through untouched
+                await send(start)
+                await send({"type": "http.response.body", "body": body, "more_body": True})
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            headers["ETag"] = make_etag(body)
+            headers["Cache-Control"] = REVALIDATE
+            if etag_matches(if_none_match, headers["etag"]):
+                await send_not_modified(headers)
+                return
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, wrapped_send)
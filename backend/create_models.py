@@ -6,7 +6,7 @@ from datetime import datetime, date
 from models import (
     Workspace, Member, Workflow, Task, Subtask, ChatMessage,
     StatusTemplate, ActivityLog, TaskMemberLink, WorkspaceMemberLink, 
-    WorkflowMemberLink, create_db_and_tables, get_engine, StatusColumn, Attachment,
+    WorkflowMemberLink, create_db_and_tables, get_engine, StatusColumn, Attachment, TaskDependency,
     ksa_now
 )
 
@@ -33,6 +33,10 @@ class WorkspaceCreate(BaseModel):
 class WorkspaceUpdate(BaseModel):
     name: Optional[str] = None
 
+class WorkspaceMemberSet(BaseModel):
+    # viewer, member, admin or owner
+    role: str = "member"
+
 class WorkflowCreate(BaseModel):
     name: str
     workspace_id: int
@@ -77,7 +81,13 @@ class TaskUpdate(BaseModel):
     actual_hours: Optional[float] = None
     time_spent_seconds: Optional[int] = None
     timer_start_time: Optional[datetime] = None
-    position: Optional[int] = None
+    # Neighbours in the target column after a drag: the card above and the card below
+    after_id: Optional[int] = None
+    before_id: Optional[int] = None
+
+class TaskDependencyCreate(BaseModel):
+    predecessor_id: int
+    lag_days: Optional[int] = 0
 
 class SubtaskCreate(BaseModel):
     text: str
@@ -125,6 +135,8 @@ class ActivityLogCreate(BaseModel):
     entity_type: str
     entity_id: int
     description: Optional[str] = None
+    old_value: Optional[str] = None
+    new_value: Optional[str] = None
     member_id: Optional[int] = None
     workspace_id: Optional[int] = None
     task_id: Optional[int] = None
@@ -223,3 +235,7 @@ class AttachmentCreate(BaseModel):
     original_filename: str
     file_path: str
     file_size: int
+
+class NotificationsRead(BaseModel):
+    # Newest notification read; all of them when omitted
+    up_to: Optional[int] = None
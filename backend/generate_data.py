@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Synthetic workspaces, members, tasks and chat at benchmark scale.
+
+Rows are built as plain dicts from a seeded random generator and streamed
+through bulk_loader.BulkLoader in --batch-size chunks, so memory stays flat
+whatever the volume and the aggregate tables are rebuilt once at the end.
+Ids are assigned up front (after any rows already in the database) so
+foreign keys never need a read.
+
+Every member can log in with BENCH_PASSWORD; emails are member<id>@bench.example.
+
+    python generate_data.py --db bench.db --preset small
+    python generate_data.py --db bench.db --preset large      # 100 workspaces, 10k members, 1M tasks, 10M messages
+    python generate_data.py --db bench.db --tasks 50000 --messages 200000 --seed 7
+"""
+import argparse
+import os
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List
+
+from passlib.context import CryptContext
+from sqlalchemy import create_engine
+from sqlmodel import SQLModel
+
+from analytics import install_analytics
+from bulk_loader import BulkLoader, chunks
+from inbox import install_inbox
+from models import (
+    ActivityLog, ChatMessage, Member, StatusColumn, StatusTemplate, Subtask, Task, TaskMemberLink, Workflow,
+    Workspace, WorkspaceMemberLink, configure_sqlite, upgrade_schema
+)
+from ranking import nth_key
+
+BENCH_PASSWORD = "benchmark"
+
+PRESETS = {
+    "small": dict(workspaces=5, members=200, workflows_per_workspace=4, tasks=5_000, messages=20_000),
+    "medium": dict(workspaces=20, members=2_000, workflows_per_workspace=5, tasks=100_000, messages=1_000_000),
+    "large": dict(workspaces=100, members=10_000, workflows_per_workspace=10, tasks=1_000_000, messages=10_000_000),
+}
+
+TEMPLATE_COLUMNS = {
+    "Default Business": ["Not Started", "In Progress", "Under Review", "Completed", "On Hold"],
+    "Development": ["Backlog", "In Development", "Code Review", "Testing", "Deployed"],
+    "Marketing": ["Ideation", "Creation", "Review", "Approval", "Published"],
+}
+
+AVATAR_COLORS = ["#4a6fa5", "#e74c3c", "#2ecc71", "#f39c12", "#9b59b6", "#1abc9c"]
+FIRST_NAMES = ["Ahmed", "Sara", "Omar", "Lina", "Khalid", "Noura", "Faisal", "Reem", "Yousef", "Huda"]
+LAST_NAMES = ["Alharbi", "Alqahtani", "Alghamdi", "Alotaibi", "Alzahrani", "Alshehri", "Aldosari", "Almutairi"]
+WORDS = ("design review api release fix update client report draft budget plan sprint deploy test "
+         "migrate audit launch research sync invoice onboarding dashboard feedback").split()
+ACTIVITY_ACTIONS = ["task_created", "status_changed", "comment_added", "task_assigned"]
+
+
+class Generator:
+    def __init__(self, loader: BulkLoader, args):
+        self.loader = loader
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.today = self.now.date()
+        self.next_id = loader.next_id
+
+    def write(self, model, rows: Iterable[dict]):
+        started = time.perf_counter()
+        written = self.loader.insert(model, rows)
+        elapsed = time.perf_counter() - started
+        print(f"  {model.__tablename__:<22}{written:>12,} rows {elapsed:>8.1f}s {written / max(elapsed, 1e-9):>12,.0f} rows/s")
+
+    def sentence(self, low: int, high: int) -> str:
+        return " ".join(self.rng.choice(WORDS) for _ in range(self.rng.randint(low, high))).capitalize()
+
+    def moment(self, days_back: int = 365) -> datetime:
+        return self.now - timedelta(seconds=self.rng.randrange(days_back * 86400))
+
+    def members(self) -> range:
+        first = self.next_id(Member)
+        password = CryptContext(schemes=["bcrypt"]).hash(BENCH_PASSWORD)
+        ids = range(first, first + self.args.members)
+        rng = self.rng
+
+        def rows():
+            for member_id in ids:
+                created = self.moment()
+                yield {
+                    "id": member_id,
+                    "first_name": rng.choice(FIRST_NAMES),
+                    "last_name": rng.choice(LAST_NAMES),
+                    "email": f"member{member_id}@bench.example",
+                    "phoneNumber": None,
+                    "avatar_color": rng.choice(AVATAR_COLORS),
+                    "password": password,
+                    "created_at": created,
+                    "updated_at": created,
+                }
+
+        self.write(Member, rows())
+        return ids
+
+    def columns(self, creator: int) -> List[int]:
+        """Status templates and their columns; returns the default template's column ids"""
+        template_id = self.next_id(StatusTemplate)
+        column_id = self.next_id(StatusColumn)
+        templates, columns, default_columns = [], [], []
+        for offset, (name, column_names) in enumerate(TEMPLATE_COLUMNS.items()):
+            templates.append({
+                "id": template_id + offset, "name": f"{name} {template_id + offset}", "category": name,
+                "description": f"{name} workflow statuses", "special_states": "[]", "is_default": offset == 0,
+                "is_system": True, "created_at": self.now, "updated_at": self.now, "created_by": creator,
+            })
+            for position, column_name in enumerate(column_names, 1):
+                columns.append({"id": column_id, "name": column_name, "position": position,
+                                "template_id": template_id + offset})
+                if offset == 0:
+                    default_columns.append(column_id)
+                column_id += 1
+        self.write(StatusTemplate, templates)
+        self.write(StatusColumn, columns)
+        return default_columns
+
+    def workspaces(self, member_ids: range) -> Dict[int, List[int]]:
+        """Workspaces and their membership; returns workspace id -> member ids"""
+        first = self.next_id(Workspace)
+        per_workspace = min(self.args.members_per_workspace, len(member_ids))
+        membership = {
+            workspace_id: self.rng.sample(member_ids, per_workspace)
+            for workspace_id in range(first, first + self.args.workspaces)
+        }
+        self.write(Workspace, (
+            {"id": workspace_id, "name": f"Workspace {workspace_id}", "created_at": self.now,
+             "updated_at": self.now, "created_by": members[0]}
+            for workspace_id, members in membership.items()
+        ))
+        self.write(WorkspaceMemberLink, (
+            {"workspace_id": workspace_id, "member_id": member_id, "role": "owner" if index == 0 else "member",
+             "joined_at": self.now}
+            for workspace_id, members in membership.items()
+            for index, member_id in enumerate(members)
+        ))
+        return membership
+
+    def workflows(self, membership: Dict[int, List[int]]) -> Dict[int, int]:
+        """Returns workflow id -> workspace id"""
+        workflow_id = self.next_id(Workflow)
+        workspace_of = {}
+        rows = []
+        for workspace_id, members in membership.items():
+            for _ in range(self.args.workflows_per_workspace):
+                start = self.today - timedelta(days=self.rng.randrange(180))
+                rows.append({
+                    "id": workflow_id, "name": f"Project {workflow_id}", "start_date": start,
+                    "end_date": start + timedelta(days=self.rng.randint(30, 240)), "deadline": None,
+                    "progress_percentage": 0.0, "status_template": "default", "created_at": self.now,
+                    "updated_at": self.now, "created_by": members[0], "workspace_id": workspace_id,
+                })
+                workspace_of[workflow_id] = workspace_id
+                workflow_id += 1
+        self.write(Workflow, rows)
+        return workspace_of
+
+    def tasks(self, workspace_of: Dict[int, int], membership: Dict[int, List[int]], column_ids: List[int]) -> range:
+        first = self.next_id(Task)
+        ids = range(first, first + self.args.tasks)
+        workflow_ids = list(workspace_of)
+        rng = self.rng
+        assignments, subtasks = [], []
+        # Tasks already in order within each column, so boards need no rebalance
+        column_sizes = Counter()
+
+        def rows():
+            for task_id in ids:
+                workflow_id = rng.choice(workflow_ids)
+                members = membership[workspace_of[workflow_id]]
+                column_index = rng.randrange(len(column_ids))
+                done = column_index == 3  # "Completed" in the default template
+                start = self.today + timedelta(days=rng.randint(-90, 60))
+                created = self.moment(120)
+                estimated = float(rng.choice((1, 2, 4, 8, 16, 24, 40)))
+                column = (workflow_id, column_ids[column_index])
+                column_sizes[column] += 1
+                yield {
+                    "id": task_id, "title": self.sentence(2, 6), "description": self.sentence(8, 40),
+                    "progress_percentage": 100.0 if done else float(rng.randrange(0, 100, 10)),
+                    "start_date": start, "end_date": start + timedelta(days=rng.randint(1, 30)),
+                    "due_date": start + timedelta(days=rng.randint(1, 45)) if rng.random() < 0.8 else None,
+                    "estimated_hours": estimated, "actual_hours": estimated * rng.random() if done else 0.0,
+                    "time_spent_seconds": 0, "timer_start_time": None, "created_at": created,
+                    "updated_at": created, "completed_at": created + timedelta(days=rng.randint(1, 30)) if done else None,
+                    "created_by": rng.choice(members), "workflow_id": workflow_id,
+                    "column_id": column_ids[column_index], "rank": nth_key(column_sizes[column] - 1),
+                }
+                for member_id in rng.sample(members, min(rng.randint(1, self.args.max_assignees), len(members))):
+                    assignments.append({"task_id": task_id, "member_id": member_id, "assigned_at": created})
+                for index in range(rng.randint(0, self.args.max_subtasks)):
+                    subtasks.append({"text": self.sentence(2, 6), "completed": rng.random() < 0.5,
+                                     "created_at": created, "updated_at": created, "completed_at": None,
+                                     "created_by": rng.choice(members), "task_id": task_id})
+
+        # Tasks stream in batches; each batch's links and subtasks are flushed right after it
+        for batch in chunks(rows(), self.args.batch_size):
+            self.loader.insert(Task, batch)
+            self.loader.insert(TaskMemberLink, assignments)
+            self.loader.insert(Subtask, subtasks)
+            assignments.clear()
+            subtasks.clear()
+        return ids
+
+    def messages(self, task_ids: range, member_ids: range):
+        rng = self.rng
+        # A few busy tasks carry most of the conversation, like real boards
+        hot_tasks = rng.sample(task_ids, max(len(task_ids) // 20, 1))
+
+        def rows():
+            for _ in range(self.args.messages):
+                created = self.moment(120)
+                yield {
+                    "content": self.sentence(3, 30), "created_at": created, "updated_at": created,
+                    "is_attachment": False,
+                    "task_id": rng.choice(hot_tasks) if rng.random() < 0.5 else rng.choice(task_ids),
+                    "author_id": rng.choice(member_ids),
+                }
+
+        self.write(ChatMessage, rows())
+
+    def activities(self, task_ids: range, member_ids: range, workspace_ids: List[int]):
+        rng = self.rng
+
+        def rows():
+            for _ in range(self.args.activities):
+                task_id = rng.choice(task_ids)
+                action = rng.choice(ACTIVITY_ACTIONS)
+                yield {
+                    "action": action, "entity_type": "task", "entity_id": task_id,
+                    "description": f"{action.replace('_', ' ').capitalize()}: task {task_id}", "old_value": None,
+                    "new_value": None, "created_at": self.moment(120), "member_id": rng.choice(member_ids),
+                    "workspace_id": rng.choice(workspace_ids), "task_id": task_id,
+                }
+
+        self.write(ActivityLog, rows())
+
+    def run(self):
+        member_ids = self.members()
+        column_ids = self.columns(member_ids[0])
+        membership = self.workspaces(member_ids)
+        workspace_of = self.workflows(membership)
+
+        started = time.perf_counter()
+        task_ids = self.tasks(workspace_of, membership, column_ids)
+        elapsed = time.perf_counter() - started
+        tasks = self.loader.counts["task"]
+        print(f"  {'task (+links, subtasks)':<22}{tasks:>12,} rows {elapsed:>8.1f}s {tasks / max(elapsed, 1e-9):>12,.0f} rows/s")
+
+        self.messages(task_ids, member_ids)
+        self.activities(task_ids, member_ids, list(membership))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="workspaceflow.db", help="SQLite file to create or extend")
+    parser.add_argument("--preset", choices=PRESETS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workspaces", type=int, default=10)
+    parser.add_argument("--members", type=int, default=500)
+    parser.add_argument("--members-per-workspace", type=int, default=100)
+    parser.add_argument("--workflows-per-workspace", type=int, default=5)
+    parser.add_argument("--tasks", type=int, default=20_000)
+    parser.add_argument("--max-assignees", type=int, default=3)
+    parser.add_argument("--max-subtasks", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--activities", type=int, default=None, help="defaults to one per task")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+    if args.preset:
+        # Preset sizes replace the defaults; flags given explicitly still win
+        parser.set_defaults(**PRESETS[args.preset])
+        args = parser.parse_args()
+    if args.activities is None:
+        args.activities = args.tasks
+
+    engine = create_engine(f"sqlite:///{os.path.abspath(args.db)}")
+    configure_sqlite(engine)
+    SQLModel.metadata.create_all(engine)
+    upgrade_schema(engine)
+    install_analytics(engine)
+    install_inbox(engine)
+
+    print(f"Generating into {args.db} (seed {args.seed})")
+    started = time.perf_counter()
+    with BulkLoader(engine, batch_size=args.batch_size) as loader:
+        Generator(loader, args).run()
+        print("  rebuilding indexes and aggregates")
+    total = sum(loader.counts.values())
+    elapsed = time.perf_counter() - started
+    print(f"Done: {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s). "
+          f"Log in as member<id>@bench.example / {BENCH_PASSWORD}")
+
+
+if __name__ == "__main__":
+    main()
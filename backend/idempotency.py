@@ -0,0 +1,197 @@
+"""
+Idempotency-Key support for POST requests.
+
+A client that sends the same Idempotency-Key header again, for example on a
+retry after a timeout, gets the stored response of the first request back
+instead of a second task, message or attachment. Keys are scoped to the
+caller, method and path, and live in the IdempotencyKey table:
+
+- the first request claims the key with a short IDEMPOTENCY_LOCK_SECONDS
+  expiry, runs, and stores its status, headers and zlib-compressed body for
+  IDEMPOTENCY_TTL_HOURS;
+- a retry while the first request is still running gets 409 with
+  Retry-After; once it finished, the stored response is replayed with an
+  Idempotent-Replayed header;
+- a retry with a different body gets 422, so a key cannot be reused for
+  another request by mistake (multipart uploads are matched on the key
+  alone);
+- 5xx responses are not stored, so the retry runs again. A worker that died
+  mid-request leaves a claim that lapses after IDEMPOTENCY_LOCK_SECONDS.
+
+Expired rows are purged at most every IDEMPOTENCY_PURGE_SECONDS by the next
+request that claims a key. Responses over IDEMPOTENCY_MAX_RESPONSE bytes
+are not stored; their key is released like a 5xx.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from typing import Callable, Optional
+
+from sqlalchemy import delete, select, update
+
+from models import IdempotencyKey, upsert
+from serializers import dumps
+
+HEADER = "idempotency-key"
+IDEMPOTENCY_TTL_HOURS = float(os.environ.get("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_LOCK_SECONDS = float(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENCY_PURGE_SECONDS = 300
+IDEMPOTENCY_MAX_RESPONSE = 1024 * 1024
+MAX_KEY_LENGTH = 255
+
+# Login responses carry access tokens, which should not be kept at rest
+EXCLUDED_PATHS = re.compile(r"^/(login|signup|token)$")
+# Recomputed on replay
+SKIPPED_HEADERS = {b"content-length", b"date", b"server"}
+
+
+def _digest(*parts) -> bytes:
+    return hashlib.sha256("\x00".join(str(part) for part in parts).encode()).digest()[:16]
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app, engine, identify: Optional[Callable[[dict], Optional[str]]] = None):
+        self.app = app
+        # An AsyncEngine; each step is one short statement outside the route's session
+        self.engine = engine
+        self.identify = identify
+        self._purged_at = 0.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or EXCLUDED_PATHS.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        client_key = next((value for name, value in scope["headers"] if name == HEADER.encode()), None)
+        if client_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not client_key or len(client_key) > MAX_KEY_LENGTH:
+            await self._respond(send, 400, {"detail": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"})
+            return
+
+        caller = (self.identify(scope) if self.identify else None) or "anonymous"
+        key = _digest(caller, scope["method"], scope["path"], scope["query_string"].decode(), client_key.decode())
+        # Browsers pick a new multipart boundary on every retry, so upload bodies never compare equal
+        content_type = next((value for name, value in scope["headers"] if name == b"content-type"), b"")
+        fingerprint_body = not content_type.startswith(b"multipart/")
+
+        record = None
+        # A failed first attempt may release the key between the claim and the read
+        for _ in range(2):
+            if await self._claim(key):
+                await self._run(key, scope, receive, send, fingerprint_body)
+                return
+            async with self.engine.connect() as connection:
+                record = (await connection.execute(select(IdempotencyKey).where(IdempotencyKey.key == key))).first()
+            if record is not None:
+                break
+
+        if record is None or record.status_code is None:
+            await self._respond(send, 409, {"detail": "Request with this Idempotency-Key is still in progress"}, 1)
+        elif fingerprint_body and record.fingerprint != await self._body_digest(receive):
+            await self._respond(send, 422, {"detail": "Idempotency-Key was already used for a different request"})
+        else:
+            await self._replay(send, record)
+
+    async def _claim(self, key: bytes) -> bool:
+        """Insert a pending row for key, or take over an expired one; False when the key is live"""
+        now = time.time()
+        statement = upsert(self.engine, IdempotencyKey).values(key=key, expires_at=int(now + IDEMPOTENCY_LOCK_SECONDS))
+        statement = statement.on_conflict_do_update(
+            index_elements=[IdempotencyKey.key],
+            set_={"fingerprint": None, "status_code": None, "headers": None, "body": None,
+                  "expires_at": statement.excluded.expires_at},
+            where=IdempotencyKey.expires_at < int(now),
+        )
+        async with self.engine.begin() as connection:
+            claimed = (await connection.execute(statement)).rowcount == 1
+            if claimed and now - self._purged_at > IDEMPOTENCY_PURGE_SECONDS:
+                self._purged_at = now
+                await connection.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < int(now)))
+        return claimed
+
+    async def _run(self, key: bytes, scope, receive, send, fingerprint_body: bool):
+        body_hash = hashlib.sha256()
+        state = {"more_body": True, "start": None, "body": [], "size": 0}
+
+        async def wrapped_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                if fingerprint_body:
+                    body_hash.update(message.get("body", b""))
+                state["more_body"] = message.get("more_body", False)
+            else:
+                state["more_body"] = False
+            return message
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                state["start"] = message
+            elif message["type"] == "http.response.body" and state["size"] <= IDEMPOTENCY_MAX_RESPONSE:
+                state["body"].append(message.get("body", b""))
+                state["size"] += len(state["body"][-1])
+            await send(message)
+
+        try:
+            await self.app(scope, wrapped_receive, wrapped_send)
+        except BaseException:
+            await self._release(key)
+            raise
+
+        start = state["start"]
+        if start is None or start["status"] >= 500 or state["size"] > IDEMPOTENCY_MAX_RESPONSE:
+            await self._release(key)
+            return
+        # The fingerprint covers the whole body even when the route did not read all of it
+        while fingerprint_body and state["more_body"]:
+            await wrapped_receive()
+
+        headers = [
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in start.get("headers", []) if name.lower() not in SKIPPED_HEADERS
+        ]
+        async with self.engine.begin() as connection:
+            await connection.execute(update(IdempotencyKey).where(IdempotencyKey.key == key).values(
+                fingerprint=body_hash.digest()[:16],
+                status_code=start["status"],
+                headers=json.dumps(headers),
+                body=zlib.compress(b"".join(state["body"])),
+                expires_at=int(time.time() + IDEMPOTENCY_TTL_HOURS * 3600),
+            ))
+
+    async def _release(self, key: bytes):
+        async with self.engine.begin() as connection:
+            await connection.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key))
+
+    @staticmethod
+    async def _body_digest(receive) -> bytes:
+        body_hash = hashlib.sha256()
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            body_hash.update(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        return body_hash.digest()[:16]
+
+    @staticmethod
+    async def _replay(send, record):
+        body = zlib.decompress(record.body)
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(record.headers)]
+        headers += [(b"content-length", str(len(body)).encode()), (b"idempotent-replayed", b"true")]
+        await send({"type": "http.response.start", "status": record.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _respond(send, status: int, content: dict, retry_after: Optional[int] = None):
+        body = dumps(content)
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if retry_after is not None:
+            headers.append((b"retry-after", str(retry_after).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,143 @@
+"""
+Cross-workspace "my tasks" inbox.
+
+Open assigned tasks are listed through the (member_id, task_id) index on
+TaskMemberLink and paginated with a keyset cursor on (due_date, task id), so
+every page is a single query whatever the page number. The member's total of
+open tasks comes from MemberTaskCounter, which SQLite triggers keep in step
+with assignments and task completion.
+"""
+import base64
+from datetime import date
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, func, or_, text
+from sqlmodel import Session, select
+
+from models import MemberTaskCounter, Task, TaskMemberLink, Workflow
+
+NO_DUE_DATE = date(9999, 12, 31)
+
+INBOX_TRIGGERS = {
+    "inbox_counter_assign": """
+        CREATE TRIGGER inbox_counter_assign AFTER INSERT ON taskmemberlink
+        WHEN EXISTS (SELECT 1 FROM task WHERE id = NEW.task_id AND completed_at IS NULL AND deleted_at IS NULL)
+        BEGIN
+            INSERT INTO membertaskcounter (member_id, open_tasks) VALUES (NEW.member_id, 1)
+            ON CONFLICT (member_id) DO UPDATE SET open_tasks = open_tasks + 1;
+        END
+    """,
+    "inbox_counter_unassign": """
+        CREATE TRIGGER inbox_counter_unassign AFTER DELETE ON taskmemberlink
+        WHEN EXISTS (SELECT 1 FROM task WHERE id = OLD.task_id AND completed_at IS NULL AND deleted_at IS NULL)
+        BEGIN
+            UPDATE membertaskcounter SET open_tasks = open_tasks - 1 WHERE member_id = OLD.member_id;
+        END
+    """,
+    "inbox_counter_completion": """
+        CREATE TRIGGER inbox_counter_completion AFTER UPDATE OF completed_at ON task
+        WHEN (OLD.completed_at IS NULL) <> (NEW.completed_at IS NULL) AND NEW.deleted_at IS NULL
+        BEGIN
+            UPDATE membertaskcounter
+            SET open_tasks = open_tasks + (CASE WHEN NEW.completed_at IS NULL THEN 1 ELSE -1 END)
+            WHERE member_id IN (SELECT member_id FROM taskmemberlink WHERE task_id = NEW.id);
+        END
+    """,
+    "inbox_counter_task_delete": """
+        CREATE TRIGGER inbox_counter_task_delete AFTER DELETE ON task
+        WHEN OLD.completed_at IS NULL AND OLD.deleted_at IS NULL
+        BEGIN
+            UPDATE membertaskcounter SET open_tasks = open_tasks - 1
+            WHERE member_id IN (SELECT member_id FROM taskmemberlink WHERE task_id = OLD.id);
+        END
+    """,
+    "inbox_counter_trash": """
+        CREATE TRIGGER inbox_counter_trash AFTER UPDATE OF deleted_at ON task
+        WHEN (OLD.deleted_at IS NULL) <> (NEW.deleted_at IS NULL) AND NEW.completed_at IS NULL
+        BEGIN
+            UPDATE membertaskcounter
+            SET open_tasks = open_tasks + (CASE WHEN NEW.deleted_at IS NULL THEN 1 ELSE -1 END)
+            WHERE member_id IN (SELECT member_id FROM taskmemberlink WHERE task_id = NEW.id);
+        END
+    """,
+}
+
+
+def install_inbox(engine):
+    """(Re)create the open-task counter triggers and backfill the counters on first run"""
+    if engine.dialect.name != "sqlite":
+        return
+
+    with Session(engine) as session:
+        for name, ddl in INBOX_TRIGGERS.items():
+            session.exec(text(f"DROP TRIGGER IF EXISTS {name}"))
+            session.exec(text(ddl))
+        session.commit()
+
+        has_counters = session.exec(select(MemberTaskCounter).limit(1)).first()
+        has_links = session.exec(select(TaskMemberLink).limit(1)).first()
+        if has_links and not has_counters:
+            rebuild_member_counters(session)
+
+
+def rebuild_member_counters(session: Session):
+    session.exec(text("DELETE FROM membertaskcounter"))
+    session.exec(text("""
+        INSERT INTO membertaskcounter (member_id, open_tasks)
+        SELECT taskmemberlink.member_id, COUNT(*)
+        FROM taskmemberlink JOIN task ON task.id = taskmemberlink.task_id
+        WHERE task.completed_at IS NULL AND task.deleted_at IS NULL
+        GROUP BY taskmemberlink.member_id
+    """))
+    session.commit()
+
+
+def encode_cursor(due_date: Optional[date], task_id: int) -> str:
+    raw = f"{(due_date or NO_DUE_DATE).isoformat()}|{task_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    due, task_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return date.fromisoformat(due), int(task_id)
+
+
+def member_inbox(session: Session, member_id: int, limit: int = 50, cursor: Optional[str] = None) -> dict:
+    """One page of a member's open assigned tasks, soonest due first"""
+    sort_due = func.coalesce(Task.due_date, NO_DUE_DATE)
+    open_tasks = (
+        select(MemberTaskCounter.open_tasks)
+        .where(MemberTaskCounter.member_id == member_id)
+        .scalar_subquery()
+    )
+
+    query = (
+        select(Task, Workflow.workspace_id, Workflow.name, open_tasks)
+        .join(TaskMemberLink, TaskMemberLink.task_id == Task.id)
+        .join(Workflow, Workflow.id == Task.workflow_id)
+        .where(TaskMemberLink.member_id == member_id, Task.completed_at.is_(None), Task.deleted_at.is_(None))
+    )
+    if cursor:
+        after_due, after_id = decode_cursor(cursor)
+        query = query.where(or_(sort_due > after_due, and_(sort_due == after_due, Task.id > after_id)))
+
+    rows = session.exec(query.order_by(sort_due, Task.id).limit(limit + 1)).all()
+
+    if rows:
+        total_open = rows[0][3] or 0
+    else:
+        counter = session.get(MemberTaskCounter, member_id)
+        total_open = counter.open_tasks if counter else 0
+
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1][0].due_date, page[-1][0].id) if len(rows) > limit else None
+
+    return {
+        "member_id": member_id,
+        "open_tasks": total_open,
+        "tasks": [
+            {**task.dict(), "workspace_id": workspace_id, "workflow_name": workflow_name}
+            for task, workspace_id, workflow_name, _ in page
+        ],
+        "next_cursor": next_cursor
+    }
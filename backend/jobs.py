@@ -0,0 +1,300 @@
+"""
+Durable background jobs in the job table.
+
+A request handler calls enqueue() with its own session, so the job commits
+or rolls back together with the request's writes, and returns; JobWorker
+threads run it afterwards. Workers live in every API process (JOB_WORKERS
+each) or, with JOB_WORKERS=0 there, in a separate `python run_api.py --jobs`
+process. Any number of them can share one database: a claim is a single
+UPDATE ... RETURNING, which SQLite's one writer serializes.
+
+- Handlers are registered per kind with @handler("kind") in the module that
+  owns the work, and are called as handler(session, payload). The worker
+  commits the session after marking the job done, so writes the handler
+  leaves uncommitted land with its completion or not at all.
+- Jobs run highest priority first, then oldest run_at first.
+- A claim leases the job for JOB_LEASE_SECONDS. A worker that dies or hangs
+  lets the lease lapse, and the job is queued again (the visibility timeout).
+  A handler that outlives its lease finds the job reclaimed and rolls back.
+- A failed attempt is retried after JOB_BACKOFF_SECONDS doubled per attempt,
+  up to JOB_BACKOFF_MAX_SECONDS with jitter, until max_attempts have run.
+- A dedupe_key names at most one queued job; enqueueing it again returns
+  that job, raising its priority and run_at if the new request is more
+  urgent. A job retried while another one with its key is already queued
+  is marked superseded instead.
+
+Finished jobs are deleted JOB_RETENTION_HOURS after they finish.
+"""
+import json
+import os
+import random
+import signal
+import threading
+import time
+import traceback
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import case, delete, event, func, select, update
+from sqlmodel import Session
+
+from logs import logger
+from metrics import job_duration, job_queue_depth, job_queue_lag, jobs_processed
+from models import QUEUED, Job, greatest, least, upsert
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "2"))
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_SECONDS = float(os.environ.get("JOB_BACKOFF_SECONDS", "10"))
+JOB_BACKOFF_MAX_SECONDS = float(os.environ.get("JOB_BACKOFF_MAX_SECONDS", "3600"))
+JOB_RETENTION_HOURS = float(os.environ.get("JOB_RETENTION_HOURS", "72"))
+# How often a worker looks for lapsed leases and old finished jobs
+JOB_MAINTENANCE_SECONDS = 30
+MAX_ERROR_LENGTH = 4000
+
+PENDING_STATUSES = ("queued", "running")
+
+handlers: Dict[str, Callable[[Session, dict], None]] = {}
+_wakeup = threading.Event()
+
+
+class UnknownJobKind(Exception):
+    """No handler is registered for a job's kind in this process"""
+
+
+def handler(kind: str):
+    """Register the decorated function(session, payload) as the handler of kind"""
+    def register(function):
+        if kind in handlers:
+            raise ValueError(f"Job kind {kind!r} already has a handler")
+        handlers[kind] = function
+        return function
+    return register
+
+
+def _wake_workers(session):
+    _wakeup.set()
+
+
+def enqueue(session: Session, kind: str, payload: Optional[dict] = None, priority: int = 0,
+            dedupe_key: Optional[str] = None, delay: float = 0, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+    """Add a job in the caller's transaction; its id, or the id of the queued job with the same dedupe_key"""
+    now = time.time()
+    bind = session.get_bind()
+    statement = upsert(bind, Job).values(
+        kind=kind, payload=json.dumps(payload or {}), priority=priority, dedupe_key=dedupe_key,
+        max_attempts=max_attempts, run_at=now + delay, created_at=now,
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[Job.dedupe_key],
+        index_where=QUEUED,
+        set_={
+            "priority": greatest(bind, Job.priority, statement.excluded.priority),
+            "run_at": least(bind, Job.run_at, statement.excluded.run_at),
+        },
+    ).returning(Job.id)
+    job_id = session.exec(statement).scalar_one()
+    # Workers in this process start on it once it is committed; others find it on their next poll
+    event.listen(session, "after_commit", _wake_workers, once=True)
+    return job_id
+
+
+def claim(session: Session):
+    """Lease the next due job: a Row of id, kind, payload, attempts and max_attempts, or None"""
+    now = time.time()
+    next_job = (
+        select(Job.id)
+        .where(Job.status == "queued", Job.run_at <= now)
+        .order_by(Job.priority.desc(), Job.run_at)
+        .limit(1)
+        .scalar_subquery()
+    )
+    row = session.exec(
+        update(Job)
+        .where(Job.id == next_job, Job.status == "queued")
+        .values(status="running", attempts=Job.attempts + 1, locked_until=now + JOB_LEASE_SECONDS)
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts)
+    ).first()
+    session.commit()
+    return row
+
+
+def _leased(job) -> list:
+    # The attempt number is the lease token: a reclaimed job has a higher one
+    return [Job.id == job.id, Job.status == "running", Job.attempts == job.attempts]
+
+
+def complete(session: Session, job) -> bool:
+    """Mark a claimed job done, in the handler's transaction; False when the lease was lost"""
+    result = session.exec(
+        update(Job).where(*_leased(job)).values(status="done", locked_until=None, finished_at=time.time())
+    )
+    return result.rowcount == 1
+
+
+def backoff(attempts: int) -> float:
+    """Seconds before retrying a job that failed its attempts-th run"""
+    delay = min(JOB_BACKOFF_MAX_SECONDS, JOB_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _requeue_status():
+    # Queued again unless out of attempts, or another job with the same key is already queued
+    other = Job.__table__.alias("other")
+    duplicate = select(other.c.id).where(other.c.dedupe_key == Job.dedupe_key, other.c.status == "queued").exists()
+    return case(
+        (Job.attempts >= Job.max_attempts, "failed"),
+        (duplicate, "superseded"),
+        else_="queued",
+    )
+
+
+def fail(session: Session, job, error: str) -> Optional[str]:
+    """Schedule a retry of a claimed job or give up on it; its new status, None when the lease was lost"""
+    now = time.time()
+    status = _requeue_status()
+    row = session.exec(
+        update(Job).where(*_leased(job)).values(
+            status=status,
+            run_at=now + backoff(job.attempts),
+            locked_until=None,
+            last_error=error[-MAX_ERROR_LENGTH:],
+            finished_at=case((status == "queued", None), else_=now),
+        ).returning(Job.status)
+    ).first()
+    session.commit()
+    return row.status if row else None
+
+
+def requeue_expired(session: Session) -> int:
+    """Requeue running jobs whose lease lapsed, one at a time so dedupe keys are checked row by row"""
+    now = time.time()
+    expired = session.exec(
+        select(Job.id).where(Job.status == "running", Job.locked_until < now)
+    ).scalars().all()
+    status = _requeue_status()
+    for job_id in expired:
+        session.exec(
+            update(Job).where(Job.id == job_id, Job.status == "running", Job.locked_until < now).values(
+                status=status, run_at=now, locked_until=None, last_error="Lease expired",
+                finished_at=case((status == "queued", None), else_=now),
+            )
+        )
+        session.commit()
+    return len(expired)
+
+
+def purge_finished(session: Session, older_than_hours: float = JOB_RETENTION_HOURS) -> int:
+    purged = session.exec(
+        delete(Job).where(Job.finished_at < time.time() - older_than_hours * 3600)
+    ).rowcount
+    session.commit()
+    return purged
+
+
+async def sample_queue(async_engine):
+    """Refresh the queue gauges from the job table; must run on the event loop"""
+    now = time.time()
+    query = (
+        select(Job.kind, Job.status, func.count(), func.min(case((Job.status == "queued", Job.run_at))))
+        .where(Job.status.in_(PENDING_STATUSES))
+        .group_by(Job.kind, Job.status)
+    )
+    async with async_engine.connect() as connection:
+        rows = (await connection.execute(query)).all()
+    job_queue_depth.replace({(kind, status): count for kind, status, count, _ in rows})
+    job_queue_lag.replace({
+        (kind,): max(0.0, now - oldest) for kind, status, _, oldest in rows if status == "queued" and oldest
+    })
+
+
+class JobWorker(threading.Thread):
+    """Claim and run jobs one at a time until stopped"""
+
+    def __init__(self, engine, index: int = 0, poll: float = JOB_POLL_SECONDS):
+        super().__init__(name=f"job-worker-{index}", daemon=True)
+        self.engine, self.poll = engine, poll
+        self.stopped = threading.Event()
+        # Spread the workers' maintenance passes out
+        self.next_maintenance = time.monotonic() + random.uniform(0, JOB_MAINTENANCE_SECONDS)
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                if time.monotonic() >= self.next_maintenance:
+                    self.next_maintenance = time.monotonic() + JOB_MAINTENANCE_SECONDS
+                    self.maintain()
+                ran = self.run_one()
+            except Exception:
+                logger.exception("Job worker failed")
+                ran = False
+            if not ran:
+                # Cleared before waiting, so a commit from here on wakes the wait
+                _wakeup.clear()
+                _wakeup.wait(self.poll)
+
+    def run_one(self) -> bool:
+        """Claim and run one job; False when none was due"""
+        with Session(self.engine) as session:
+            job = claim(session)
+        if job is None:
+            return False
+
+        start = time.perf_counter()
+        with Session(self.engine) as session:
+            try:
+                job_handler = handlers.get(job.kind)
+                if job_handler is None:
+                    raise UnknownJobKind(job.kind)
+                job_handler(session, json.loads(job.payload))
+                if complete(session, job):
+                    session.commit()
+                    outcome = "done"
+                else:
+                    session.rollback()
+                    outcome = "lease_lost"
+            except Exception:
+                session.rollback()
+                error = traceback.format_exc()
+                outcome = fail(session, job, error) or "lease_lost"
+                log = logger.error if outcome == "failed" else logger.warning
+                log("Job attempt failed", extra={
+                    "job_id": job.id, "kind": job.kind, "attempt": job.attempts, "outcome": outcome,
+                    "error": error.strip().splitlines()[-1],
+                })
+        job_duration.observe((job.kind,), time.perf_counter() - start)
+        jobs_processed.inc((job.kind, outcome))
+        return True
+
+    def maintain(self):
+        with Session(self.engine) as session:
+            requeued = requeue_expired(session)
+            purged = purge_finished(session)
+        if requeued:
+            logger.warning("Requeued jobs with lapsed leases", extra={"jobs": requeued})
+        if purged:
+            logger.info("Purged finished jobs", extra={"jobs": purged})
+
+    def stop(self):
+        self.stopped.set()
+        _wakeup.set()
+
+
+def run_workers(engine, count: int = JOB_WORKERS):
+    """Run count workers in the foreground until SIGINT or SIGTERM, for a jobs-only process"""
+    workers = [JobWorker(engine, index) for index in range(max(1, count))]
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    for worker in workers:
+        worker.start()
+    logger.info("Job workers started", extra={"workers": len(workers), "kinds": sorted(handlers)})
+    try:
+        while not stopping.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    # A job still running when the wait is over is picked up again once its lease lapses
+    for worker in workers:
+        worker.stop()
+    for worker in workers:
+        worker.join(JOB_POLL_SECONDS + 1)
@@ -0,0 +1,56 @@
+"""
+Leveled, structured logging for the API.
+
+Call sites log through `logger` with %-style arguments and put fields in
+`extra`, so a disabled level costs a single isEnabledFor check and nothing
+is formatted. LOG_LEVEL picks the level (default INFO) and LOG_FORMAT picks
+"text" (message followed by key=value fields) or "json" (one object per line).
+"""
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+logger = logging.getLogger("workspaceflow")
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class KeyValueFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(f"{key}={value!r}" for key, value in _fields(record).items())
+        return f"{line} {fields}" if fields else line
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+def configure_logging():
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    if os.environ.get("LOG_FORMAT", "text").lower() == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(KeyValueFormatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
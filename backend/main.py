@@ -1,12 +1,19 @@
 import os
 from pathlib import Path
 import shutil
+import signal
+import threading
 import uuid
-from fastapi import APIRouter, FastAPI, File, Form, HTTPException, Depends, Query, UploadFile
+from contextlib import asynccontextmanager
+from inspect import isawaitable
+from fastapi import APIRouter, FastAPI, File, Form, HTTPException, Depends, Query, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
 from fastapi.staticfiles import StaticFiles
 from sqlmodel import Session, select, delete, create_engine
-from typing import List, Optional, Dict, Any
+from sqlalchemy import case, func, or_, text
+from typing import Callable, List, Optional, Dict, Any
 from datetime import datetime, date
 import uvicorn
 import jwt
@@ -14,41 +21,289 @@ from datetime import timedelta, datetime, UTC
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+import json
 
 from create_models import *
 from util import *
+from cache import VersionedCache, bump_version
+from serializers import (
+    FastJSONResponse, activity_serializer, member_serializer, message_serializer,
+    subtask_serializer, task_serializer, workflow_serializer, workspace_serializer
+)
+from sqlmodel.ext.asyncio.session import AsyncSession
+from async_db import make_async_engine
+from models import Job, configure_sqlite
+from logs import configure_logging, logger
+from metrics import CONTENT_TYPE, MetricsMiddleware, instrument_engine, render_metrics, requests_in_flight
+from querydebug import QUERY_DEBUG, QueryDebugMiddleware, watch_engine
+from conditional import (
+    REVALIDATE, ConditionalGetMiddleware, collection_etag_async, etag_matches, if_match_version, make_etag, not_modified,
+    row_etag_async, version_etag
+)
+from versioning import VersionConflict, versioned_update
+from analytics import install_analytics, rebuild_analytics, workspace_analytics
+from burndown import flow_history, install_status_log, log_status_change
+from scheduling import CycleError, gantt_payload, get_schedule, invalidate_schedule, reschedule_task
+from inbox import install_inbox, member_inbox
+from workload import WORKLOAD_FIELDS, get_workload, invalidate_workflow_workload, invalidate_workload
+from archive import MEDIA_TYPE as ARCHIVE_MEDIA_TYPE, ArchiveError, export_workspace, import_workspace
+from backup import BACKUP_INTERVAL_MINUTES, BackupScheduler
+from ranking import (
+    RANK_MAX_LENGTH, RankConflict, RankRebalancer, append_rank, place_between, request_rebalance
+)
+from ratelimit import RateLimitMiddleware
+from idempotency import IdempotencyMiddleware
+from trash import TrashPurger, restore_task
+from jobs import JOB_WORKERS, JobWorker, enqueue, sample_queue
+from notifications import (
+    UNREAD_COUNT_CAP, DueDateScanner, mark_read, member_notifications, notify_assigned, notify_message, unread_count
+)
+from authz import (
+    AUTHZ_ENABLED, DENY, MEMBER, RESOURCE_PARAMS, ROLE_LEVELS, Authorizer, AuthzRefresher, invalidate, required_level
+)
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
 
-DATABASE_URL = "sqlite:///workspaceflow.db"
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///workspaceflow.db")
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 300
-
-engine = create_engine(DATABASE_URL)
+COMPRESSION_MIN_SIZE = 1024
+# Seconds /health/ready reports 503 after SIGTERM before the server stops accepting connections
+SHUTDOWN_DRAIN_SECONDS = float(os.environ.get("SHUTDOWN_DRAIN_SECONDS", "0"))
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+# Sync routes and get_session's teardown share AnyIO's 40-thread limiter. A capped pool lets
+# every thread block on checkout while the connections wait for a thread to close their
+# session, so keep one connection per thread and let the pool overflow instead of blocking.
+THREADPOOL_SIZE = 40
+
+engine = create_engine(DATABASE_URL, pool_size=THREADPOOL_SIZE, max_overflow=-1)
+async_engine = make_async_engine(DATABASE_URL)
+configure_sqlite(engine)
+configure_sqlite(async_engine.sync_engine)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+watch_engine(engine)
+watch_engine(async_engine.sync_engine)
+configure_logging()
 
 create_db_and_tables()
+install_analytics(engine)
+install_inbox(engine)
+install_status_log(engine)
+authorizer = Authorizer(engine)
+
+shutdown_hooks: List[Callable] = []
+
+def on_shutdown(hook: Callable):
+    """Register a callable (sync or async) that flushes pending work before the worker exits"""
+    shutdown_hooks.append(hook)
+    return hook
+
+def _install_drain_handler():
+    # Wraps the server's own SIGTERM handler: readiness flips to 503 straight away, and the
+    # server starts its graceful shutdown (stop accepting, finish in-flight requests) after
+    # SHUTDOWN_DRAIN_SECONDS so load balancers have time to notice
+    if threading.current_thread() is not threading.main_thread():
+        return
+    server_handler = signal.getsignal(signal.SIGTERM)
+    if not callable(server_handler):
+        return
+
+    def handle_sigterm(signum, frame):
+        app.state.draining = True
+        if SHUTDOWN_DRAIN_SECONDS > 0:
+            threading.Timer(SHUTDOWN_DRAIN_SECONDS, server_handler, (signum, frame)).start()
+        else:
+            server_handler(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _install_drain_handler()
+    if BACKUP_INTERVAL_MINUTES > 0 and engine.dialect.name == "sqlite":
+        # Started here rather than at import so each forked worker gets its own thread
+        scheduler = BackupScheduler(engine.url.database, UPLOAD_DIR, interval=BACKUP_INTERVAL_MINUTES * 60)
+        scheduler.start()
+        on_shutdown(scheduler.stop)
+    rebalancer = RankRebalancer(engine)
+    rebalancer.start()
+    on_shutdown(rebalancer.stop)
+    purger = TrashPurger(engine, idle=lambda: requests_in_flight.value() == 0)
+    purger.start()
+    on_shutdown(purger.stop)
+    scanner = DueDateScanner(engine)
+    scanner.start()
+    on_shutdown(scanner.stop)
+    if AUTHZ_ENABLED:
+        refresher = AuthzRefresher(authorizer)
+        refresher.start()
+        on_shutdown(refresher.stop)
+    # JOB_WORKERS=0 when a separate `run_api.py --jobs` process runs them
+    for index in range(JOB_WORKERS):
+        worker = JobWorker(engine, index)
+        worker.start()
+        on_shutdown(worker.stop)
+    yield
+    app.state.draining = True
+    for hook in shutdown_hooks:
+        result = hook()
+        if isawaitable(result):
+            await result
+    await async_engine.dispose()
+    engine.dispose()
+
+def caller_or_401(request: Request) -> int:
+    caller = request_caller(request.scope)
+    if caller is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return int(caller[len("member:"):])
+
+def raise_if_denied(decision: str):
+    if decision == DENY:
+        raise HTTPException(status_code=403, detail="Not allowed in this workspace")
+
+async def authorize_request(request: Request):
+    """With AUTHZ, check the caller's workspace role for every resource id in the path or query"""
+    if not AUTHZ_ENABLED:
+        return
+    resources = [
+        (RESOURCE_PARAMS[name], int(value))
+        for params in (request.path_params, request.query_params)
+        for name, value in params.items()
+        if name in RESOURCE_PARAMS and value.isdigit()
+    ]
+    if not resources:
+        return
+    member_id = caller_or_401(request)
+    level = required_level(request.method, request.scope["route"].path)
+    for kind, resource_id in resources:
+        decision = authorizer.cached_decision(member_id, kind, resource_id, level)
+        if decision is None:
+            decision = await run_in_threadpool(authorizer.decision, member_id, kind, resource_id, level)
+        # Unknown ids go through to the route's own 404
+        raise_if_denied(decision)
+
+async def require_caller(request: Request):
+    """With AUTHZ, a bearer token for routes that name no workspace"""
+    if AUTHZ_ENABLED:
+        caller_or_401(request)
+
+def check_self(request: Request, member_id):
+    """With AUTHZ, 403 unless member_id is the caller's"""
+    # Compared as text: a malformed id is left to the route's own validation
+    if AUTHZ_ENABLED and str(caller_or_401(request)) != str(member_id):
+        raise HTTPException(status_code=403, detail="Only available to the member themselves")
+
+async def require_self(request: Request):
+    """With AUTHZ, a route under /members/{member_id} answers only that member"""
+    check_self(request, request.path_params["member_id"])
+
+# Query parameters naming the member a route acts as
+ACTING_MEMBER_PARAMS = ("created_by", "author_id")
+
+async def require_acting_self(request: Request):
+    """With AUTHZ, a route acting as created_by or author_id acts only as the caller"""
+    for name in ACTING_MEMBER_PARAMS:
+        if name in request.query_params:
+            check_self(request, request.query_params[name])
+
+def require_access(request: Request, kind: str, resource_id: int, level: int = MEMBER):
+    """authorize_request for an id from the request body; may run SQL, so not on the event loop"""
+    if AUTHZ_ENABLED:
+        raise_if_denied(authorizer.decision(caller_or_401(request), kind, resource_id, level))
 
 app = FastAPI(
     title="Workspace Management API",
     description="API for managing workspaces, workflows, tasks, and team collaboration",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    dependencies=[Depends(authorize_request)]
 )
+app.state.draining = False
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+def request_caller(scope) -> Optional[str]:
+    """Caller key for requests with a valid bearer token, used by rate limiting, idempotency and authorization"""
+    # Decoded once per request however many layers ask
+    state = scope.setdefault("state", {})
+    if "caller" not in state:
+        state["caller"] = _token_caller(scope)
+    return state["caller"]
+
+def _token_caller(scope) -> Optional[str]:
+    authorization = Headers(scope=scope).get("authorization", "")
+    if not authorization.startswith("Bearer "):
+        return None
+    result = verify_access_token(authorization[len("Bearer "):])
+    return f"member:{result['data']['sub']}" if result["valid"] else None
+
+app.add_middleware(ConditionalGetMiddleware)
+# Inside compression, so stored responses replay to clients with any Accept-Encoding
+app.add_middleware(IdempotencyMiddleware, engine=async_engine, identify=request_caller)
+# Archives are deflated already; recompressing them would only burn event-loop time
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_SIZE, excluded_handlers=[r"/workspaces/\d+/export"])
+else:
+    app.add_middleware(
+        GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE,
+        exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + (ARCHIVE_MEDIA_TYPE,)
+    )
+
+# Inside CORS so browsers can read the 429/503 responses
+app.add_middleware(RateLimitMiddleware, identify=request_caller)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://127.0.0.1:8080"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read by clients to send If-Match on their next update
+    expose_headers=["ETag"],
 )
+app.add_middleware(MetricsMiddleware)
+if QUERY_DEBUG:
+    app.add_middleware(QueryDebugMiddleware)
 
 def get_session():
     with Session(engine) as session:
         yield session
 
+async def get_async_session():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+def if_match_or_400(request: Request) -> Optional[int]:
+    try:
+        return if_match_version(request)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a version ETag")
+
+def update_versioned_row(session: Session, model, row_id: int, values: dict, request: Request, not_found: str,
+                         expected_version: Optional[int] = None, fields=None):
+    """versioned_update against the If-Match version (or expected_version), as HTTP errors"""
+    if expected_version is None:
+        expected_version = if_match_or_400(request)
+    try:
+        return versioned_update(session, model, row_id, values, expected_version, fields)
+    except LookupError:
+        raise HTTPException(status_code=404, detail=not_found)
+    except VersionConflict as conflict:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Modified by someone else", "current": jsonable_encoder(conflict.current)},
+            headers={"ETag": version_etag(conflict.current.version)}
+        )
+
 def hash_password(password: str):
     return pwd_context.hash(password)
 
@@ -60,7 +315,6 @@ def create_access_token(data: dict, expires_delta: timedelta):
     expire = datetime.now(UTC) + expires_delta
     to_encode.update({"exp": expire})
     to_encode.update({"sub": str(to_encode.get("sub"))})
-    print(to_encode)
     token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return token
 
@@ -89,6 +343,7 @@ def login(credentials: LoginRequest, session: Session = Depends(get_session)):
     
     if member and verify_password(s_password, member.password):
         access_token = create_access_token({"sub": member.id}, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+        logger.info("Login succeeded", extra={"member_id": member.id})
         return {
             'success': True,
             'access_token': access_token, 
@@ -98,6 +353,7 @@ def login(credentials: LoginRequest, session: Session = Depends(get_session)):
             "message": "Login successful"
         }
     else:
+        logger.info("Login failed", extra={"known_email": member is not None})
         raise HTTPException(status_code=401, detail={"message": "Invalid credentials"})
 
 @app.post("/signup")
@@ -127,18 +383,68 @@ def signup(credentials: MemberCreate, session: Session = Depends(get_session)):
     return {"Message": "Passwords dont match!"}
 
 @app.get("/members", response_model=List[Member])
-def get_members(session: Session = Depends(get_session)):
+async def get_members(request: Request, response: Response, session: AsyncSession = Depends(get_async_session)):
     """Get all members"""
-    return session.exec(select(Member)).all()
+    etag = await collection_etag_async(session, "members", func.count(Member.id), func.max(Member.updated_at))
+    if cached := not_modified(request, response, etag):
+        return cached
+    members = member_serializer.from_rows((await session.exec(member_serializer.select())).all())
+    return FastJSONResponse(members, headers={"ETag": etag, "Cache-Control": REVALIDATE})
 
 @app.get("/members/{member_id}", response_model=Member)
-def get_member(member_id: int, session: Session = Depends(get_session)):
+async def get_member(member_id: int, session: AsyncSession = Depends(get_async_session)):
     """Get a specific member"""
-    member = session.get(Member, member_id)
+    member = await session.get(Member, member_id)
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
     return member
 
+@app.get("/members/{member_id}/tasks", dependencies=[Depends(require_self)])
+def get_member_tasks(
+    member_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+    session: Session = Depends(get_session)
+):
+    """Get the open tasks assigned to a member across all workspaces, soonest due first"""
+    member = session.get(Member, member_id)
+    if not member:
+        raise HTTPException(status_code=404, detail="Member not found")
+
+    try:
+        return member_inbox(session, member_id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/members/{member_id}/notifications", dependencies=[Depends(require_self)])
+def get_member_notifications(
+    member_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    before_id: Optional[int] = Query(None),
+    unread_only: bool = Query(False),
+    session: Session = Depends(get_session)
+):
+    """Get a member's notifications, newest first; pass next_before_id back as before_id for older ones"""
+    result = member_notifications(session, member_id, limit, before_id, unread_only)
+    # Only an empty page needs the extra lookup
+    if not result["notifications"] and not session.get(Member, member_id):
+        raise HTTPException(status_code=404, detail="Member not found")
+    return result
+
+@app.get("/members/{member_id}/notifications/unread-count", dependencies=[Depends(require_self)])
+def get_unread_notification_count(member_id: int, session: Session = Depends(get_session)):
+    """Count a member's unread notifications, up to a cap"""
+    count = unread_count(session, member_id)
+    return {"member_id": member_id, "unread": count, "capped": count >= UNREAD_COUNT_CAP}
+
+@app.post("/members/{member_id}/notifications/read", dependencies=[Depends(require_self)])
+def read_member_notifications(member_id: int, body: NotificationsRead, session: Session = Depends(get_session)):
+    """Mark a member's notifications read up to an id, or all of them"""
+    member = session.get(Member, member_id)
+    if not member:
+        raise HTTPException(status_code=404, detail="Member not found")
+    return {"member_id": member_id, "last_read_id": mark_read(session, member_id, body.up_to)}
+
 @app.post("/members", response_model=Member)
 def create_member(member_data: MemberCreate, session: Session = Depends(get_session)):
     """Create a new member"""
@@ -148,7 +454,7 @@ def create_member(member_data: MemberCreate, session: Session = Depends(get_sess
     session.refresh(member)
     return member
 
-@app.put("/members/{member_id}", response_model=Member)
+@app.put("/members/{member_id}", response_model=Member, dependencies=[Depends(require_self)])
 def update_member(member_id: int, member_data: MemberUpdate, session: Session = Depends(get_session)):
     """Update a member"""
     member = session.get(Member, member_id)
@@ -168,7 +474,7 @@ def update_member(member_id: int, member_data: MemberUpdate, session: Session =
     session.refresh(member)
     return member
 
-@app.delete("/members/{member_id}")
+@app.delete("/members/{member_id}", dependencies=[Depends(require_self)])
 def delete_member(member_id: int, session: Session = Depends(get_session)):
     """Delete a member"""
     member = session.get(Member, member_id)
@@ -180,23 +486,28 @@ def delete_member(member_id: int, session: Session = Depends(get_session)):
     return {"message": "Member deleted successfully"}
 
 @app.get("/workspaces", response_model=List[Workspace])
-def get_workspaces(session: Session = Depends(get_session)):
+async def get_workspaces(session: AsyncSession = Depends(get_async_session)):
     """Get all workspaces"""
-    return session.exec(select(Workspace)).all()
+    return (await session.exec(select(Workspace))).all()
 
 @app.get("/workspaces/{workspace_id}", response_model=Workspace)
-def get_workspace(workspace_id: int, session: Session = Depends(get_session)):
+async def get_workspace(workspace_id: int, request: Request, response: Response, session: AsyncSession = Depends(get_async_session)):
     """Get a specific workspace with workflows"""
-    workspace = session.get(Workspace, workspace_id)
+    if cached := not_modified(request, response, await row_etag_async(session, Workspace, workspace_id)):
+        return cached
+    workspace = await session.get(Workspace, workspace_id)
     if not workspace:
         raise HTTPException(status_code=404, detail="Workspace not found")
     return workspace
 
-@app.post("/workspaces", response_model=Workspace)
+@app.post("/workspaces", response_model=Workspace, dependencies=[Depends(require_acting_self)])
 def create_workspace(workspace_data: WorkspaceCreate, created_by: int, session: Session = Depends(get_session)):
     """Create a new workspace"""
     workspace = Workspace(**workspace_data.dict(), created_by=created_by)
     session.add(workspace)
+    session.flush()
+    session.add(WorkspaceMemberLink(workspace_id=workspace.id, member_id=created_by, role="owner"))
+    invalidate(session, "member", created_by)
     session.commit()
     session.refresh(workspace)
     
@@ -206,19 +517,21 @@ def create_workspace(workspace_data: WorkspaceCreate, created_by: int, session:
     return workspace
 
 @app.put("/workspaces/{workspace_id}", response_model=Workspace)
-def update_workspace(workspace_id: int, workspace_data: WorkspaceUpdate, session: Session = Depends(get_session)):
-    """Update a workspace"""
-    workspace = session.get(Workspace, workspace_id)
-    if not workspace:
-        raise HTTPException(status_code=404, detail="Workspace not found")
-    
-    for field, value in workspace_data.dict(exclude_unset=True).items():
-        setattr(workspace, field, value)
-    
-    workspace.updated_at = ksa_now()
+def update_workspace(workspace_id: int, workspace_data: WorkspaceUpdate, request: Request, session: Session = Depends(get_session)):
+    """Update a workspace; with If-Match, only while it is still at that version"""
+    values = {**workspace_data.dict(exclude_unset=True), "updated_at": ksa_now()}
+    workspace = update_versioned_row(session, Workspace, workspace_id, values, request, "Workspace not found")
+    payload = workspace_serializer.from_object(workspace)
     session.commit()
-    session.refresh(workspace)
-    return workspace
+    return FastJSONResponse(payload, headers={"ETag": version_etag(payload["version"])})
+
+@app.patch("/workspaces/{workspace_id}")
+def patch_workspace(workspace_id: int, workspace_data: WorkspaceUpdate, request: Request, session: Session = Depends(get_session)):
+    """Update the given fields of a workspace; returns only those, with id, version and updated_at"""
+    values = {**workspace_data.dict(exclude_unset=True), "updated_at": ksa_now()}
+    workspace = update_versioned_row(session, Workspace, workspace_id, values, request, "Workspace not found", fields=values)
+    session.commit()
+    return FastJSONResponse(dict(workspace._mapping), headers={"ETag": version_etag(workspace.version)})
 
 @app.delete("/workspaces/{workspace_id}")
 def delete_workspace(workspace_id: int, session: Session = Depends(get_session)):
@@ -227,29 +540,181 @@ def delete_workspace(workspace_id: int, session: Session = Depends(get_session))
     if not workspace:
         raise HTTPException(status_code=404, detail="Workspace not found")
     
+    session.exec(delete(WorkspaceMemberLink).where(WorkspaceMemberLink.workspace_id == workspace_id))
     session.delete(workspace)
+    invalidate(session, "member")
+    invalidate(session, "workflow")
     session.commit()
     return {"message": "Workspace deleted successfully"}
 
+@app.put("/workspaces/{workspace_id}/members/{member_id}", response_model=WorkspaceMemberLink)
+def set_workspace_member(workspace_id: int, member_id: int, body: WorkspaceMemberSet, session: Session = Depends(get_session)):
+    """Add a member to a workspace, or change their role in it"""
+    if body.role not in ROLE_LEVELS:
+        raise HTTPException(status_code=400, detail=f"Role must be one of: {', '.join(ROLE_LEVELS)}")
+    if not session.get(Workspace, workspace_id):
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    if not session.get(Member, member_id):
+        raise HTTPException(status_code=404, detail="Member not found")
+
+    link = session.get(WorkspaceMemberLink, (workspace_id, member_id))
+    if link:
+        link.role = body.role
+    else:
+        link = WorkspaceMemberLink(workspace_id=workspace_id, member_id=member_id, role=body.role)
+        session.add(link)
+    invalidate(session, "member", member_id)
+    invalidate_workload(session, workspace_id)
+    session.commit()
+    session.refresh(link)
+    return link
+
+@app.delete("/workspaces/{workspace_id}/members/{member_id}")
+def remove_workspace_member(workspace_id: int, member_id: int, session: Session = Depends(get_session)):
+    """Take a member out of a workspace"""
+    link = session.get(WorkspaceMemberLink, (workspace_id, member_id))
+    if not link:
+        raise HTTPException(status_code=404, detail="Not a member of this workspace")
+
+    session.delete(link)
+    invalidate(session, "member", member_id)
+    invalidate_workload(session, workspace_id)
+    session.commit()
+    return {"message": "Member removed from workspace"}
+
+@app.get("/workspaces/{workspace_id}/analytics")
+def get_workspace_analytics(
+    workspace_id: int,
+    weeks: int = Query(12, ge=1, le=104),
+    session: Session = Depends(get_session)
+):
+    """Get task counts per column, overdue tasks, hours and weekly completions of a workspace"""
+    workspace = session.get(Workspace, workspace_id)
+    if not workspace:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    return workspace_analytics(session, workspace_id, weeks)
+
+@app.post("/workspaces/{workspace_id}/analytics/rebuild")
+def rebuild_workspace_analytics(
+    workspace_id: int,
+    defer: bool = Query(False, description="queue the rebuild and answer 202 with its job id"),
+    session: Session = Depends(get_session)
+):
+    """Recompute the analytics aggregates of a workspace from its tasks"""
+    workspace = session.get(Workspace, workspace_id)
+    if not workspace:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    if defer:
+        job_id = enqueue(session, "rebuild_analytics", {"workspace_id": workspace_id},
+                         dedupe_key=f"rebuild_analytics:{workspace_id}")
+        session.commit()
+        return JSONResponse({"job_id": job_id}, status_code=202)
+    rebuild_analytics(session, workspace_id)
+    return workspace_analytics(session, workspace_id)
+
+@app.get("/workspaces/{workspace_id}/workload")
+def get_workspace_workload(
+    workspace_id: int,
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    capacity: float = Query(8.0, gt=0),
+    session: Session = Depends(get_session)
+):
+    """Get per-member allocated hours for each day of a date range"""
+    workspace = session.get(Workspace, workspace_id)
+    if not workspace:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+
+    start = start or ksa_now().date()
+    end = end or start + timedelta(days=13)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be on or before end")
+    if (end - start).days > 366:
+        raise HTTPException(status_code=400, detail="Date range is too large")
+
+    return get_workload(session, workspace_id, start, end, capacity)
+
+@app.get("/workspaces/{workspace_id}/export")
+async def export_workspace_archive(workspace_id: int, session: AsyncSession = Depends(get_async_session)):
+    """Stream a workspace with its workflows, tasks, chat, activity and attachment files as a zip archive"""
+    if not await session.get(Workspace, workspace_id):
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    filename = f"workspace-{workspace_id}-{ksa_now():%Y%m%d}.zip"
+    return StreamingResponse(
+        export_workspace(engine, workspace_id),
+        media_type=ARCHIVE_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.post("/workspaces/import", status_code=201, dependencies=[Depends(require_caller)])
+def import_workspace_archive(archive: UploadFile = File(...), name: Optional[str] = Form(None)):
+    """Create a new workspace from an export archive"""
+    try:
+        result = import_workspace(engine, archive.file, UPLOAD_DIR, name)
+    except ArchiveError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The archive's members join the new workspace
+    with Session(engine) as session:
+        invalidate(session, "member")
+        session.commit()
+    logger.info("Workspace imported", extra=result)
+    return result
+
 @app.get("/workflows", response_model=List[Workflow])
-def get_workflows(workspace_id: Optional[int] = Query(None), session: Session = Depends(get_session)):
+async def get_workflows(workspace_id: Optional[int] = Query(None), session: AsyncSession = Depends(get_async_session)):
     """Get workflows, optionally filtered by workspace"""
     query = select(Workflow)
     if workspace_id:
         query = query.where(Workflow.workspace_id == workspace_id)
-    return session.exec(query).all()
+    return (await session.exec(query)).all()
 
 @app.get("/workflows/{workflow_id}", response_model=Workflow)
-def get_workflow(workflow_id: int, session: Session = Depends(get_session)):
+async def get_workflow(workflow_id: int, request: Request, response: Response, session: AsyncSession = Depends(get_async_session)):
     """Get a specific workflow with tasks"""
-    workflow = session.get(Workflow, workflow_id)
+    if cached := not_modified(request, response, await row_etag_async(session, Workflow, workflow_id)):
+        return cached
+    workflow = await session.get(Workflow, workflow_id)
     if not workflow:
         raise HTTPException(status_code=404, detail="Workflow not found")
     return workflow
 
-@app.post("/workflows", response_model=Workflow)
-def create_workflow(workflow_data: WorkflowCreate, created_by: int, session: Session = Depends(get_session)):
+@app.get("/workflows/{workflow_id}/flow")
+def get_workflow_flow(
+    workflow_id: int,
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    session: Session = Depends(get_session)
+):
+    """Get daily per-column task counts (cumulative flow) and remaining open tasks (burndown)"""
+    workflow = session.get(Workflow, workflow_id)
+    if not workflow:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+
+    end = end or ksa_now().date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be on or before end")
+    if (end - start).days > 3660:
+        raise HTTPException(status_code=400, detail="Date range is too large")
+
+    return flow_history(session, workflow_id, start, end)
+
+@app.get("/workflows/{workflow_id}/gantt")
+def get_workflow_gantt(workflow_id: int, session: Session = Depends(get_session)):
+    """Get the scheduled Gantt bars of a workflow with slack and the critical path"""
+    workflow = session.get(Workflow, workflow_id)
+    if not workflow:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+
+    try:
+        return gantt_payload(session, workflow_id)
+    except CycleError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/workflows", response_model=Workflow, dependencies=[Depends(require_acting_self)])
+def create_workflow(workflow_data: WorkflowCreate, created_by: int, request: Request, session: Session = Depends(get_session)):
     """Create a new workflow"""
+    require_access(request, "workspace", workflow_data.workspace_id)
     workspace = session.get(Workspace, workflow_data.workspace_id)
     if not workspace:
         raise HTTPException(status_code=404, detail="Workspace not found")
@@ -265,19 +730,21 @@ def create_workflow(workflow_data: WorkflowCreate, created_by: int, session: Ses
     return workflow
 
 @app.put("/workflows/{workflow_id}", response_model=Workflow)
-def update_workflow(workflow_id: int, workflow_data: WorkflowUpdate, session: Session = Depends(get_session)):
-    """Update a workflow"""
-    workflow = session.get(Workflow, workflow_id)
-    if not workflow:
-        raise HTTPException(status_code=404, detail="Workflow not found")
-    
-    for field, value in workflow_data.dict(exclude_unset=True).items():
-        setattr(workflow, field, value)
-    
-    workflow.updated_at = ksa_now()
+def update_workflow(workflow_id: int, workflow_data: WorkflowUpdate, request: Request, session: Session = Depends(get_session)):
+    """Update a workflow; with If-Match, only while it is still at that version"""
+    values = {**workflow_data.dict(exclude_unset=True), "updated_at": ksa_now()}
+    workflow = update_versioned_row(session, Workflow, workflow_id, values, request, "Workflow not found")
+    payload = workflow_serializer.from_object(workflow)
     session.commit()
-    session.refresh(workflow)
-    return workflow
+    return FastJSONResponse(payload, headers={"ETag": version_etag(payload["version"])})
+
+@app.patch("/workflows/{workflow_id}")
+def patch_workflow(workflow_id: int, workflow_data: WorkflowUpdate, request: Request, session: Session = Depends(get_session)):
+    """Update the given fields of a workflow; returns only those, with id, version and updated_at"""
+    values = {**workflow_data.dict(exclude_unset=True), "updated_at": ksa_now()}
+    workflow = update_versioned_row(session, Workflow, workflow_id, values, request, "Workflow not found", fields=values)
+    session.commit()
+    return FastJSONResponse(dict(workflow._mapping), headers={"ETag": version_etag(workflow.version)})
 
 @app.delete("/workflows/{workflow_id}")
 def delete_workflow(workflow_id: int, session: Session = Depends(get_session)):
@@ -287,29 +754,36 @@ def delete_workflow(workflow_id: int, session: Session = Depends(get_session)):
         raise HTTPException(status_code=404, detail="Workflow not found")
     
     session.delete(workflow)
+    invalidate(session, "workflow", workflow_id)
+    invalidate_workload(session, workflow.workspace_id)
+    invalidate_schedule(session, workflow_id)
     session.commit()
     return {"message": "Workflow deleted successfully"}
 
 @app.get("/tasks", response_model=List[Task])
-def get_tasks(workflow_id: Optional[int] = Query(None), session: Session = Depends(get_session)):
+async def get_tasks(workflow_id: Optional[int] = Query(None), session: AsyncSession = Depends(get_async_session)):
     """Get tasks, optionally filtered by workflow"""
-    query = select(Task)
+    query = task_serializer.select().where(Task.deleted_at.is_(None))
 
     if workflow_id:
-        query = query.where(Task.workflow_id == workflow_id)
-    return session.exec(query).all()
+        # Board order, read straight off ix_task_live_board
+        query = query.where(Task.workflow_id == workflow_id).order_by(Task.column_id, Task.rank, Task.id)
+    return FastJSONResponse(task_serializer.from_rows((await session.exec(query)).all()))
 
 @app.get("/tasks/{task_id}", response_model=Task)
-def get_task(task_id: int, session: Session = Depends(get_session)):
+async def get_task(task_id: int, request: Request, response: Response, session: AsyncSession = Depends(get_async_session)):
     """Get a specific task with subtasks and messages"""
-    task = session.get(Task, task_id)
-    if not task:
+    if cached := not_modified(request, response, await row_etag_async(session, Task, task_id)):
+        return cached
+    task = await session.get(Task, task_id)
+    if not task or task.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
 
-@app.post("/tasks", response_model=Task)
-def create_task(task_data: TaskCreate, created_by: int, session: Session = Depends(get_session)):
+@app.post("/tasks", response_model=Task, dependencies=[Depends(require_acting_self)])
+def create_task(task_data: TaskCreate, created_by: int, request: Request, session: Session = Depends(get_session)):
     """Create a new task"""
+    require_access(request, "workflow", task_data.workflow_id)
     workflow = session.get(Workflow, task_data.workflow_id)
     if not workflow:
         raise HTTPException(status_code=404, detail="Workflow not found")
@@ -318,59 +792,179 @@ def create_task(task_data: TaskCreate, created_by: int, session: Session = Depen
     assignee_ids = task_dict.pop('assignee_ids', [])
     
     task = Task(**task_dict, created_by=created_by)
+    # At the bottom of its column, computed by the INSERT itself
+    task.rank = append_rank(task_data.column_id, workflow.id)
     session.add(task)
-    session.commit()
-    session.refresh(task)
+    session.flush()
     
-    for assignee_id in assignee_ids:
-        member = session.get(Member, assignee_id)
-        if member:
-            task_link = TaskMemberLink(task_id=task.id, member_id=assignee_id)
-            session.add(task_link)
+    if assignee_ids:
+        existing_ids = session.exec(select(Member.id).where(Member.id.in_(assignee_ids))).all()
+        session.add_all(TaskMemberLink(task_id=task.id, member_id=member_id) for member_id in set(existing_ids))
+        notify_assigned(session, task.id, existing_ids, actor_id=created_by)
     
+    invalidate_workload(session, workflow.workspace_id)
+    invalidate_schedule(session, workflow.id)
     session.commit()
     session.refresh(task)
+    if len(task.rank) > RANK_MAX_LENGTH:
+        request_rebalance(task.workflow_id, task.column_id)
     
     return task
 
 @app.put("/tasks/{task_id}", response_model=Task)
-def update_task(task_id: int, task_data: TaskUpdate, session: Session = Depends(get_session)):
-    """Update a task"""
-    task = session.get(Task, task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-
-    for field, value in task_data.dict(exclude_unset=True).items():
-        setattr(task, field, value)
-
-    task.updated_at = ksa_now()
+def update_task(task_id: int, task_data: TaskUpdate, request: Request, session: Session = Depends(get_session)):
+    """Update a task; with If-Match, only while it is still at that version"""
+    payload = write_task_update(session, task_id, task_data, request, partial=False)
+    return FastJSONResponse(payload, headers={"ETag": version_etag(payload["version"])})
+
+@app.patch("/tasks/{task_id}")
+def patch_task(task_id: int, task_data: TaskUpdate, request: Request, session: Session = Depends(get_session)):
+    """Update the given fields of a task, e.g. column_id and after_id/before_id for a drag
+
+    Returns only those, with id, version and updated_at.
+    """
+    payload = write_task_update(session, task_id, task_data, request, partial=True)
+    return FastJSONResponse(payload, headers={"ETag": version_etag(payload["version"])})
+
+SCHEDULE_FIELDS = {"start_date", "end_date", "estimated_hours"}
+PLACEMENT_FIELDS = {"after_id", "before_id"}
+
+def write_task_update(session: Session, task_id: int, task_data: TaskUpdate, request: Request, partial: bool) -> dict:
+    """One UPDATE ... RETURNING of a task and its cache invalidation; the payload, whole or only the changed fields"""
+    expected_version = if_match_or_400(request)
+    changes = task_data.dict(exclude_unset=True, exclude=PLACEMENT_FIELDS)
+    placement = task_data.dict(exclude_unset=True, include=PLACEMENT_FIELDS)
+    values = {**changes, "updated_at": ksa_now()}
 
     if task_data.progress_percentage == 100.0:
-        task.completed_at = ksa_now()
+        values["completed_at"] = values["updated_at"]
+
+    if placement:
+        try:
+            values["rank"] = place_between(
+                session, task_id, changes.get("column_id"), placement.get("after_id"), placement.get("before_id")
+            )
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except RankConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    elif "column_id" in changes:
+        # Dropped without neighbours: to the end of the new column. Forms send
+        # the status on every save, so a card staying in its column keeps its place
+        values["rank"] = case(
+            (Task.column_id == changes["column_id"], Task.rank), else_=append_rank(changes["column_id"])
+        )
 
+    if "column_id" in changes:
+        log_status_change(session, task_id, changes["column_id"], changes.get("title"), expected_version)
+
+    fields = None
+    if partial:
+        # Plus whatever the invalidation below reads
+        fields = set(values)
+        if changes.keys() & SCHEDULE_FIELDS:
+            fields |= SCHEDULE_FIELDS | {"workflow_id"}
+        if changes.keys() & WORKLOAD_FIELDS or "rank" in values:
+            fields.add("workflow_id")
+        if "rank" in values:
+            fields.add("column_id")
+
+    task = update_versioned_row(session, Task, task_id, values, request, "Task not found", expected_version, fields)
+    payload = dict(task._mapping) if partial else task_serializer.from_object(task)
+    if changes.keys() & WORKLOAD_FIELDS:
+        invalidate_workflow_workload(session, payload["workflow_id"])
+    if changes.keys() & SCHEDULE_FIELDS:
+        reschedule_task(session, task)
     session.commit()
-    session.refresh(task)
 
-    return JSONResponse(status_code=200, content=jsonable_encoder(task))
+    if "rank" in values and len(payload["rank"]) > RANK_MAX_LENGTH:
+        request_rebalance(payload["workflow_id"], payload["column_id"])
+    return payload
 
 
 @app.delete("/tasks/{task_id}")
-def delete_task(task_id: int, session: Session = Depends(get_session)):
-    """Delete a task"""
+def delete_task(task_id: int, request: Request, session: Session = Depends(get_session)):
+    """Move a task to the trash; with If-Match, only while it is still at that version"""
+    now = ksa_now()
+    task = update_versioned_row(
+        session, Task, task_id, {"deleted_at": now, "updated_at": now}, request, "Task not found", fields={"workflow_id"}
+    )
+    invalidate_workflow_workload(session, task.workflow_id)
+    invalidate_schedule(session, task.workflow_id)
+    session.commit()
+    return FastJSONResponse(
+        {"message": "Task moved to trash", "id": task.id, "version": task.version},
+        headers={"ETag": version_etag(task.version)}
+    )
+
+@app.post("/tasks/{task_id}/restore")
+def restore_trashed_task(task_id: int, session: Session = Depends(get_session)):
+    """Bring a task back from the trash, in its old column and position"""
+    try:
+        task = restore_task(session, task_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    invalidate_workflow_workload(session, task.workflow_id)
+    invalidate_schedule(session, task.workflow_id)
+    session.commit()
+    return FastJSONResponse(dict(task._mapping), headers={"ETag": version_etag(task.version)})
+
+@app.get("/workflows/{workflow_id}/trash")
+async def get_workflow_trash(workflow_id: int, session: AsyncSession = Depends(get_async_session)):
+    """Get the trashed tasks of a workflow, most recently deleted first"""
+    query = (
+        task_serializer.select()
+        .where(Task.workflow_id == workflow_id, Task.deleted_at.is_not(None))
+        .order_by(Task.deleted_at.desc())
+    )
+    return FastJSONResponse(task_serializer.from_rows((await session.exec(query)).all()))
+
+@app.get("/tasks/{task_id}/dependencies", response_model=List[TaskDependency])
+def get_task_dependencies(task_id: int, session: Session = Depends(get_session)):
+    """Get the tasks a task depends on"""
+    return session.exec(select(TaskDependency).where(TaskDependency.successor_id == task_id)).all()
+
+@app.post("/tasks/{task_id}/dependencies", response_model=TaskDependency)
+def create_task_dependency(task_id: int, dependency_data: TaskDependencyCreate, session: Session = Depends(get_session)):
+    """Make a task depend on another task of the same workflow"""
     task = session.get(Task, task_id)
-    if not task:
+    predecessor = session.get(Task, dependency_data.predecessor_id)
+    if not task or not predecessor or task.deleted_at is not None or predecessor.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    session.exec(delete(Subtask).filter(Subtask.task_id == task_id))
-    session.exec(delete(ChatMessage).filter(ChatMessage.task_id == task_id))
-    session.exec(delete(ActivityLog).filter(ActivityLog.task_id == task_id))
-    session.exec(delete(Attachment).filter(Attachment.task_id == task_id))
-    session.exec(delete(TaskMemberLink).filter(TaskMemberLink.task_id == task_id))
+    if predecessor.workflow_id != task.workflow_id:
+        raise HTTPException(status_code=400, detail="Dependencies must be within one workflow")
+    if session.get(TaskDependency, (predecessor.id, task.id)):
+        raise HTTPException(status_code=400, detail="Dependency already exists")
+
+    try:
+        schedule = get_schedule(session, task.workflow_id)
+    except CycleError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if predecessor.id == task.id or schedule.reaches(task.id, predecessor.id):
+        raise HTTPException(status_code=409, detail="Dependency would create a cycle")
+
+    dependency = TaskDependency(predecessor_id=predecessor.id, successor_id=task.id, lag_days=dependency_data.lag_days or 0)
+    session.add(dependency)
+    invalidate_schedule(session, task.workflow_id)
     session.commit()
-    
-    session.delete(task)
+    session.refresh(dependency)
+    return dependency
+
+@app.delete("/tasks/{task_id}/dependencies/{predecessor_id}")
+def delete_task_dependency(task_id: int, predecessor_id: int, session: Session = Depends(get_session)):
+    """Remove a dependency between two tasks"""
+    dependency = session.get(TaskDependency, (predecessor_id, task_id))
+    if not dependency:
+        raise HTTPException(status_code=404, detail="Dependency not found")
+
+    task = session.get(Task, task_id)
+    session.delete(dependency)
+    if task:
+        invalidate_schedule(session, task.workflow_id)
     session.commit()
-    return {"message": "Task deleted successfully"}
+    return {"message": "Dependency deleted successfully"}
 
 @app.post("/tasks/{task_id}/assign/{member_id}")
 def assign_task(task_id: int, member_id: int, session: Session = Depends(get_session)):
@@ -378,7 +972,7 @@ def assign_task(task_id: int, member_id: int, session: Session = Depends(get_ses
     task = session.get(Task, task_id)
     member = session.get(Member, member_id)
     
-    if not task:
+    if not task or task.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Task not found")
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
@@ -395,6 +989,8 @@ def assign_task(task_id: int, member_id: int, session: Session = Depends(get_ses
     
     task_link = TaskMemberLink(task_id=task_id, member_id=member_id)
     session.add(task_link)
+    notify_assigned(session, task_id, [member_id])
+    invalidate_workflow_workload(session, task.workflow_id)
     session.commit()
     
     return {"message": f"Member {member.id} assigned to task {task.title}"}
@@ -413,10 +1009,29 @@ def unassign_task(task_id: int, member_id: int, session: Session = Depends(get_s
         raise HTTPException(status_code=404, detail="Assignment not found")
     
     session.delete(task_link)
+    task = session.get(Task, task_id)
+    if task:
+        invalidate_workflow_workload(session, task.workflow_id)
     session.commit()
     
     return {"message": "Member unassigned from task"}
 
+@app.get("/workflows/{workflow_id}/assignees")
+async def get_workflow_assignees(workflow_id: int, session: AsyncSession = Depends(get_async_session)):
+    """Assignees of every live task of a workflow, by task id, in one query; the board reads these at once"""
+    query = (
+        member_serializer.select()
+        .add_columns(TaskMemberLink.task_id)
+        .join(TaskMemberLink, TaskMemberLink.member_id == Member.id)
+        .join(Task, Task.id == TaskMemberLink.task_id)
+        .where(Task.workflow_id == workflow_id, Task.deleted_at.is_(None))
+    )
+    assignees: Dict[int, list] = {}
+    for row in (await session.exec(query)).all():
+        # zip stops at the member columns, leaving task_id out
+        assignees.setdefault(row[-1], []).append(dict(zip(member_serializer.fields, row)))
+    return FastJSONResponse(assignees)
+
 @app.get("/assignees", response_model=List[Member])
 def get_assignees(task_id: int, session: Session = Depends(get_session)):
     """Get assignees of a task"""
@@ -428,18 +1043,19 @@ def get_assignees(task_id: int, session: Session = Depends(get_session)):
     return members
 
 @app.get("/subtasks", response_model=List[Subtask])
-def get_subtasks(task_id: Optional[int] = Query(None), session: Session = Depends(get_session)):
+async def get_subtasks(task_id: Optional[int] = Query(None), session: AsyncSession = Depends(get_async_session)):
     """Get subtasks, optionally filtered by task"""
-    query = select(Subtask)
+    query = subtask_serializer.select()
     if task_id:
         query = query.where(Subtask.task_id == task_id)
-    return session.exec(query).all()
+    return FastJSONResponse(subtask_serializer.from_rows((await session.exec(query)).all()))
 
-@app.post("/subtasks", response_model=Subtask)
-def create_subtask(subtask_data: SubtaskCreate, created_by: int, session: Session = Depends(get_session)):
+@app.post("/subtasks", response_model=Subtask, dependencies=[Depends(require_acting_self)])
+def create_subtask(subtask_data: SubtaskCreate, created_by: int, request: Request, session: Session = Depends(get_session)):
     """Create a new subtask"""
+    require_access(request, "task", subtask_data.task_id)
     task = session.get(Task, subtask_data.task_id)
-    if not task:
+    if not task or task.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Task not found")
     
     subtask = Subtask(**subtask_data.dict(), created_by=created_by)
@@ -449,26 +1065,31 @@ def create_subtask(subtask_data: SubtaskCreate, created_by: int, session: Sessio
     return subtask
 
 @app.put("/subtasks/{subtask_id}", response_model=Subtask)
-def update_subtask(subtask_id: int, subtask_data: SubtaskUpdate, session: Session = Depends(get_session)):
-    """Update a subtask"""
-    subtask = session.get(Subtask, subtask_id)
-    if not subtask:
-        raise HTTPException(status_code=404, detail="Subtask not found")
-    
-    for field, value in subtask_data.dict(exclude_unset=True).items():
-        setattr(subtask, field, value)
-    
-    subtask.updated_at = ksa_now()
-    
+def update_subtask(subtask_id: int, subtask_data: SubtaskUpdate, request: Request, session: Session = Depends(get_session)):
+    """Update a subtask; with If-Match, only while it is still at that version"""
+    values = subtask_values(subtask_data)
+    subtask = update_versioned_row(session, Subtask, subtask_id, values, request, "Subtask not found")
+    payload = subtask_serializer.from_object(subtask)
+    session.commit()
+    return FastJSONResponse(payload, headers={"ETag": version_etag(payload["version"])})
+
+@app.patch("/subtasks/{subtask_id}")
+def patch_subtask(subtask_id: int, subtask_data: SubtaskUpdate, request: Request, session: Session = Depends(get_session)):
+    """Update the given fields of a subtask; returns only those, with id, version and updated_at"""
+    values = subtask_values(subtask_data)
+    subtask = update_versioned_row(session, Subtask, subtask_id, values, request, "Subtask not found", fields=values)
+    session.commit()
+    return FastJSONResponse(dict(subtask._mapping), headers={"ETag": version_etag(subtask.version)})
+
+def subtask_values(subtask_data: SubtaskUpdate) -> dict:
+    values = {**subtask_data.dict(exclude_unset=True), "updated_at": ksa_now()}
+
     # Set completed_at if marking as completed
     if subtask_data.completed is True:
-        subtask.completed_at = ksa_now()
+        values["completed_at"] = values["updated_at"]
     elif subtask_data.completed is False:
-        subtask.completed_at = None
-    
-    session.commit()
-    session.refresh(subtask)
-    return subtask
+        values["completed_at"] = None
+    return values
 
 @app.delete("/subtasks/{subtask_id}")
 def delete_subtask(subtask_id: int, session: Session = Depends(get_session)):
@@ -478,24 +1099,28 @@ def delete_subtask(subtask_id: int, session: Session = Depends(get_session)):
         raise HTTPException(status_code=404, detail="Subtask not found")
     
     session.delete(subtask)
+    invalidate(session, "subtask", subtask_id)
     session.commit()
     return {"message": "Subtask deleted successfully"}
 
 @app.get("/chat-messages/{task_id}", response_model=List[ChatMessage])
-def get_messages(task_id: int, session: Session = Depends(get_session)):
+async def get_messages(task_id: int, session: AsyncSession = Depends(get_async_session)):
     """Get chat messages"""
-    query = select(ChatMessage).where(ChatMessage.task_id == task_id)
-    return session.exec(query.order_by(ChatMessage.created_at)).all()
+    query = message_serializer.select().where(ChatMessage.task_id == task_id).order_by(ChatMessage.created_at)
+    return FastJSONResponse(message_serializer.from_rows((await session.exec(query)).all()))
 
-@app.post("/chat-messages", response_model=ChatMessage)
-def create_message(message_data: ChatMessageCreate, author_id: int, session: Session = Depends(get_session)):
+@app.post("/chat-messages", response_model=ChatMessage, dependencies=[Depends(require_acting_self)])
+def create_message(message_data: ChatMessageCreate, author_id: int, request: Request, session: Session = Depends(get_session)):
     """Create a new chat message"""
+    require_access(request, "task", message_data.task_id)
     task = session.get(Task, message_data.task_id)
-    if not task:
+    if not task or task.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Task not found")
     
     message = ChatMessage(**message_data.dict(), author_id=author_id)
     session.add(message)
+    session.flush()
+    notify_message(session, message)
     session.commit()
     session.refresh(message)
     return message
@@ -508,37 +1133,99 @@ def delete_message(message_id: int, session: Session = Depends(get_session)):
         raise HTTPException(status_code=404, detail="Message not found")
     
     session.delete(message)
+    invalidate(session, "chatmessage", message_id)
     session.commit()
     return {"message": "Message deleted successfully"}
 
+STATUS_LAYOUTS = "status_layouts"
+status_layout_cache = VersionedCache()
+
+def _load_status_layouts(session: Session) -> dict:
+    templates = jsonable_encoder(session.exec(select(StatusTemplate)).all())
+    columns = jsonable_encoder(session.exec(select(StatusColumn)).all())
+    return {
+        "templates": json.dumps(templates).encode(),
+        "columns": columns,
+        "all_columns": json.dumps(columns).encode()
+    }
+
+def _status_layout_response(request: Request, version: int, body: bytes) -> Response:
+    headers = {"ETag": make_etag(STATUS_LAYOUTS, version), "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/status-templates", response_model=List[StatusTemplate])
-def get_status_templates(session: Session = Depends(get_session)):
+def get_status_templates(request: Request, session: Session = Depends(get_session)):
     """Get all status templates"""
-    return session.exec(select(StatusTemplate)).all()
+    version, layouts = status_layout_cache.get(session, STATUS_LAYOUTS, _load_status_layouts)
+    return _status_layout_response(request, version, layouts["templates"])
 
-@app.post("/status-templates", response_model=StatusTemplate)
+@app.post("/status-templates", response_model=StatusTemplate, dependencies=[Depends(require_acting_self)])
 def create_status_template(template_data: StatusTemplateCreate, created_by: int, session: Session = Depends(get_session)):
     """Create a new status template"""
     template = StatusTemplate(**template_data.dict(), created_by=created_by)
     session.add(template)
+    bump_version(session, STATUS_LAYOUTS)
     session.commit()
     session.refresh(template)
     return template
 
+@app.put("/status-templates/{template_id}", response_model=StatusTemplate)
+def update_status_template(template_id: int, template_data: StatusTemplateUpdate, session: Session = Depends(get_session)):
+    """Update a status template"""
+    template = session.get(StatusTemplate, template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    for field, value in template_data.dict(exclude_unset=True).items():
+        setattr(template, field, value)
+
+    template.updated_at = ksa_now()
+    bump_version(session, STATUS_LAYOUTS)
+    session.commit()
+    session.refresh(template)
+    return template
+
+@app.delete("/status-templates/{template_id}")
+def delete_status_template(template_id: int, session: Session = Depends(get_session)):
+    """Delete a status template and its columns"""
+    template = session.get(StatusTemplate, template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    # Foreign keys are not enforced: deleting a template in use would orphan its cards and boards.
+    # Trashed tasks count too, since a restore puts them back in their column
+    columns = select(StatusColumn.id).where(StatusColumn.template_id == template_id)
+    in_use = session.exec(select(or_(
+        select(Task.id).where(Task.column_id.in_(columns)).exists(),
+        select(Workflow.id).where(Workflow.status_template.in_([template.name, str(template_id)])).exists(),
+    ))).one()
+    if in_use:
+        raise HTTPException(status_code=409, detail="Template is used by a workflow or task")
+
+    session.exec(delete(StatusColumn).filter(StatusColumn.template_id == template_id))
+    session.delete(template)
+    bump_version(session, STATUS_LAYOUTS)
+    session.commit()
+    return {"message": "Template deleted successfully"}
+
 @app.get("/status-columns")
-def get_status_columns(template_id: Optional[int] = Query(None), session: Session = Depends(get_session)):
+def get_status_columns(request: Request, template_id: Optional[int] = Query(None), session: Session = Depends(get_session)):
     """Get Status Columns, Optionally filtered by status templates"""
-    query = select(StatusColumn)
+    version, layouts = status_layout_cache.get(session, STATUS_LAYOUTS, _load_status_layouts)
 
     if template_id:
-        query = query.where(StatusColumn.template_id == template_id)
-    return session.exec(query).all()
+        columns = [column for column in layouts["columns"] if column["template_id"] == template_id]
+        return _status_layout_response(request, version, json.dumps(columns).encode())
+    return _status_layout_response(request, version, layouts["all_columns"])
 
 @app.post("/status-columns")
 def create_status_columns(column_data: StatusColumnCreate, session: Session = Depends(get_session)):
     """Create a new status Column"""
     column = StatusColumn(**column_data.dict())
     session.add(column)
+    bump_version(session, STATUS_LAYOUTS)
     session.commit()
     session.refresh(column)
     return column
@@ -554,6 +1241,7 @@ def update_status_columns(column_id: int, column_data: StatusColumnCreate, sessi
     for field, value in column_data.dict(exclude_unset=True).items():
         setattr(column, field, value)
     
+    bump_version(session, STATUS_LAYOUTS)
     session.commit()
     session.refresh(column)
     return column
@@ -566,19 +1254,20 @@ def delete_status_columns(column_id: int, session: Session = Depends(get_session
         raise HTTPException(status_code=404, detail="column not found")
     
     session.delete(column)
+    bump_version(session, STATUS_LAYOUTS)
     session.commit()
     return {"Message": "Column deleted successfully"}
 
 @app.get("/activities", response_model=List[ActivityLog])
-def get_activities(
+async def get_activities(
     workspace_id: Optional[int] = Query(None),
     member_id: Optional[int] = Query(None),
     task_id: Optional[int] = Query(None),
     limit: int = Query(50, le=100),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Get activity logs with optional filters"""
-    query = select(ActivityLog)
+    query = activity_serializer.select()
     
     if workspace_id:
         query = query.where(ActivityLog.workspace_id == workspace_id)
@@ -590,7 +1279,7 @@ def get_activities(
         query = query.where(ActivityLog.task_id == task_id)
     
     query = query.order_by(ActivityLog.created_at).limit(limit)
-    return session.exec(query).all()
+    return FastJSONResponse(activity_serializer.from_rows((await session.exec(query)).all()))
 
 @app.post("/activities")
 def create_activities(activity_data: ActivityLogCreate, session: Session = Depends(get_session)):
@@ -621,6 +1310,7 @@ app.mount("/files", StaticFiles(directory=UPLOAD_DIR), name="files")
 
 @app.post("/api/messages")
 async def upload_message(
+    request: Request,
     task_id: int = Form(...),
     user_id: int = Form(...),
     workspace_id: int = Form(...),
@@ -628,14 +1318,16 @@ async def upload_message(
     attachment: UploadFile = File(None),
     session: Session = Depends(get_session)
 ):
+    await run_in_threadpool(require_access, request, "task", task_id)
     file_url = None
 
-    print("📥 Received upload message request:")
-    print("task_id:", task_id)
-    print("user_id:", user_id)
-    print("workspace_id:", workspace_id)
-    print("workflow_id:", workflow_id)
-    print("attachment:", attachment.filename if attachment else "None")
+    logger.debug("Upload message request", extra={
+        "task_id": task_id,
+        "user_id": user_id,
+        "workspace_id": workspace_id,
+        "workflow_id": workflow_id,
+        "attachment": attachment.filename if attachment else None
+    })
 
     if attachment:
         try:
@@ -668,8 +1360,8 @@ async def upload_message(
 
             file_url = f"/api/attachments/{attachment_record.id}/download"
 
-        except Exception as e:
-            print("❌ File save or DB error:", e)
+        except Exception:
+            logger.exception("Failed to save attachment", extra={"task_id": task_id})
             raise HTTPException(status_code=500, detail="Failed to save attachment")
 
     return JSONResponse({
@@ -678,13 +1370,26 @@ async def upload_message(
     })
 
 @app.get("/attachments", response_model=List[dict])
-def get_attachments(task_id: Optional[int] = Query(None), session: Session = Depends(get_session)):
+async def get_attachments(
+    request: Request,
+    response: Response,
+    task_id: Optional[int] = Query(None),
+    session: AsyncSession = Depends(get_async_session)
+):
     """Get attachment metadata: name, extension, size, and uploader name"""
+    etag = await collection_etag_async(
+        session, f"attachments-{task_id}",
+        func.count(Attachment.id), func.max(Attachment.id), func.max(Member.updated_at),
+        where=[Attachment.uploaded_by == Member.id] + ([Attachment.task_id == task_id] if task_id else [])
+    )
+    if cached := not_modified(request, response, etag):
+        return cached
+
     query = select(Attachment, Member).join(Member, Attachment.uploaded_by == Member.id)
     if task_id:
         query = query.where(Attachment.task_id == task_id)
 
-    results = session.exec(query).all()
+    results = (await session.exec(query)).all()
 
     response = []
     for attachment, member in results:
@@ -698,11 +1403,12 @@ def get_attachments(task_id: Optional[int] = Query(None), session: Session = Dep
 
     return response
 
-@app.post("/attachment", response_model=Attachment)
-def create_attachment(attachment_data: AttachmentCreate, created_by: int, session: Session = Depends(get_session)):
+@app.post("/attachment", response_model=Attachment, dependencies=[Depends(require_acting_self)])
+def create_attachment(attachment_data: AttachmentCreate, created_by: int, request: Request, session: Session = Depends(get_session)):
     """Create a new Attachment"""
+    require_access(request, "task", attachment_data.task_id)
     task = session.get(Task, attachment_data.task_id)
-    if not task:
+    if not task or task.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Task not found")
     
     attachment = Attachment(**attachment_data.dict(), uploaded_by=created_by)
@@ -734,10 +1440,12 @@ def update_attachment(attachment_id: int, attachment_data: WorkflowUpdate, sessi
 def delete_attachment(attachment_id: int, session: Session = Depends(get_session)):
     """Delete a Attachment"""
     attachment = session.get(Attachment, attachment_id)
-    if not Attachment:
+    if not attachment:
         raise HTTPException(status_code=404, detail="Attachment not found")
     
     session.delete(attachment)
+    invalidate(session, "attachment", attachment_id)
+    enqueue(session, "remove_files", {"paths": [attachment.file_path]})
     session.commit()
     return {"message": "Attachment deleted successfully"}
 
@@ -767,10 +1475,12 @@ MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
 @app.post("/member/profile-picture")
 async def upload_profile_picture(
+    request: Request,
     file: UploadFile = File(...),
     member_id: int = Form(...),
     session: Session = Depends(get_session)
 ):
+    check_self(request, member_id)
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file selected")
     
@@ -801,8 +1511,7 @@ async def upload_profile_picture(
         
         if current_member.profile_picture_filename:
             old_file_path = PROFILE_DIR / current_member.profile_picture_filename
-            if old_file_path.exists():
-                old_file_path.unlink()
+            enqueue(session, "remove_files", {"paths": [str(old_file_path)], "prune_dirs": False})
         
         current_member.profile_picture_url = f"/api/user/{member_id}/profile-picture"
         current_member.profile_picture_filename = unique_filename
@@ -869,9 +1578,11 @@ async def get_profile_picture_by_member_id(
 
 @app.delete("/member/profile-picture")
 async def delete_profile_picture(
+    request: Request,
     member_id: int = Form(...),
     session: Session = Depends(get_session)
 ):
+    check_self(request, member_id)
     current_member = session.exec(select(Member).where(Member.id == member_id)).first()
     if not current_member:
         raise HTTPException(status_code=404, detail="Member not found")
@@ -881,8 +1592,7 @@ async def delete_profile_picture(
     
     try:
         file_path = PROFILE_DIR / current_member.profile_picture_filename
-        if file_path.exists():
-            file_path.unlink()
+        enqueue(session, "remove_files", {"paths": [str(file_path)], "prune_dirs": False})
         
         current_member.profile_picture_url = None
         current_member.profile_picture_filename = None
@@ -947,7 +1657,7 @@ async def get_member_profile(
         "updated_at": member.updated_at
     }
 
-@app.post("/members/{member_id}/change-password")
+@app.post("/members/{member_id}/change-password", dependencies=[Depends(require_self)])
 def change_password(member_id: int, body: dict, session: Session = Depends(get_session)):
     member = session.get(Member, member_id)
     if not member:
@@ -970,5 +1680,36 @@ def change_password(member_id: int, body: dict, session: Session = Depends(get_s
 def root():
     return {"message": "Workspace Management API", "version": "1.0.0"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for this worker process"""
+    await sample_queue(async_engine)
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+@app.get("/jobs/{job_id}", response_model=Job)
+def get_job(job_id: int, session: Session = Depends(get_session)):
+    """Get the status of a background job"""
+    job = session.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/health/live", tags=["Health"])
+async def health_live():
+    """The process is up and serving requests"""
+    return {"status": "ok"}
+
+@app.get("/health/ready", tags=["Health"])
+async def health_ready(request: Request):
+    """Ready for traffic: not shutting down and the database answers"""
+    if request.app.state.draining:
+        raise HTTPException(status_code=503, detail="Shutting down")
+    try:
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+    except Exception:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready"}
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="localhost", port=8000, reload=True)
\ No newline at end of file
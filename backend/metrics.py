@@ -0,0 +1,224 @@
+"""
+Request-level performance metrics in the Prometheus text format.
+
+MetricsMiddleware times every request and records, per route template and
+method, a latency histogram, the response payload size and how many SQL
+statements the request ran and how long they took. The query numbers come
+from cursor-execute hooks installed with instrument_engine; the hooks add
+to a per-request QueryStats held in a context variable, which follows the
+request into threadpool workers and into the async engine's greenlets.
+
+Metrics live in process memory, so each worker of a multi-process server
+exposes its own series; scrape the workers individually or label them by pid.
+The job queue gauges are the exception: they are read from the job table on
+every scrape (jobs.sample_queue) and so agree across workers.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
+
+import anyio.to_thread
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.description, self.labelnames = name, description, labelnames
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Tuple = ()) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, labels: Tuple = (), value: float = 0):
+        with self._lock:
+            self._values[labels] = value
+
+    def replace(self, values: Dict[Tuple, float]):
+        """Set every series at once, dropping those missing from values"""
+        with self._lock:
+            self._values = dict(values)
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name, self.description, self.labelnames, self.buckets = name, description, labelnames, buckets
+        # labels -> [count per bucket (non-cumulative, +Inf last), sum]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        names = self.labelnames + ("le",)
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (bound,))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+ROUTE_LABELS = ("method", "route")
+
+request_latency = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte",
+    ROUTE_LABELS, LATENCY_BUCKETS
+)
+request_total = Counter("http_requests_total", "Requests by route and status", ROUTE_LABELS + ("status",))
+response_size = Histogram("http_response_size_bytes", "Response body bytes sent", ROUTE_LABELS, SIZE_BUCKETS)
+request_queries = Histogram(
+    "http_request_db_queries", "SQL statements executed per request", ROUTE_LABELS, QUERY_COUNT_BUCKETS
+)
+request_query_time = Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request", ROUTE_LABELS, LATENCY_BUCKETS
+)
+requests_in_flight = Gauge("http_requests_in_flight", "Requests currently being served")
+threadpool_size = Gauge("threadpool_size", "Threads available to sync routes and dependencies")
+threadpool_busy = Gauge("threadpool_busy_threads", "Threads currently running sync work")
+threadpool_waiting = Gauge("threadpool_queue_depth", "Sync calls waiting for a free thread")
+requests_rejected = Counter(
+    "http_requests_rejected_total", "Requests turned away by rate limiting or admission control", ("class", "reason")
+)
+job_queue_depth = Gauge("job_queue_depth", "Jobs waiting or running, read from the job table", ("kind", "status"))
+job_queue_lag = Gauge("job_queue_lag_seconds", "How long the oldest due job has been waiting", ("kind",))
+jobs_processed = Counter("jobs_processed_total", "Job attempts run by this process", ("kind", "outcome"))
+job_duration = Histogram("job_duration_seconds", "Time a job handler took", ("kind",), LATENCY_BUCKETS)
+
+REGISTRY = [
+    request_latency, request_total, response_size, request_queries, request_query_time,
+    requests_in_flight, threadpool_size, threadpool_busy, threadpool_waiting, requests_rejected,
+    job_queue_depth, job_queue_lag, jobs_processed, job_duration,
+]
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+
+
+def instrument_engine(engine):
+    """Count and time every statement run through engine (a sync Engine or an AsyncEngine.sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def sample_threadpool():
+    """Read the default AnyIO limiter; must run on the event loop"""
+    statistics = anyio.to_thread.current_default_thread_limiter().statistics()
+    threadpool_size.set((), statistics.total_tokens)
+    threadpool_busy.set((), statistics.borrowed_tokens)
+    threadpool_waiting.set((), statistics.tasks_waiting)
+
+
+def render_metrics() -> str:
+    sample_threadpool()
+    lines = [f"# pid {os.getpid()}"]
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        state = {"status": 500, "size": 0}
+        start = time.perf_counter()
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            requests_in_flight.inc(amount=-1)
+            current_query_stats.reset(token)
+            route = scope.get("route")
+            # Unmatched paths share one series so scanners cannot blow up the label space
+            labels = (scope["method"], route.path if route is not None else "unmatched")
+            request_latency.observe(labels, time.perf_counter() - start)
+            request_total.inc(labels + (state["status"],))
+            response_size.observe(labels, state["size"])
+            request_queries.observe(labels, stats.count)
+            request_query_time.observe(labels, stats.seconds)
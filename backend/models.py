@@ -1,14 +1,26 @@
 from sqlmodel import SQLModel, Field, Relationship, create_engine
+from sqlalchemy import Index, event, func, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import declared_attr
 from typing import Optional, List
 from datetime import datetime, date
 from enum import Enum
+import os
 import pytz
 
 
 
 def ksa_now():
     return datetime.now(pytz.timezone('Asia/Riyadh'))
-    
+
+
+class Versioned:
+    """Rows with an optimistic-concurrency version: every ORM UPDATE checks and bumps it"""
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
+
 
 class WorkspaceMemberLink(SQLModel, table=True):
     workspace_id: int = Field(foreign_key="workspace.id", primary_key=True)
@@ -24,17 +36,27 @@ class WorkflowMemberLink(SQLModel, table=True):
 
 
 class TaskMemberLink(SQLModel, table=True):
+    __table_args__ = (Index("ix_taskmemberlink_member_task", "member_id", "task_id"),)
+
     task_id: int = Field(foreign_key="task.id", primary_key=True)
     member_id: int = Field(foreign_key="member.id", primary_key=True)
     assigned_at: datetime = Field(default_factory=ksa_now)
 
 
-class Workspace(SQLModel, table=True):
+class TaskDependency(SQLModel, table=True):
+    predecessor_id: int = Field(foreign_key="task.id", primary_key=True)
+    successor_id: int = Field(foreign_key="task.id", primary_key=True, index=True)
+    lag_days: int = Field(default=0)
+    created_at: datetime = Field(default_factory=ksa_now)
+
+
+class Workspace(Versioned, SQLModel, table=True):
     id: Optional[int] = Field(primary_key=True)
 
     name: str = Field(max_length=255, index=True)
     created_at: datetime = Field(default_factory=ksa_now)
     updated_at: datetime = Field(default_factory=ksa_now)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     created_by: Optional[int] = Field(foreign_key="member.id")
 
     workflows: List["Workflow"] = Relationship(back_populates="workspace")
@@ -72,7 +94,7 @@ class Member(SQLModel, table=True):
     activity_logs: List["ActivityLog"] = Relationship(back_populates="member")
 
 
-class Workflow(SQLModel, table=True):
+class Workflow(Versioned, SQLModel, table=True):
     id: Optional[int] = Field(primary_key=True)
 
     name: str = Field(max_length=255, index=True)
@@ -83,6 +105,7 @@ class Workflow(SQLModel, table=True):
     status_template: str = Field(default="default", max_length=50)
     created_at: datetime = Field(default_factory=ksa_now)
     updated_at: datetime = Field(default_factory=ksa_now)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     created_by: Optional[int] = Field(foreign_key="member.id")
 
     workspace_id: int = Field(foreign_key="workspace.id")
@@ -93,7 +116,21 @@ class Workflow(SQLModel, table=True):
     creator: Optional[Member] = Relationship(back_populates="created_workflows")
 
 
-class Task(SQLModel, table=True):
+LIVE = text("deleted_at IS NULL")
+TRASHED = text("deleted_at IS NOT NULL")
+OPEN = text("completed_at IS NULL AND deleted_at IS NULL")
+
+
+class Task(Versioned, SQLModel, table=True):
+    # Partial indexes: reads must say deleted_at IS NULL (or IS NOT NULL for the trash) to use them
+    __table_args__ = (
+        # A column's cards in board order straight from the index
+        Index("ix_task_live_board", "workflow_id", "column_id", "rank", sqlite_where=LIVE, postgresql_where=LIVE),
+        Index("ix_task_trash", "deleted_at", sqlite_where=TRASHED, postgresql_where=TRASHED),
+        # Open tasks by due date, for the due-date reminder scan
+        Index("ix_task_open_due", "due_date", sqlite_where=OPEN, postgresql_where=OPEN),
+    )
+
     id: Optional[int] = Field(primary_key=True)
 
     title: str = Field(max_length=500, index=True)
@@ -108,11 +145,16 @@ class Task(SQLModel, table=True):
     timer_start_time: Optional[datetime] = None
     created_at: datetime = Field(default_factory=ksa_now)
     updated_at: datetime = Field(default_factory=ksa_now)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     completed_at: Optional[datetime] = None
+    # Set while the task is in the trash; trash.py purges it for good later
+    deleted_at: Optional[datetime] = None
 
     created_by: Optional[int] = Field(foreign_key="member.id")
     workflow_id: int = Field(foreign_key="workflow.id")
     column_id: int = Field(foreign_key="statuscolumn.id")
+    # Position within the column, see ranking.py; empty until the column is first rebalanced
+    rank: str = Field(default="", max_length=255, sa_column_kwargs={"server_default": text("''")})
     
     column: Optional["StatusColumn"] = Relationship(back_populates="tasks")
     workflow: Workflow = Relationship(back_populates="tasks")
@@ -124,13 +166,14 @@ class Task(SQLModel, table=True):
     activity_logs: List["ActivityLog"] = Relationship(back_populates="task")
 
 
-class Subtask(SQLModel, table=True):
+class Subtask(Versioned, SQLModel, table=True):
     id: Optional[int] = Field(primary_key=True)
     text: str = Field(max_length=500)
     completed: bool = Field(default=False)
 
     created_at: datetime = Field(default_factory=ksa_now)
     updated_at: datetime = Field(default_factory=ksa_now)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     completed_at: Optional[datetime] = None
 
     created_by: Optional[int] = Field(foreign_key="member.id")
@@ -191,6 +234,8 @@ class ActivityLog(SQLModel, table=True):
     entity_type: str = Field(max_length=50, index=True)
     entity_id: int = Field(index=True)
     description: Optional[str] = Field(max_length=1000)
+    old_value: Optional[str] = Field(default=None, max_length=255)
+    new_value: Optional[str] = Field(default=None, max_length=255)
     created_at: datetime = Field(default_factory=ksa_now)
 
     member_id: Optional[int] = Field(foreign_key="member.id")
@@ -217,11 +262,196 @@ class Attachment(SQLModel, table=True):
     task: Optional["Task"] = Relationship(back_populates="attachments")
 
 
-DATABASE_URL = "sqlite:///./workspaceflow.db"
-engine = create_engine(DATABASE_URL, echo=True)
+class WorkspaceColumnStats(SQLModel, table=True):
+    workspace_id: int = Field(foreign_key="workspace.id", primary_key=True)
+    column_id: int = Field(foreign_key="statuscolumn.id", primary_key=True)
+
+    task_count: int = Field(default=0)
+    open_count: int = Field(default=0)
+    estimated_hours: float = Field(default=0.0)
+    actual_hours: float = Field(default=0.0)
+
+
+class WorkspaceDueDateStats(SQLModel, table=True):
+    workspace_id: int = Field(foreign_key="workspace.id", primary_key=True)
+    due_date: date = Field(primary_key=True)
+
+    open_count: int = Field(default=0)
+
+
+class WorkspaceWeeklyCompletions(SQLModel, table=True):
+    workspace_id: int = Field(foreign_key="workspace.id", primary_key=True)
+    week_start: date = Field(primary_key=True)
+
+    completed_count: int = Field(default=0)
+
+
+class CacheVersion(SQLModel, table=True):
+    name: str = Field(max_length=100, primary_key=True)
+    version: int = Field(default=0)
+
+
+class MemberTaskCounter(SQLModel, table=True):
+    member_id: int = Field(foreign_key="member.id", primary_key=True)
+
+    open_tasks: int = Field(default=0)
+
+
+class WorkflowDailySnapshot(SQLModel, table=True):
+    workflow_id: int = Field(foreign_key="workflow.id", primary_key=True)
+    day: date = Field(primary_key=True)
+    column_id: int = Field(foreign_key="statuscolumn.id", primary_key=True)
+
+    task_count: int = Field(default=0)
+    open_count: int = Field(default=0)
+    subtasks_completed: int = Field(default=0)
+
+
+class IdempotencyKey(SQLModel, table=True):
+    # Digest of the caller, method, path and client-supplied key
+    key: bytes = Field(primary_key=True)
+    # Digest of the request body, to refuse a reused key with a different request
+    fingerprint: Optional[bytes] = None
+    # None while the first request is still running
+    status_code: Optional[int] = None
+    headers: Optional[str] = None
+    # zlib-compressed response body
+    body: Optional[bytes] = None
+    expires_at: int = Field(index=True)
+
+
+DUE_SOON = text("kind = 'due_soon'")
+
+
+class Notification(SQLModel, table=True):
+    __table_args__ = (
+        # A member's notifications newest first, read backwards off the index
+        Index("ix_notification_member", "member_id", "id"),
+        # One reminder per member, task and due date
+        Index("ix_notification_due", "member_id", "task_id", "due_date", unique=True,
+              sqlite_where=DUE_SOON, postgresql_where=DUE_SOON),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    member_id: int = Field(foreign_key="member.id")
+    # assigned, comment, mention or due_soon
+    kind: str = Field(max_length=20)
+    task_id: int = Field(foreign_key="task.id", index=True)
+    actor_id: Optional[int] = Field(default=None, foreign_key="member.id")
+    message_id: Optional[int] = Field(default=None, foreign_key="chatmessage.id")
+    due_date: Optional[date] = None
+    created_at: datetime = Field(default_factory=ksa_now)
+
+
+class NotificationCursor(SQLModel, table=True):
+    # Notifications of the member with an id up to last_read_id are read
+    member_id: int = Field(foreign_key="member.id", primary_key=True)
+    last_read_id: int = Field(default=0)
+
+
+QUEUED = text("status = 'queued'")
+
+
+class Job(SQLModel, table=True):
+    """A unit of deferred work for the jobs.py workers; times are epoch seconds"""
+    __table_args__ = (
+        # The next job to claim: highest priority, then longest waiting
+        Index("ix_job_ready", "status", text("priority DESC"), "run_at"),
+        # A dedupe key names at most one job waiting to run
+        Index("ix_job_dedupe", "dedupe_key", unique=True, sqlite_where=QUEUED, postgresql_where=QUEUED),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str = Field(max_length=100)
+    # JSON arguments of the handler
+    payload: str = Field(default="{}")
+    priority: int = Field(default=0)
+    dedupe_key: Optional[str] = Field(default=None, max_length=255)
+    # queued, running, done, failed or superseded
+    status: str = Field(default="queued", max_length=20)
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=5)
+    run_at: float
+    # A running job whose lease lapsed is requeued
+    locked_until: Optional[float] = None
+    last_error: Optional[str] = None
+    created_at: float
+    finished_at: Optional[float] = Field(default=None, index=True)
+
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./workspaceflow.db")
+
+# WAL lets readers in every worker process run alongside the single writer
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+)
+
+def configure_sqlite(engine):
+    """Apply SQLITE_PRAGMAS to every new connection of a SQLite engine"""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+def upsert(bind, model):
+    """insert(model) from bind's dialect, which has on_conflict_do_update and on_conflict_do_nothing"""
+    dialect = postgresql if bind.dialect.name == "postgresql" else sqlite
+    return dialect.insert(model)
+
+def greatest(bind, *values):
+    """The largest of values in one row: max() takes several arguments only on SQLite"""
+    return (func.max if bind.dialect.name == "sqlite" else func.greatest)(*values)
+
+def least(bind, *values):
+    return (func.min if bind.dialect.name == "sqlite" else func.least)(*values)
+
+# Set SQL_ECHO=1 to log every statement
+SQL_ECHO = os.environ.get("SQL_ECHO", "").lower() in ("1", "true", "yes")
+
+engine = create_engine(DATABASE_URL, echo=SQL_ECHO)
+configure_sqlite(engine)
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    upgrade_schema(engine)
+
+# Indexes a later definition replaced
+DROPPED_INDEXES = ("ix_task_workflow_column_rank",)
+
+def upgrade_schema(engine):
+    """Add columns and indexes introduced after an existing table was created"""
+    inspector = inspect(engine)
+
+    with engine.begin() as connection:
+        for name in DROPPED_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                elif not column.nullable:
+                    raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} without a server default")
+                connection.execute(text(ddl))
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
 
 def get_engine():
     return engine
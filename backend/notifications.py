@@ -0,0 +1,205 @@
+"""
+Per-member notifications: assignments, comments, mentions and due dates.
+
+Assignment, comment and mention notifications are written by the request
+that causes them, in its transaction: notify_assigned() from task creation
+and assignment, notify_message() from new chat messages. Comments go to the
+task's assignees, mentions (<@member_id> in the message) to the members
+named who belong to the task's workspace, and nobody is notified of their
+own action. Imports and bulk loads
+write no notifications.
+
+DueDateScanner looks every NOTIFY_DUE_SECONDS for open tasks due within
+NOTIFY_DUE_DAYS through the partial due-date index on open tasks, and gives
+each assignee one due_soon notification per task and due date. The unique
+index on (member_id, task_id, due_date) makes a repeated scan, or one from
+another worker process, a no-op; moving the due date earns a new reminder.
+
+Each member's read state is one NotificationCursor row: notifications with
+an id up to last_read_id are read. Listing is a keyset query over the
+(member_id, id) index, newest first, so a page costs the same however many
+old notifications a member has.
+"""
+import os
+import re
+import threading
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import func, insert, literal, select
+from sqlmodel import Session
+
+from logs import logger
+from models import (
+    ChatMessage, Notification, NotificationCursor, Task, TaskMemberLink, Workflow, WorkspaceMemberLink, greatest,
+    ksa_now, least, upsert
+)
+
+NOTIFY_DUE_DAYS = int(os.environ.get("NOTIFY_DUE_DAYS", "1"))
+NOTIFY_DUE_SECONDS = float(os.environ.get("NOTIFY_DUE_SECONDS", "900"))
+# Badge counts stop here ("99+")
+UNREAD_COUNT_CAP = 100
+EXCERPT_LENGTH = 140
+
+MENTION = re.compile(r"<@(\d+)>")
+
+
+def mentioned_ids(content: str) -> set:
+    return {int(member_id) for member_id in MENTION.findall(content or "")}
+
+
+def notify_assigned(session: Session, task_id: int, member_ids: Iterable[int], actor_id: Optional[int] = None):
+    """Tell newly assigned members; the caller commits"""
+    rows = [
+        {"member_id": member_id, "kind": "assigned", "task_id": task_id, "actor_id": actor_id, "created_at": ksa_now()}
+        for member_id in set(member_ids) if member_id != actor_id
+    ]
+    if rows:
+        session.exec(insert(Notification), params=rows)
+
+
+def notify_message(session: Session, message: ChatMessage):
+    """Notify mentioned members, and the other assignees of a comment; message must have its id"""
+    mentioned = mentioned_ids(message.content) - {message.author_id}
+    now = ksa_now()
+    notified = set()
+    if mentioned:
+        # Only members of the task's workspace: the notification shows the task title and an excerpt
+        workspace_id = (
+            select(Workflow.workspace_id)
+            .join(Task, Task.workflow_id == Workflow.id)
+            .where(Task.id == message.task_id)
+            .scalar_subquery()
+        )
+        notified = set(session.exec(insert(Notification).from_select(
+            ["member_id", "kind", "task_id", "actor_id", "message_id", "created_at"],
+            select(WorkspaceMemberLink.member_id, literal("mention"), literal(message.task_id),
+                   literal(message.author_id), literal(message.id), literal(now))
+            .where(WorkspaceMemberLink.workspace_id == workspace_id, WorkspaceMemberLink.member_id.in_(mentioned))
+        ).returning(Notification.member_id)).scalars())
+    # Assignees just notified of a mention get no comment notification as well
+    session.exec(insert(Notification).from_select(
+        ["member_id", "kind", "task_id", "actor_id", "message_id", "created_at"],
+        select(TaskMemberLink.member_id, literal("comment"), literal(message.task_id), literal(message.author_id),
+               literal(message.id), literal(now))
+        .where(TaskMemberLink.task_id == message.task_id,
+               TaskMemberLink.member_id.not_in(notified | {message.author_id}))
+    ))
+
+
+def notify_due(session: Session, today: Optional[date] = None, days: int = NOTIFY_DUE_DAYS) -> int:
+    """Add due_soon notifications for open tasks due from today to today + days; the number added"""
+    today = today or ksa_now().date()
+    statement = upsert(session.get_bind(), Notification).from_select(
+        ["member_id", "kind", "task_id", "due_date", "created_at"],
+        select(TaskMemberLink.member_id, literal("due_soon"), Task.id, Task.due_date, literal(ksa_now()))
+        .join(TaskMemberLink, TaskMemberLink.task_id == Task.id)
+        # Spelled like ix_task_open_due's predicate so the planner can use it
+        .where(Task.completed_at.is_(None), Task.deleted_at.is_(None),
+               Task.due_date.between(today, today + timedelta(days=days)))
+    ).on_conflict_do_nothing()
+    added = session.exec(statement).rowcount
+    session.commit()
+    return added
+
+
+def _last_read_id(member_id: int):
+    return func.coalesce(
+        select(NotificationCursor.last_read_id)
+        .where(NotificationCursor.member_id == member_id)
+        .scalar_subquery(),
+        0
+    )
+
+
+def member_notifications(session: Session, member_id: int, limit: int = 50, before_id: Optional[int] = None,
+                         unread_only: bool = False) -> dict:
+    """One page of a member's notifications, newest first, in one query"""
+    last_read = _last_read_id(member_id)
+    query = (
+        select(Notification, Task.title, func.substr(ChatMessage.content, 1, EXCERPT_LENGTH), last_read)
+        .join(Task, Task.id == Notification.task_id)
+        .outerjoin(ChatMessage, ChatMessage.id == Notification.message_id)
+        .where(Notification.member_id == member_id, Task.deleted_at.is_(None))
+    )
+    if before_id is not None:
+        query = query.where(Notification.id < before_id)
+    if unread_only:
+        query = query.where(Notification.id > last_read)
+
+    rows = session.exec(query.order_by(Notification.id.desc()).limit(limit + 1)).all()
+
+    if rows:
+        last_read_id = rows[0][3]
+    else:
+        cursor = session.get(NotificationCursor, member_id)
+        last_read_id = cursor.last_read_id if cursor else 0
+
+    page = rows[:limit]
+    return {
+        "member_id": member_id,
+        "last_read_id": last_read_id,
+        "notifications": [
+            {**notification.dict(), "task_title": title, "excerpt": excerpt,
+             "unread": notification.id > last_read_id}
+            for notification, title, excerpt, _ in page
+        ],
+        "next_before_id": page[-1][0].id if len(rows) > limit else None
+    }
+
+
+def unread_count(session: Session, member_id: int) -> int:
+    """Unread notifications of a member, as listed (none for trashed tasks), counted up to UNREAD_COUNT_CAP"""
+    unread = (
+        select(Notification.id)
+        .join(Task, Task.id == Notification.task_id)
+        .where(Notification.member_id == member_id, Notification.id > _last_read_id(member_id),
+               Task.deleted_at.is_(None))
+        .limit(UNREAD_COUNT_CAP)
+        .subquery()
+    )
+    return session.exec(select(func.count()).select_from(unread)).scalar_one()
+
+
+def mark_read(session: Session, member_id: int, up_to: Optional[int] = None) -> int:
+    """Move a member's read cursor forward to up_to, or to their newest notification; the new cursor"""
+    newest = (
+        select(func.coalesce(func.max(Notification.id), 0))
+        .where(Notification.member_id == member_id)
+        .scalar_subquery()
+    )
+    # Never past the newest notification: the cursor only moves forward, so it could not come back
+    bind = session.get_bind()
+    last_read = newest if up_to is None else least(bind, up_to, newest)
+    statement = upsert(bind, NotificationCursor).values(member_id=member_id, last_read_id=last_read)
+    statement = statement.on_conflict_do_update(
+        index_elements=[NotificationCursor.member_id],
+        set_={"last_read_id": greatest(bind, NotificationCursor.last_read_id, statement.excluded.last_read_id)},
+    ).returning(NotificationCursor.last_read_id)
+    last_read_id = session.exec(statement).scalar_one()
+    session.commit()
+    return last_read_id
+
+
+class DueDateScanner(threading.Thread):
+    """Add due-date reminders every interval seconds"""
+
+    def __init__(self, engine, interval: float = NOTIFY_DUE_SECONDS):
+        super().__init__(name="due-date-scanner", daemon=True)
+        self.engine, self.interval = engine, interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        # The first scan right away, so reminders do not wait a full interval after a restart
+        while not self.stopped.is_set():
+            try:
+                with Session(self.engine) as session:
+                    added = notify_due(session)
+                if added:
+                    logger.info("Due date reminders added", extra={"notifications": added})
+            except Exception:
+                logger.exception("Due date scan failed")
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
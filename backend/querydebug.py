@@ -0,0 +1,165 @@
+"""
+N+1 query detection for development and tests.
+
+With QUERY_DEBUG=1, QueryDebugMiddleware records every SQL statement a
+request runs, adds an X-Query-Count header and logs a warning listing each
+statement shape that ran QUERY_REPEAT_THRESHOLD or more times, with the
+lines of application code that issued it. A shape is the statement text
+with IN lists collapsed, so `WHERE member.id = ?` run once per row shows up
+as one shape with many executions.
+
+query_budget() gives tests and scripts the same record for a block of code
+and raises QueryBudgetExceeded when the block runs more statements than
+allowed:
+
+    with query_budget(3):
+        client.get("/chat-messages/1")
+
+With neither active the cursor hook returns after one context lookup.
+"""
+import os
+import re
+import sys
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from logs import logger
+
+try:
+    import greenlet
+except ImportError:
+    greenlet = None
+
+QUERY_DEBUG = os.environ.get("QUERY_DEBUG", "").lower() in ("1", "true", "yes")
+REPEAT_THRESHOLD = int(os.environ.get("QUERY_REPEAT_THRESHOLD", "3"))
+
+THIS_FILE = os.path.abspath(__file__)
+APP_DIR = os.path.dirname(THIS_FILE)
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    return _IN_LIST.sub("(?, ...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+def call_site() -> str:
+    """The innermost frame in application code, skipping SQLAlchemy and this module"""
+    frame = sys._getframe(2)
+    # The async engine runs statements in a child greenlet; the route's frames are
+    # on the parent greenlet, suspended where it switched into the child
+    current = greenlet.getcurrent() if greenlet is not None else None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR) and filename != THIS_FILE:
+            return f"{os.path.basename(filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+        if frame is None and current is not None and current.parent is not None:
+            current = current.parent
+            frame = current.gr_frame
+    return "<unknown>"
+
+
+class QueryLog:
+    def __init__(self):
+        self.count = 0
+        self.shapes: Dict[str, List[str]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, site: str):
+        with self._lock:
+            self.count += 1
+            self.shapes[statement_shape(statement)].append(site)
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD) -> List[Tuple[str, int, Dict[str, int]]]:
+        """(shape, executions, executions per call site) for shapes run at least threshold times"""
+        return sorted(
+            ((shape, len(sites), dict(Counter(sites))) for shape, sites in self.shapes.items() if len(sites) >= threshold),
+            key=lambda item: -item[1]
+        )
+
+    def report(self, threshold: int = REPEAT_THRESHOLD) -> str:
+        lines = [f"{self.count} statements"]
+        for shape, executions, sites in self.repeated(threshold):
+            lines.append(f"  {executions}x {shape}")
+            lines.extend(f"      {count}x from {site}" for site, count in sites.items())
+        return "\n".join(lines)
+
+
+current_query_log: ContextVar[Optional[QueryLog]] = ContextVar("current_query_log", default=None)
+_budgets: List[QueryLog] = []
+_budgets_lock = threading.Lock()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    log = current_query_log.get()
+    if log is None and not _budgets:
+        return
+    site = call_site()
+    if log is not None:
+        log.record(statement, site)
+    for budget in list(_budgets):
+        budget.record(statement, site)
+
+
+def watch_engine(engine):
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries: int, label: str = "block"):
+    """Raise QueryBudgetExceeded if the block runs more than max_queries statements, on any thread"""
+    log = QueryLog()
+    with _budgets_lock:
+        _budgets.append(log)
+    try:
+        yield log
+    finally:
+        with _budgets_lock:
+            _budgets.remove(log)
+    if log.count > max_queries:
+        raise QueryBudgetExceeded(f"{label} ran {log.count} queries, budget is {max_queries}\n{log.report(2)}")
+
+
+class QueryDebugMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        log = QueryLog()
+        token = current_query_log.set(log)
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message["headers"])["X-Query-Count"] = str(log.count)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            current_query_log.reset(token)
+            repeated = log.repeated()
+            if repeated:
+                logger.warning("Repeated query shapes", extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "queries": log.count,
+                    "repeated": [
+                        {"statement": shape, "executions": executions, "call_sites": sites}
+                        for shape, executions, sites in repeated
+                    ]
+                })
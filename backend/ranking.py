@@ -0,0 +1,286 @@
+"""
+Persisted card order within a kanban column.
+
+Each task carries a rank, a key over the digits 0-9A-Za-z read as a base-62
+fraction, and a column lists its tasks ORDER BY rank. Those digits sort in
+byte order, which is SQLite's default collation, so the partial
+(workflow_id, column_id, rank) index of live tasks hands a board back
+already sorted. Trashed tasks keep their rank for a restore but are left
+out of every ordering here.
+
+Moving a card computes a key strictly between its new neighbours' keys with
+key_between(), so a move is one single-row UPDATE however long the column
+is. A new task, or a column change without neighbours, appends the card
+with append_rank() inside its INSERT or UPDATE. Keys never end in "0", which leaves room in front of every key, and
+repeated inserts into the same gap make them one digit longer each time.
+
+Once a key grows past RANK_MAX_LENGTH, the column is queued for
+RankRebalancer, which rewrites its keys evenly spaced at the shortest
+length that fits (spread_keys()). The thread also sweeps every
+RANK_REBALANCE_SECONDS for columns with overlong keys or ties, such as the
+empty ranks of tasks created before ranks existed. Rebalancing bumps each
+row's version, as any other write does, so cached ETags stay honest.
+"""
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, case, func, select, update
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+
+from logs import logger
+from models import Task
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+# The first key of an empty column, key_between(None, None)
+MIDDLE_DIGIT = DIGITS[BASE // 2]
+RANK_MAX_LENGTH = int(os.environ.get("RANK_MAX_LENGTH", "12"))
+RANK_REBALANCE_SECONDS = float(os.environ.get("RANK_REBALANCE_SECONDS", "600"))
+
+_pending: Set[Tuple[int, int]] = set()
+_pending_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+class RankConflict(Exception):
+    """The neighbours of a move are no longer in order, e.g. after a concurrent move"""
+
+
+def valid_key(key: str) -> bool:
+    return bool(key) and key[-1] != "0" and all(digit in DIGITS for digit in key)
+
+
+def key_between(before: Optional[str], after: Optional[str]) -> str:
+    """A key sorting strictly between before and after; None stands for the start or end of the column
+
+    Raises ValueError unless both are valid keys with before < after.
+    """
+    for key in (before, after):
+        if key is not None and not valid_key(key):
+            raise ValueError(f"Invalid rank {key!r}")
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f"Rank {before!r} does not sort before {after!r}")
+    return _midpoint(before or "", after)
+
+
+def _midpoint(low: str, high: Optional[str]) -> str:
+    # low < high as base-62 fractions, high None meaning 1
+    if high is not None:
+        shared = 0
+        while shared < len(high) and (low[shared] if shared < len(low) else "0") == high[shared]:
+            shared += 1
+        if shared:
+            return high[:shared] + _midpoint(low[shared:], high[shared:])
+
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high else BASE
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit) // 2]
+    # Neighbouring first digits: high's first digit alone already sorts below high
+    if high is not None and len(high) > 1:
+        return high[0]
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+
+# Building the expression costs more than running it; keep one per target column
+@lru_cache(maxsize=1024)
+def append_rank(column_id: int, workflow_id: Optional[int] = None):
+    """SQL for a key after the last one in column_id of workflow_id, by default the updated task's workflow
+
+    The last digit goes up by one, and a final "z" gets MIDDLE_DIGIT appended,
+    so a column that only grows at the bottom gains a key digit every 30 or
+    so appends, rather than every 6 with key_between(last, None). The digit
+    arithmetic uses SQLite's instr().
+    """
+    table = Task.__table__
+    last = table.alias("last_task")
+    workflow = table.c.workflow_id if workflow_id is None else workflow_id
+    column = (
+        select(func.coalesce(func.max(last.c.rank), "").label("rank"))
+        .where(last.c.workflow_id == workflow, last.c.column_id == column_id, last.c.deleted_at.is_(None))
+        .correlate(table)
+        .subquery("last_rank")
+    )
+    last_rank = column.c.rank
+    last_digit = func.substr(last_rank, func.length(last_rank), 1)
+    # instr() and substr() are 1-based, so this is the digit after last_digit
+    next_digit = func.substr(DIGITS, func.instr(DIGITS, last_digit) + 1, 1)
+    return select(case(
+        (last_rank == "", MIDDLE_DIGIT),
+        (last_digit == DIGITS[-1], last_rank.concat(MIDDLE_DIGIT)),
+        else_=func.substr(last_rank, 1, func.length(last_rank) - 1).concat(next_digit),
+    )).scalar_subquery()
+
+
+def place_between(session: Session, task_id: int, column_id: Optional[int],
+                  after_id: Optional[int], before_id: Optional[int]) -> str:
+    """The rank of task_id dropped below after_id and above before_id
+
+    The neighbours must be other tasks of the target column: column_id, or
+    the task's own column when None. One read of the three rows; raises
+    LookupError for a missing task, ValueError for a neighbour elsewhere and
+    RankConflict when the neighbours are not in order.
+    """
+    ids = {task_id, after_id, before_id} - {None}
+    rows = {row.id: row for row in session.exec(
+        select(Task.id, Task.workflow_id, Task.column_id, Task.rank)
+        .where(Task.id.in_(ids), Task.deleted_at.is_(None))
+    )}
+    if task_id not in rows:
+        raise LookupError(f"Task {task_id} not found")
+    task = rows[task_id]
+    target = task.column_id if column_id is None else column_id
+
+    neighbours = []
+    for neighbour_id in (after_id, before_id):
+        if neighbour_id is None:
+            neighbours.append(None)
+            continue
+        if neighbour_id not in rows:
+            raise LookupError(f"Task {neighbour_id} not found")
+        neighbour = rows[neighbour_id]
+        if neighbour_id == task_id or neighbour.workflow_id != task.workflow_id or neighbour.column_id != target:
+            raise ValueError(f"Task {neighbour_id} is not another task of the target column")
+        neighbours.append(neighbour.rank)
+
+    try:
+        return key_between(*neighbours)
+    except ValueError:
+        # Tied or unranked neighbours are fixed by a rebalance; the client retries with the new order
+        request_rebalance(task.workflow_id, target)
+        raise RankConflict("The neighbouring tasks are no longer in this order; reload the column")
+
+
+def spread_keys(count: int) -> List[str]:
+    """count ascending keys, evenly spaced at the shortest length that fits them"""
+    length = 1
+    while BASE ** length <= count:
+        length += 1
+    keys = []
+    for index in range(1, count + 1):
+        value = index * BASE ** length // (count + 1)
+        digits = []
+        for _ in range(length):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        keys.append("".join(reversed(digits)).rstrip("0"))
+    return keys
+
+
+def nth_key(index: int, width: int = 4) -> str:
+    """The index-th of ascending keys of width + 1 digits, for loaders that write a column in order"""
+    digits = []
+    for _ in range(width):
+        index, digit = divmod(index, BASE)
+        digits.append(DIGITS[digit])
+    if index:
+        raise ValueError(f"More than {BASE ** width} keys need a wider width")
+    return "".join(reversed(digits)) + MIDDLE_DIGIT
+
+
+def rebalance_column(session: Session, workflow_id: int, column_id: int) -> int:
+    """Rewrite the ranks of one column evenly spaced, keeping its order; the number of tasks
+
+    The read and the rewrite share one write transaction, so no insert or
+    move lands in between; call it first thing in a fresh session.
+    """
+    if session.get_bind().dialect.name == "sqlite":
+        # pysqlite only begins before the UPDATE, leaving the read outside the transaction
+        session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+    task_ids = session.exec(
+        select(Task.id)
+        .where(Task.workflow_id == workflow_id, Task.column_id == column_id, Task.deleted_at.is_(None))
+        .order_by(Task.rank, Task.id)
+        .with_for_update()
+    ).scalars().all()
+    if not task_ids:
+        return 0
+    table = Task.__table__
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("task_id"))
+        .values(rank=bindparam("new_rank"), version=table.c.version + 1)
+    )
+    session.exec(statement, params=[
+        {"task_id": task_id, "new_rank": rank} for task_id, rank in zip(task_ids, spread_keys(len(task_ids)))
+    ])
+    return len(task_ids)
+
+
+def columns_to_rebalance(session: Session) -> List[Tuple[int, int]]:
+    """(workflow_id, column_id) of columns with a key over RANK_MAX_LENGTH, an empty key or two equal keys"""
+    return [tuple(row) for row in session.exec(
+        select(Task.workflow_id, Task.column_id)
+        .where(Task.deleted_at.is_(None))
+        .group_by(Task.workflow_id, Task.column_id)
+        .having(
+            (func.max(func.length(Task.rank)) > RANK_MAX_LENGTH)
+            | (func.min(Task.rank) == "")
+            | (func.count() > func.count(Task.rank.distinct()))
+        )
+    ).all()]
+
+
+def request_rebalance(workflow_id: int, column_id: int):
+    """Queue a column for the next RankRebalancer pass"""
+    with _pending_lock:
+        _pending.add((workflow_id, column_id))
+    _wakeup.set()
+
+
+def _take_pending() -> Set[Tuple[int, int]]:
+    # Cleared first, so a column queued while this runs wakes the next wait
+    _wakeup.clear()
+    with _pending_lock:
+        columns = set(_pending)
+        _pending.clear()
+    return columns
+
+
+class RankRebalancer(threading.Thread):
+    """Rebalance queued columns as they come in, and every interval seconds whatever needs it"""
+
+    def __init__(self, engine, interval: float = RANK_REBALANCE_SECONDS):
+        super().__init__(name="rank-rebalancer", daemon=True)
+        self.engine, self.interval = engine, interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        next_sweep = time.monotonic() if self.interval > 0 else None
+        while not self.stopped.is_set():
+            columns = _take_pending()
+            try:
+                if next_sweep is not None and time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + self.interval
+                    with Session(self.engine) as session:
+                        columns.update(columns_to_rebalance(session))
+                self.rebalance(columns)
+            except Exception:
+                logger.exception("Rank rebalancing failed")
+            # Queued columns wake the thread before the next sweep is due
+            _wakeup.wait(None if next_sweep is None else max(0.0, next_sweep - time.monotonic()))
+
+    def rebalance(self, columns: Iterable[Tuple[int, int]]):
+        for workflow_id, column_id in columns:
+            if self.stopped.is_set():
+                return
+            # One short transaction per column, so writers wait for at most one column
+            try:
+                with Session(self.engine) as session:
+                    count = rebalance_column(session, workflow_id, column_id)
+                    session.commit()
+            except OperationalError:
+                # Busy database; the next sweep finds the column again
+                logger.warning("Rank rebalancing deferred",
+                               extra={"workflow_id": workflow_id, "column_id": column_id})
+                continue
+            logger.info("Ranks rebalanced",
+                        extra={"workflow_id": workflow_id, "column_id": column_id, "tasks": count})
+
+    def stop(self):
+        self.stopped.set()
+        _wakeup.set()
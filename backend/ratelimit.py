@@ -0,0 +1,193 @@
+"""
+Per-client rate limiting and admission control for expensive routes.
+
+RateLimitMiddleware sorts each request into a route class (auth, reads,
+writes, uploads) and charges it to a token bucket keyed by the class and
+the caller: the member id from a valid bearer token, otherwise the client
+address. A request that finds its bucket empty gets 429 with Retry-After
+set to when the next token is due. Buckets live in one LRU map capped at
+RATE_LIMIT_MAX_KEYS; the least recently seen caller is evicted first and
+simply starts over with a full bucket.
+
+Uploads, imports, exports and analytics rebuilds also take a slot from one
+AdmissionLimit of ADMISSION_LIMIT concurrent requests. Up to ADMISSION_QUEUE
+more wait at most ADMISSION_TIMEOUT seconds for a slot; anything beyond
+that gets 503 with Retry-After straight away, so a burst of heavy requests
+cannot pile up in the threadpool behind everyone else's reads.
+
+Limits are per worker process, like the metrics. Set RATE_LIMIT=0 to turn
+the buckets off (the benchmark scripts do), ADMISSION_LIMIT=0 for the cap.
+"""
+import asyncio
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from metrics import requests_rejected
+from serializers import dumps
+
+RATE_LIMIT = os.environ.get("RATE_LIMIT", "1") != "0"
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "10000"))
+ADMISSION_LIMIT = int(os.environ.get("ADMISSION_LIMIT", "8"))
+ADMISSION_QUEUE = int(os.environ.get("ADMISSION_QUEUE", "32"))
+ADMISSION_TIMEOUT = float(os.environ.get("ADMISSION_TIMEOUT", "5"))
+
+# Route class -> (requests, per seconds); the burst is the full request count
+DEFAULT_LIMITS = {
+    "auth": (10, 60),
+    "reads": (200, 10),
+    "writes": (60, 10),
+    "uploads": (20, 60),
+}
+
+EXEMPT_PATHS = re.compile(r"^/(metrics|health/.*)?$")
+AUTH_PATHS = re.compile(r"^/(login|signup|token|members/\d+/change-password)$")
+UPLOAD_PATHS = re.compile(r"^/(api/messages|attachment|member/profile-picture|workspaces/import)$")
+EXPENSIVE_PATHS = re.compile(r"^/workspaces/\d+/(export|analytics/rebuild)$")
+
+
+def limits_from_env() -> Dict[str, Tuple[int, float]]:
+    """DEFAULT_LIMITS with RATE_LIMIT_<CLASS>=requests/seconds overrides"""
+    limits = dict(DEFAULT_LIMITS)
+    for name in limits:
+        value = os.environ.get(f"RATE_LIMIT_{name.upper()}")
+        if value:
+            requests, seconds = value.split("/")
+            limits[name] = (int(requests), float(seconds))
+    return limits
+
+
+def classify(method: str, path: str) -> Tuple[Optional[str], bool]:
+    """(route class or None when exempt, whether the request needs an admission slot)"""
+    if EXEMPT_PATHS.match(path):
+        return None, False
+    if AUTH_PATHS.match(path):
+        return "auth", False
+    if method in ("GET", "HEAD", "OPTIONS"):
+        return "reads", bool(EXPENSIVE_PATHS.match(path))
+    if method == "POST" and UPLOAD_PATHS.match(path):
+        return "uploads", True
+    return "writes", bool(EXPENSIVE_PATHS.match(path))
+
+
+class RateLimiter:
+    """Token buckets per (route class, caller) in an LRU map of at most max_keys entries"""
+
+    def __init__(self, limits: Dict[str, Tuple[int, float]], max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.limits = {name: (requests, requests / seconds) for name, (requests, seconds) in limits.items()}
+        self.max_keys = max_keys
+        # (class, caller) -> [tokens, monotonic time of the last refill]
+        self.buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+
+    def acquire(self, route_class: str, caller: str, now: Optional[float] = None) -> float:
+        """Take a token; 0 when allowed, otherwise the seconds until one is available"""
+        burst, rate = self.limits[route_class]
+        now = time.monotonic() if now is None else now
+        key = (route_class, caller)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_keys:
+                self.buckets.popitem(last=False)
+            bucket = self.buckets[key] = [burst, now]
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / rate
+
+
+class AdmissionLimit:
+    """At most limit requests at once, queue more waiting up to timeout seconds, reject the rest"""
+
+    def __init__(self, limit: int = ADMISSION_LIMIT, queue: int = ADMISSION_QUEUE, timeout: float = ADMISSION_TIMEOUT):
+        self.limit, self.queue, self.timeout = limit, queue, timeout
+        self.active = self.waiting = 0
+        self._semaphore = None
+
+    async def acquire(self) -> bool:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if self._semaphore.locked() and self.waiting >= self.queue:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+
+def client_address(scope) -> str:
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:unknown"
+
+
+class RateLimitMiddleware:
+    def __init__(
+        self, app, identify: Optional[Callable[[dict], Optional[str]]] = None,
+        limiter: Optional[RateLimiter] = None, admission: Optional[AdmissionLimit] = None
+    ):
+        self.app = app
+        # identify(scope) -> caller key, or None to fall back on the client address
+        self.identify = identify
+        self.limiter = limiter if limiter is not None else (RateLimiter(limits_from_env()) if RATE_LIMIT else None)
+        self.admission = admission if admission is not None else (AdmissionLimit() if ADMISSION_LIMIT > 0 else None)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route_class, expensive = classify(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        if self.limiter is not None:
+            caller = (self.identify(scope) if self.identify else None) or client_address(scope)
+            wait = self.limiter.acquire(route_class, caller)
+            if wait:
+                requests_rejected.inc((route_class, "rate_limited"))
+                await self._reject(send, 429, "Too many requests", wait)
+                return
+
+        if not expensive or self.admission is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.admission.acquire():
+            requests_rejected.inc((route_class, "overloaded"))
+            await self._reject(send, 503, "Server busy, retry later", 1)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release()
+
+    @staticmethod
+    async def _reject(send, status: int, detail: str, retry_after: float):
+        body = dumps({"detail": detail})
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
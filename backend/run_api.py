@@ -1,24 +1,146 @@
 #!/usr/bin/env python3
 """
 Simple script to run the FastAPI application
+
+    python run_api.py                        development server with auto-reload
+    python run_api.py --prod                 one worker per core, no reload
+    python run_api.py --prod --workers 8
+    python run_api.py --prod --job-workers 0 no background jobs in the API workers
+    python run_api.py --jobs                 background jobs only, next to them
+
+In production mode the app is imported once in a gunicorn master, so schema
+upgrades and trigger installation run once, and workers are forked from it.
+Without gunicorn installed it falls back to uvicorn's own process manager,
+which imports the app in every worker instead.
+
+Every API process runs --job-workers background job threads (see jobs.py).
+With several API workers, or to keep job work off the request path, run
+them with --job-workers 0 and start one --jobs process next to them.
 """
+import argparse
+import importlib.util
+import os
+
 import uvicorn
 from models import create_db_and_tables
 
-if __name__ == "__main__":
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+if importlib.util.find_spec("uvicorn_worker") is not None:
+    WORKER_CLASS = "uvicorn_worker.UvicornWorker"
+else:
+    WORKER_CLASS = "uvicorn.workers.UvicornWorker"
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def post_fork(server, worker):
+    # Connections opened in the master while preloading must not be shared across processes
+    import main
+    import models
+    main.engine.dispose(close=False)
+    main.async_engine.sync_engine.dispose(close=False)
+    models.engine.dispose(close=False)
+
+
+if BaseApplication is not None:
+    class PreloadedApplication(BaseApplication):
+        def __init__(self, options: dict):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import app
+            return app
+
+
+def run_production(args):
+    # Read by main at import, before the master preloads the app
+    os.environ["SHUTDOWN_DRAIN_SECONDS"] = str(args.drain_seconds)
+
+    if BaseApplication is None:
+        print(f"gunicorn not installed; starting {args.workers} uvicorn workers without preloading")
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            timeout_graceful_shutdown=args.graceful_timeout,
+            log_level="info",
+            access_log=False
+        )
+        return
+
+    PreloadedApplication({
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": WORKER_CLASS,
+        "preload_app": True,
+        "post_fork": post_fork,
+        "graceful_timeout": args.graceful_timeout,
+        "timeout": args.timeout,
+        "keepalive": 5,
+        "loglevel": "info",
+    }).run()
+
+
+def run_jobs(args):
+    create_db_and_tables()
+    # Importing the app registers every job handler
+    import main
+    from jobs import run_workers
+    run_workers(main.engine, args.job_workers)
+
+
+def run_development(args):
     # Ensure database tables exist
     create_db_and_tables()
     print("Database tables created/verified ✓")
-    
+
     # Run the FastAPI application
     print("Starting FastAPI server...")
-    print("API Documentation: http://localhost:8000/docs")
-    print("Alternative docs: http://localhost:8000/redoc")
-    
+    print(f"API Documentation: http://localhost:{args.port}/docs")
+    print(f"Alternative docs: http://localhost:{args.port}/redoc")
+
     uvicorn.run(
-        "main:app", 
-        host="0.0.0.0", 
-        port=8000, 
+        "main:app",
+        host=args.host,
+        port=args.port,
         reload=True,
         log_level="info"
-    )
\ No newline at end of file
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Workspace Management API")
+    parser.add_argument("--prod", action="store_true", help="multi-worker server without reload")
+    parser.add_argument("--jobs", action="store_true", help="run background job workers only, no server")
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="seconds to let in-flight requests finish after SIGTERM")
+    parser.add_argument("--drain-seconds", type=float, default=0,
+                        help="seconds /health/ready reports 503 after SIGTERM before connections stop being accepted")
+    parser.add_argument("--timeout", type=int, default=60, help="seconds before a silent worker is restarted")
+    parser.add_argument("--job-workers", type=int, default=int(os.environ.get("JOB_WORKERS", "2")),
+                        help="background job threads per process (0 for none in the API processes)")
+    args = parser.parse_args()
+    # Read by jobs at import, in this process and every server process it starts
+    os.environ["JOB_WORKERS"] = str(args.job_workers)
+
+    if args.jobs:
+        run_jobs(args)
+    elif args.prod:
+        run_production(args)
+    else:
+        run_development(args)
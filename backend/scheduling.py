@@ -0,0 +1,294 @@
+"""
+Critical-path scheduling for the Gantt view.
+
+Each workflow's dependency graph is topologically sorted once and kept in
+memory with its earliest/latest start and finish days. Days are stored as
+date ordinals; a task occupies [start, finish) so its last day is finish - 1.
+
+When a single task's dates or estimate change, only the tasks downstream of
+it are pushed forward again, and only its ancestors are pulled back, unless
+the move changed the project's start or end - then the affected pass is
+redone for the whole graph.
+
+Each cached schedule is tagged with its workflow's schedule:<id>
+CacheVersion row. Writes to tasks or dependencies bump the row in their
+transaction, and a read reloads a schedule whose tag is behind, so every
+worker process sees changes made through any other. The process making a
+date change updates its own copy in place instead, provided that copy had
+seen every earlier change.
+"""
+import heapq
+import math
+import threading
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from cache import bump_version, current_version
+from models import Task, TaskDependency, ksa_now
+
+HOURS_PER_DAY = 8
+VERSION_PREFIX = "schedule:"
+
+
+class CycleError(ValueError):
+    def __init__(self, task_ids: Iterable[int]):
+        self.task_ids = sorted(task_ids)
+        super().__init__(f"Dependency cycle between tasks {self.task_ids}")
+
+
+def task_duration(start_date: Optional[date], end_date: Optional[date], estimated_hours: Optional[float]) -> int:
+    """Length of a task in whole days"""
+    if start_date and end_date:
+        return max((end_date - start_date).days + 1, 1)
+    if estimated_hours:
+        return max(math.ceil(estimated_hours / HOURS_PER_DAY), 1)
+    return 1
+
+
+class WorkflowSchedule:
+    def __init__(self, workflow_id: int):
+        self.workflow_id = workflow_id
+        # The schedule:<id> CacheVersion this schedule was loaded or updated at
+        self.version = 0
+        self.duration: Dict[int, int] = {}
+        self.not_before: Dict[int, Optional[int]] = {}
+        self.successors: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+        self.predecessors: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+
+        self.order: List[int] = []
+        self.position: Dict[int, int] = {}
+        self.es: Dict[int, int] = {}
+        self.ef: Dict[int, int] = {}
+        self.ls: Dict[int, int] = {}
+        self.lf: Dict[int, int] = {}
+        self.project_start = 0
+        self.project_end = 0
+
+    def set_task(self, task_id: int, start_date, end_date, estimated_hours):
+        self.duration[task_id] = task_duration(start_date, end_date, estimated_hours)
+        self.not_before[task_id] = start_date.toordinal() if start_date else None
+
+    def add_edge(self, predecessor_id: int, successor_id: int, lag_days: int = 0):
+        self.successors[predecessor_id].append((successor_id, lag_days))
+        self.predecessors[successor_id].append((predecessor_id, lag_days))
+
+    def reaches(self, source: int, target: int) -> bool:
+        """True if target is downstream of source"""
+        stack, seen = [source], {source}
+        while stack:
+            node = stack.pop()
+            if node == target:
+                return True
+            for successor, _ in self.successors.get(node, ()):
+                if successor not in seen:
+                    seen.add(successor)
+                    stack.append(successor)
+        return False
+
+    def _sort(self):
+        indegree = {task_id: 0 for task_id in self.duration}
+        for task_id in self.duration:
+            for successor, _ in self.successors.get(task_id, ()):
+                indegree[successor] += 1
+
+        ready = [task_id for task_id, degree in indegree.items() if degree == 0]
+        order = []
+        while ready:
+            task_id = ready.pop()
+            order.append(task_id)
+            for successor, _ in self.successors.get(task_id, ()):
+                indegree[successor] -= 1
+                if indegree[successor] == 0:
+                    ready.append(successor)
+
+        if len(order) < len(indegree):
+            raise CycleError(task_id for task_id, degree in indegree.items() if degree > 0)
+
+        self.order = order
+        self.position = {task_id: index for index, task_id in enumerate(order)}
+
+    def _compute_project_start(self) -> int:
+        starts = [day for day in self.not_before.values() if day is not None]
+        return min(starts) if starts else ksa_now().date().toordinal()
+
+    def _forward(self, task_id: int) -> bool:
+        start = self.not_before[task_id]
+        if start is None:
+            start = self.project_start
+        for predecessor, lag in self.predecessors.get(task_id, ()):
+            start = max(start, self.ef[predecessor] + lag)
+
+        changed = self.es.get(task_id) != start or self.ef.get(task_id) != start + self.duration[task_id]
+        self.es[task_id] = start
+        self.ef[task_id] = start + self.duration[task_id]
+        return changed
+
+    def _backward(self, task_id: int) -> bool:
+        finish = self.project_end
+        for successor, lag in self.successors.get(task_id, ()):
+            finish = min(finish, self.ls[successor] - lag)
+
+        changed = self.lf.get(task_id) != finish or self.ls.get(task_id) != finish - self.duration[task_id]
+        self.lf[task_id] = finish
+        self.ls[task_id] = finish - self.duration[task_id]
+        return changed
+
+    def compute(self):
+        """Full topological sort plus forward and backward passes"""
+        self._sort()
+        self.project_start = self._compute_project_start()
+        for task_id in self.order:
+            self._forward(task_id)
+        self.project_end = max(self.ef.values(), default=self.project_start)
+        for task_id in reversed(self.order):
+            self._backward(task_id)
+
+    def reschedule(self, task_id: int, start_date, end_date, estimated_hours):
+        """Apply a date change of one task, touching only the affected subgraph"""
+        self.set_task(task_id, start_date, end_date, estimated_hours)
+
+        project_start = self._compute_project_start()
+        if project_start != self.project_start:
+            self.compute()
+            return
+
+        pending = [self.position[task_id]]
+        queued = {task_id}
+        while pending:
+            node = self.order[heapq.heappop(pending)]
+            if self._forward(node) or node == task_id:
+                for successor, _ in self.successors.get(node, ()):
+                    if successor not in queued:
+                        queued.add(successor)
+                        heapq.heappush(pending, self.position[successor])
+
+        project_end = max(self.ef.values(), default=self.project_start)
+        if project_end != self.project_end:
+            self.project_end = project_end
+            for node in reversed(self.order):
+                self._backward(node)
+            return
+
+        pending = [-self.position[task_id]]
+        queued = {task_id}
+        while pending:
+            node = self.order[-heapq.heappop(pending)]
+            if self._backward(node) or node == task_id:
+                for predecessor, _ in self.predecessors.get(node, ()):
+                    if predecessor not in queued:
+                        queued.add(predecessor)
+                        heapq.heappush(pending, -self.position[predecessor])
+
+    def slack(self, task_id: int) -> int:
+        return self.ls[task_id] - self.es[task_id]
+
+
+_schedules: Dict[int, WorkflowSchedule] = {}
+_lock = threading.Lock()
+
+
+def load_schedule(session: Session, workflow_id: int) -> WorkflowSchedule:
+    schedule = WorkflowSchedule(workflow_id)
+
+    tasks = session.exec(
+        select(Task.id, Task.start_date, Task.end_date, Task.estimated_hours)
+        .where(Task.workflow_id == workflow_id, Task.deleted_at.is_(None))
+    ).all()
+    for task_id, start_date, end_date, estimated_hours in tasks:
+        schedule.set_task(task_id, start_date, end_date, estimated_hours)
+
+    edges = session.exec(
+        select(TaskDependency.predecessor_id, TaskDependency.successor_id, TaskDependency.lag_days)
+        .join(Task, TaskDependency.successor_id == Task.id)
+        .where(Task.workflow_id == workflow_id)
+    ).all()
+    for predecessor_id, successor_id, lag_days in edges:
+        # Both ends must be live: an edge to a trashed task stays in the table until it is restored
+        if predecessor_id in schedule.duration and successor_id in schedule.duration:
+            schedule.add_edge(predecessor_id, successor_id, lag_days)
+
+    schedule.compute()
+    return schedule
+
+
+def get_schedule(session: Session, workflow_id: int) -> WorkflowSchedule:
+    # Read before loading: a write landing meanwhile leaves the schedule tagged stale
+    version = current_version(session, f"{VERSION_PREFIX}{workflow_id}")
+    with _lock:
+        schedule = _schedules.get(workflow_id)
+        if schedule is None or schedule.version != version:
+            schedule = _schedules[workflow_id] = load_schedule(session, workflow_id)
+            schedule.version = version
+        return schedule
+
+
+def invalidate_schedule(session: Session, workflow_id: int):
+    """Mark a workflow's schedule stale in every process; committed with the caller's transaction"""
+    bump_version(session, f"{VERSION_PREFIX}{workflow_id}")
+
+
+def reschedule_task(session: Session, task):
+    """invalidate_schedule for a task's new dates; once committed, this process updates its copy in place"""
+    version = bump_version(session, f"{VERSION_PREFIX}{task.workflow_id}")
+    workflow_id, task_id = task.workflow_id, task.id
+    dates = (task.start_date, task.end_date, task.estimated_hours)
+
+    def update(_):
+        with _lock:
+            schedule = _schedules.get(workflow_id)
+            # Any other gap, or a task it does not know, and the next read reloads it
+            if schedule is None or schedule.version != version - 1 or task_id not in schedule.position:
+                return
+            schedule.reschedule(task_id, *dates)
+            schedule.version = version
+    event.listen(session, "after_commit", update, once=True)
+
+
+def gantt_payload(session: Session, workflow_id: int) -> dict:
+    schedule = get_schedule(session, workflow_id)
+
+    tasks = session.exec(
+        select(Task.id, Task.title, Task.column_id, Task.progress_percentage,
+               Task.start_date, Task.end_date, Task.due_date)
+        .where(Task.workflow_id == workflow_id)
+    ).all()
+
+    payload = []
+    with _lock:
+        for task_id, title, column_id, progress, start_date, end_date, due_date in tasks:
+            if task_id not in schedule.es:
+                continue
+            slack = schedule.slack(task_id)
+            payload.append({
+                "id": task_id,
+                "title": title,
+                "column_id": column_id,
+                "progress": progress,
+                "start_date": start_date,
+                "end_date": end_date,
+                "due_date": due_date,
+                "earliest_start": date.fromordinal(schedule.es[task_id]),
+                "earliest_finish": date.fromordinal(schedule.ef[task_id] - 1),
+                "latest_start": date.fromordinal(schedule.ls[task_id]),
+                "latest_finish": date.fromordinal(schedule.lf[task_id] - 1),
+                "slack_days": slack,
+                "critical": slack == 0,
+                "dependencies": [
+                    {"task_id": predecessor, "lag_days": lag}
+                    for predecessor, lag in schedule.predecessors.get(task_id, ())
+                ]
+            })
+        critical_path = [task_id for task_id in schedule.order if schedule.slack(task_id) == 0]
+        project_start, project_end = schedule.project_start, schedule.project_end
+
+    return {
+        "workflow_id": workflow_id,
+        "project_start": date.fromordinal(project_start),
+        "project_end": date.fromordinal(max(project_end - 1, project_start)),
+        "critical_path": critical_path,
+        "tasks": payload
+    }
@@ -0,0 +1,71 @@
+"""
+Fast JSON path for large list responses.
+
+RowSerializer turns rows into plain dicts with a prebuilt attrgetter or a
+zip over a Core select, skipping response_model validation and the ORM
+identity map. FastJSONResponse encodes with orjson when it is installed and
+falls back to the standard library otherwise.
+"""
+import json
+import operator
+from datetime import date, datetime
+from typing import Any, Iterable, List, Sequence
+
+from fastapi.responses import JSONResponse
+from sqlmodel import select
+
+from models import ActivityLog, ChatMessage, Member, Subtask, Task, Workflow, Workspace
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RowSerializer:
+    def __init__(self, model, exclude: Sequence[str] = ()):
+        self.model = model
+        self.columns = [column for column in model.__table__.columns if column.name not in exclude]
+        self.fields = [column.name for column in self.columns]
+        self._getter = operator.attrgetter(*self.fields)
+
+    def select(self):
+        """A Core select of just the serialized columns, bypassing ORM objects"""
+        return select(*self.columns)
+
+    def from_object(self, obj) -> dict:
+        return dict(zip(self.fields, self._getter(obj)))
+
+    def from_objects(self, objs: Iterable) -> List[dict]:
+        fields, getter = self.fields, self._getter
+        return [dict(zip(fields, getter(obj))) for obj in objs]
+
+    def from_rows(self, rows: Iterable[Sequence]) -> List[dict]:
+        fields = self.fields
+        return [dict(zip(fields, row)) for row in rows]
+
+
+task_serializer = RowSerializer(Task)
+member_serializer = RowSerializer(Member, exclude=("password",))
+subtask_serializer = RowSerializer(Subtask)
+message_serializer = RowSerializer(ChatMessage)
+activity_serializer = RowSerializer(ActivityLog)
+workflow_serializer = RowSerializer(Workflow)
+workspace_serializer = RowSerializer(Workspace)
@@ -0,0 +1,157 @@
+"""
+Soft-deleted tasks and their background purge.
+
+DELETE /tasks/{id} only sets Task.deleted_at, one single-row UPDATE, and
+the task drops out of every read, which all say deleted_at IS NULL and so
+use the partial indexes on live tasks. Until it is purged, POST
+/tasks/{id}/restore brings it back with its column, rank, subtasks,
+messages and attachments.
+
+TrashPurger removes tasks that have been in the trash for
+TRASH_RETENTION_DAYS, with their child rows and attachment files, at most
+TRASH_PURGE_BATCH tasks per transaction and TRASH_PURGE_PAUSE seconds apart,
+so no request waits long for the write lock. It waits for the worker to be
+idle (no request in flight) before each batch; under constant load it still
+purges one batch every TRASH_PURGE_SECONDS so the trash cannot grow forever.
+"""
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, List, Tuple
+
+from sqlalchemy import update
+from sqlmodel import Session, delete, select
+
+from authz import invalidate
+from jobs import handler
+from logs import logger
+from models import (
+    ActivityLog, Attachment, ChatMessage, Notification, Subtask, Task, TaskDependency, TaskMemberLink, ksa_now
+)
+
+TRASH_RETENTION_DAYS = float(os.environ.get("TRASH_RETENTION_DAYS", "30"))
+TRASH_PURGE_SECONDS = float(os.environ.get("TRASH_PURGE_SECONDS", "300"))
+TRASH_PURGE_BATCH = int(os.environ.get("TRASH_PURGE_BATCH", "50"))
+TRASH_PURGE_PAUSE = float(os.environ.get("TRASH_PURGE_PAUSE", "0.05"))
+IDLE_POLL_SECONDS = 0.5
+
+# Rows that belong to one task and go with it
+TASK_CHILDREN = (Notification, Subtask, ChatMessage, ActivityLog, Attachment, TaskMemberLink)
+# Authorization cache scopes holding purged rows
+PURGED_SCOPES = ("task", "subtask", "chatmessage", "attachment")
+
+
+def restore_task(session: Session, task_id: int):
+    """Take a task out of the trash; a Row of id, version, workflow_id, column_id and rank
+
+    Raises LookupError when the task is not in the trash.
+    """
+    table = Task.__table__
+    row = session.exec(
+        update(table)
+        .where(table.c.id == task_id, table.c.deleted_at.is_not(None))
+        .values(deleted_at=None, updated_at=ksa_now(), version=table.c.version + 1)
+        .returning(table.c.id, table.c.version, table.c.workflow_id, table.c.column_id, table.c.rank)
+    ).first()
+    if row is None:
+        raise LookupError(f"Task {task_id} is not in the trash")
+    return row
+
+
+def purge_batch(session: Session, cutoff, limit: int) -> Tuple[int, List[str]]:
+    """Delete up to limit tasks trashed before cutoff with their child rows; (tasks purged, attachment paths)
+
+    The caller commits, then removes the files.
+    """
+    task_ids = session.exec(
+        select(Task.id)
+        .where(Task.deleted_at.is_not(None), Task.deleted_at < cutoff)
+        .order_by(Task.deleted_at)
+        .limit(limit)
+    ).all()
+    if not task_ids:
+        return 0, []
+
+    # Re-checked by every statement, so a task restored meanwhile keeps its children
+    expired = select(Task.id).where(Task.id.in_(task_ids), Task.deleted_at.is_not(None), Task.deleted_at < cutoff)
+    paths = session.exec(select(Attachment.file_path).where(Attachment.task_id.in_(expired))).all()
+    for model in TASK_CHILDREN:
+        session.exec(delete(model).where(model.task_id.in_(expired)))
+    session.exec(delete(TaskDependency).where(
+        TaskDependency.predecessor_id.in_(expired) | TaskDependency.successor_id.in_(expired)
+    ))
+    purged = session.exec(delete(Task).where(Task.id.in_(expired))).rowcount
+    for scope in PURGED_SCOPES:
+        invalidate(session, scope)
+    return purged, list(paths)
+
+
+def remove_files(paths: List[str], prune_dirs: bool = True):
+    """Delete attachment files and, with prune_dirs, the directories they leave empty"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.warning("Could not remove file", extra={"path": path})
+            continue
+        if not prune_dirs:
+            continue
+        try:
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            pass
+
+
+@handler("remove_files")
+def remove_files_job(session: Session, payload: dict):
+    remove_files(payload["paths"], payload.get("prune_dirs", True))
+
+
+class TrashPurger(threading.Thread):
+    """Every interval seconds, purge expired trash in batches while the worker is idle"""
+
+    def __init__(self, engine, idle: Callable[[], bool], retention_days: float = TRASH_RETENTION_DAYS,
+                 batch: int = TRASH_PURGE_BATCH, interval: float = TRASH_PURGE_SECONDS,
+                 pause: float = TRASH_PURGE_PAUSE):
+        super().__init__(name="trash-purger", daemon=True)
+        self.engine, self.idle = engine, idle
+        self.retention_days, self.batch, self.interval, self.pause = retention_days, batch, interval, pause
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.purge()
+            except Exception:
+                logger.exception("Trash purge failed")
+
+    def purge(self) -> int:
+        """Purge batches until no expired task is left; the number of tasks purged"""
+        purged = 0
+        # Past this, one batch goes ahead even though requests keep coming
+        deadline = time.monotonic() + self.interval
+        while not self.stopped.is_set():
+            if not self.idle() and time.monotonic() < deadline:
+                self.stopped.wait(IDLE_POLL_SECONDS)
+                continue
+
+            cutoff = ksa_now() - timedelta(days=self.retention_days)
+            with Session(self.engine) as session:
+                count, paths = purge_batch(session, cutoff, self.batch)
+                session.commit()
+            remove_files(paths)
+            purged += count
+            if count < self.batch:
+                break
+            deadline = time.monotonic() + self.interval
+            self.stopped.wait(self.pause)
+
+        if purged:
+            logger.info("Trash purged", extra={"tasks": purged})
+        return purged
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,57 @@
+"""
+Single-statement conditional updates of Versioned rows.
+
+versioned_update() writes the new values and bumps the version in one
+UPDATE ... RETURNING. When the client named the version it edited (the
+If-Match header), the statement also carries WHERE version = ?, so a stale
+edit changes nothing. The row is only read when no row matched, to tell a
+missing row from a conflicting one.
+
+With fields, only those columns (plus id and version) come back, as a Row,
+and the statement skips the ORM: the PATCH routes use this to answer a
+drag-and-drop move with a few values instead of the whole serialized row.
+The statement is plain UPDATE ... RETURNING, which SQLite (3.35+) and
+PostgreSQL both run.
+"""
+from typing import Iterable, Optional
+
+from sqlalchemy import update
+from sqlmodel import Session
+
+
+class VersionConflict(Exception):
+    def __init__(self, current):
+        super().__init__(f"{type(current).__name__} {current.id} is at version {current.version}")
+        self.current = current
+
+
+def versioned_update(
+    session: Session, model, row_id: int, values: dict, expected_version: Optional[int] = None,
+    fields: Optional[Iterable[str]] = None
+):
+    """Apply values to row_id and return the updated model instance, or a Row of fields
+
+    Raises LookupError when the row does not exist or is in the trash, and
+    VersionConflict, holding the current row, when it is no longer at
+    expected_version.
+    """
+    table = model.__table__
+    target = model if fields is None else table
+    statement = update(target).where(table.c.id == row_id).values(**values, version=table.c.version + 1)
+    if "deleted_at" in table.c:
+        # Rows in the trash are read-only until restored
+        statement = statement.where(table.c.deleted_at.is_(None))
+    if expected_version is not None:
+        statement = statement.where(table.c.version == expected_version)
+    if fields is None:
+        row = session.exec(statement.returning(model)).scalars().first()
+    else:
+        names = ["id", "version", *sorted(set(fields) - {"id", "version"})]
+        row = session.exec(statement.returning(*(table.c[name] for name in names))).first()
+    if row is not None:
+        return row
+
+    current = session.get(model, row_id)
+    if current is None or getattr(current, "deleted_at", None) is not None:
+        raise LookupError(f"{model.__name__} {row_id} not found")
+    raise VersionConflict(current)
@@ -0,0 +1,126 @@
+"""
+Per-member daily allocated hours for a workspace.
+
+Each open, estimated task spreads its estimate evenly over the assignees and
+over the calendar days between its start and due date. Allocations are
+accumulated with a difference array per member (one +rate at the first day,
+one -rate after the last), so the cost is O(assignments + members * days)
+regardless of how long the individual tasks are.
+
+Results are cached per workspace and tagged with its workload:<id>
+CacheVersion row, which writers bump in the same transaction as an
+assignment or a change to a task's dates or estimate. Each read compares
+the tag with the row (a primary-key lookup), so a change made through any
+worker process is seen by all of them.
+"""
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import func, text
+from sqlmodel import Session, select
+
+from cache import KeyedCache, bump_version, current_version
+from models import Member, Task, TaskMemberLink, Workflow, WorkspaceMemberLink
+
+WORKLOAD_FIELDS = {"start_date", "end_date", "due_date", "estimated_hours", "workflow_id", "progress_percentage"}
+
+VERSION_PREFIX = "workload:"
+
+# workspace id, (start, end, capacity) -> (version, workload)
+workload_cache = KeyedCache()
+
+
+def invalidate_workload(session: Session, workspace_id: Optional[int]):
+    """Mark a workspace's workload stale in every process; committed with the caller's transaction"""
+    if workspace_id is not None:
+        bump_version(session, f"{VERSION_PREFIX}{workspace_id}")
+
+
+def invalidate_workflow_workload(session: Session, workflow_id: int):
+    """invalidate_workload for the workspace of a workflow, in one statement"""
+    session.exec(text(
+        "INSERT INTO cacheversion (name, version) "
+        "SELECT :prefix || workspace_id, 1 FROM workflow WHERE id = :workflow_id "
+        "ON CONFLICT (name) DO UPDATE SET version = cacheversion.version + 1"
+    ).bindparams(prefix=VERSION_PREFIX, workflow_id=workflow_id))
+
+
+def compute_workload(session: Session, workspace_id: int, start: date, end: date, capacity: float) -> dict:
+    days = (end - start).days + 1
+
+    first_day = func.coalesce(Task.start_date, Task.due_date, Task.end_date)
+    last_day = func.coalesce(Task.due_date, Task.end_date, Task.start_date)
+
+    assignments = session.exec(
+        select(TaskMemberLink.member_id, Task.id, Task.start_date, Task.end_date,
+               Task.due_date, Task.estimated_hours)
+        .join(Task, Task.id == TaskMemberLink.task_id)
+        .join(Workflow, Workflow.id == Task.workflow_id)
+        .where(
+            Workflow.workspace_id == workspace_id,
+            Task.completed_at.is_(None),
+            Task.deleted_at.is_(None),
+            Task.estimated_hours > 0,
+            first_day <= end,
+            last_day >= start
+        )
+    ).all()
+
+    assignees_per_task = Counter(task_id for _, task_id, _, _, _, _ in assignments)
+
+    diff = defaultdict(lambda: [0.0] * (days + 1))
+    for member_id, task_id, start_date, end_date, due_date, estimated_hours in assignments:
+        task_first = start_date or due_date or end_date
+        task_last = due_date or end_date or start_date
+        if task_last < task_first:
+            task_first, task_last = task_last, task_first
+
+        rate = estimated_hours / assignees_per_task[task_id] / ((task_last - task_first).days + 1)
+        member_diff = diff[member_id]
+        member_diff[max((task_first - start).days, 0)] += rate
+        member_diff[min((task_last - start).days, days - 1) + 1] -= rate
+
+    members = session.exec(
+        select(Member.id, Member.first_name, Member.last_name)
+        .join(WorkspaceMemberLink, WorkspaceMemberLink.member_id == Member.id)
+        .where(WorkspaceMemberLink.workspace_id == workspace_id)
+    ).all()
+    names = {member_id: f"{first_name} {last_name}" for member_id, first_name, last_name in members}
+
+    dates = [start + timedelta(days=offset) for offset in range(days)]
+    result = []
+    for member_id in sorted(set(names) | set(diff)):
+        daily, running = [], 0.0
+        for delta in diff[member_id][:days] if member_id in diff else [0.0] * days:
+            running += delta
+            daily.append(round(max(running, 0.0), 2))
+
+        result.append({
+            "member_id": member_id,
+            "name": names.get(member_id),
+            "daily_hours": daily,
+            "total_hours": round(sum(daily), 2),
+            "peak_hours": max(daily, default=0.0),
+            "overloaded_days": [day for day, hours in zip(dates, daily) if hours > capacity]
+        })
+
+    return {
+        "workspace_id": workspace_id,
+        "start": start,
+        "end": end,
+        "capacity_hours_per_day": capacity,
+        "days": dates,
+        "members": result
+    }
+
+
+def get_workload(session: Session, workspace_id: int, start: date, end: date, capacity: float) -> dict:
+    # Read before computing: a write landing meanwhile leaves the entry tagged stale
+    version = current_version(session, f"{VERSION_PREFIX}{workspace_id}")
+    key = (start, end, capacity)
+    entry = workload_cache.get(workspace_id, key)
+    if entry is None or entry[0] != version:
+        entry = (version, compute_workload(session, workspace_id, start, end, capacity))
+        workload_cache.set(workspace_id, key, entry)
+    return entry[1]
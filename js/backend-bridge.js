@@ -7,9 +7,10 @@ class API {
     const url = new URL(`${BASE_URL}${endpoint}`);
     Object.entries(params).forEach(([k, v]) => v && url.searchParams.set(k, v));
     
+    const token = sessionStorage.getItem('access_token');
     const res = await fetch(url, {
       method,
-      headers: { 'Content-Type': 'application/json' },
+      headers: { 'Content-Type': 'application/json', ...(token && { Authorization: `Bearer ${token}` }) },
       ...(data && { body: JSON.stringify(data) })
     });
     
@@ -24,7 +25,13 @@ class API {
     create: (data) => API.request('POST', '/members', data),
     update: (id, data) => API.request('PUT', `/members/${id}`, data),
     delete: (id) => API.request('DELETE', `/members/${id}`),
-    profile: (id) => API.request('GET', `/member/${id}/profile-picture`)
+    byId: async () => new Map((await API.members.getAll()).map(member => [member.id, member])),
+    profile: (id) => API.request('GET', `/member/${id}/profile-picture`),
+    tasks: (id, cursor = null, limit = 50) => API.request('GET', `/members/${id}/tasks`, null, { cursor, limit }),
+    notifications: (id, beforeId = null, limit = 50) =>
+      API.request('GET', `/members/${id}/notifications`, null, { before_id: beforeId, limit }),
+    unreadNotifications: (id) => API.request('GET', `/members/${id}/notifications/unread-count`),
+    readNotifications: (id, upTo = null) => API.request('POST', `/members/${id}/notifications/read`, { up_to: upTo })
   };
 
   static workspaces = {
@@ -32,7 +39,10 @@ class API {
     get: (id) => API.request('GET', `/workspaces/${id}`),
     create: (data, createdBy) => API.request('POST', `/workspaces?created_by=${createdBy}`, data),
     update: (id, data) => API.request('PUT', `/workspaces/${id}`, data),
-    delete: (id) => API.request('DELETE', `/workspaces/${id}`)
+    delete: (id) => API.request('DELETE', `/workspaces/${id}`),
+    workload: (id, start = null, end = null) => API.request('GET', `/workspaces/${id}/workload`, null, { start, end }),
+    setMember: (id, memberId, role = 'member') => API.request('PUT', `/workspaces/${id}/members/${memberId}`, { role }),
+    removeMember: (id, memberId) => API.request('DELETE', `/workspaces/${id}/members/${memberId}`)
   };
 
   static workflows = {
@@ -40,7 +50,8 @@ class API {
     get: (id) => API.request('GET', `/workflows/${id}`),
     create: (data, createdBy) => API.request('POST', `/workflows?created_by=${createdBy}`, data),
     update: (id, data) => API.request('PUT', `/workflows/${id}`, data),
-    delete: (id) => API.request('DELETE', `/workflows/${id}`)
+    delete: (id) => API.request('DELETE', `/workflows/${id}`),
+    gantt: (id) => API.request('GET', `/workflows/${id}/gantt`)
   };
 
   static tasks = {
@@ -48,7 +59,14 @@ class API {
     get: (id) => API.request('GET', `/tasks/${id}`),
     create: (data, createdBy) => API.request('POST', `/tasks?created_by=${createdBy}`, data),
     update: (id, data) => API.request('PUT', `/tasks/${id}`, data),
+    patch: (id, data) => API.request('PATCH', `/tasks/${id}`, data),
     delete: (id) => API.request('DELETE', `/tasks/${id}`),
+    restore: (id) => API.request('POST', `/tasks/${id}/restore`),
+    trash: (workflowId) => API.request('GET', `/workflows/${workflowId}/trash`),
+    dependencies: (taskId) => API.request('GET', `/tasks/${taskId}/dependencies`),
+    addDependency: (taskId, predecessorId, lagDays = 0) =>
+      API.request('POST', `/tasks/${taskId}/dependencies`, { predecessor_id: predecessorId, lag_days: lagDays }),
+    removeDependency: (taskId, predecessorId) => API.request('DELETE', `/tasks/${taskId}/dependencies/${predecessorId}`),
     assign: (taskId, memberId) => API.request('POST', `/tasks/${taskId}/assign/${memberId}`),
     unassign: (taskId, memberId) => API.request('DELETE', `/tasks/${taskId}/unassign/${memberId}`)
   };
@@ -62,27 +80,19 @@ class API {
 
   static messages = {
       getAll: async (taskId) => {
-        const messages = await API.request('GET', `/chat-messages/${taskId}`);
-
-        const enrichedMessages = await Promise.all(
-          messages.map(async (msg) => {
-            try {
-              const member = await API.members.get(msg.author_id);
-              return {
-                ...msg,
-                author_name: member?.name || `User ${msg.author_id}`
-              };
-            } catch (e) {
-              console.warn(`Failed to resolve author_id: ${msg.author_id}`, e);
-              return {
-                ...msg,
-                author_name: `User ${msg.author_id}`
-              };
-            }
+        // One members read for all authors, not one per message
+        const [messages, members] = await Promise.all([
+          API.request('GET', `/chat-messages/${taskId}`),
+          API.members.byId().catch(e => {
+            console.warn('Failed to resolve message authors', e);
+            return new Map();
           })
-        );
+        ]);
 
-        return enrichedMessages;
+        return messages.map(msg => ({
+          ...msg,
+          author_name: members.get(msg.author_id)?.name || `User ${msg.author_id}`
+        }));
       },
     create: (data, authorId) => API.request('POST', `/chat-messages?author_id=${authorId}`, data),
     delete: (id) => API.request('DELETE', `/chat-messages/${id}`)
@@ -106,7 +116,9 @@ class API {
   };
 
   static assignees = {
-    getAll: (taskId) => API.request('GET', '/assignees', null, { task_id: taskId })
+    getAll: (taskId) => API.request('GET', '/assignees', null, { task_id: taskId }),
+    // { task id: [members] } for every task of the workflow
+    byWorkflow: (workflowId) => API.request('GET', `/workflows/${workflowId}/assignees`)
   }
 
   static attachments = {
@@ -179,21 +191,18 @@ const backendBridge = {
 
   async loadTasks(workflowId) {
     try {
-      const [tasks, templates] = await Promise.all([
+      const [tasks, templates, assigneesByTask] = await Promise.all([
         API.tasks.getAll(workflowId),
-        API.statusTemplates.getAll()
+        API.statusTemplates.getAll(),
+        API.assignees.byWorkflow(workflowId)
       ]);
 
       if (templates.length > 0) {
         this.statusColumns = await API.statusColumns.getAll();
       }
 
-      const assigneesPerTask = await Promise.all(
-        tasks.map(task => API.assignees.getAll(task.id))
-      );
-
       // Transform tasks
-      return tasks.map((task, index) => ({
+      return tasks.map(task => ({
         id: task.id,
         title: task.title || '',
         description: task.description || '',
@@ -208,7 +217,7 @@ const backendBridge = {
         updatedAt: task.updated_at,
         subtasks: task.subtasks || [],
         comments: task.chat_messages || [],
-        assignees: assigneesPerTask[index]
+        assignees: assigneesByTask[task.id] || []
       }));
     } catch (error) {
       console.error('❌ Failed to load tasks:', error);
@@ -291,6 +300,20 @@ const backendBridge = {
     }
   },
 
+  // Drop a card between afterId (the card above) and beforeId (the card below), either may be null
+  async moveTask(taskId, status, afterId, beforeId) {
+    try {
+      return await API.tasks.patch(taskId, {
+        column_id: this.getColumnIdByStatus(status),
+        after_id: afterId,
+        before_id: beforeId
+      });
+    } catch (error) {
+      console.error('❌ Failed to move task:', error);
+      throw error;
+    }
+  },
+
   async deleteTask(taskId) {
     try {
       await API.tasks.delete(taskId);
@@ -338,37 +361,33 @@ const backendBridge = {
 
   async loadTaskLogs(taskId) {
     try {
-      const logs = await API.activities.getAll(null, null, taskId);
-      
-      const enrichedLogs = await Promise.all(
-        logs.map(async (log) => {
-          let memberData = null;
-          
-          if (log.member_id) {
-            try {
-              memberData = await API.members.get(log.member_id);
-            } catch (error) {
-              console.warn(`Failed to fetch member ${log.member_id}:`, error);
-            }
-          }
-          
-          return {
-            id: log.id,
-            action: log.action,
-            entity_type: log.entity_type,
-            entity_id: log.entity_id,
-            description: log.description,
-            created_at: log.created_at,
-            member_id: log.member_id,
-            workspace_id: log.workspace_id,
-            task_id: log.task_id,
-            member_name: memberData ? 
-              `${memberData.first_name} ${memberData.last_name}` : 
-              (log.member_name || null),
-            member_avatar_color: memberData?.avatar_color || null,
-          };
+      const [logs, members] = await Promise.all([
+        API.activities.getAll(null, null, taskId),
+        API.members.byId().catch(error => {
+          console.warn('Failed to fetch members:', error);
+          return new Map();
         })
-      );
+      ]);
+      
+      const enrichedLogs = logs.map(log => {
+        const memberData = log.member_id ? members.get(log.member_id) : null;
+        
+        return {
+          id: log.id,
+          action: log.action,
+          entity_type: log.entity_type,
+          entity_id: log.entity_id,
+          description: log.description,
+          created_at: log.created_at,
+          member_id: log.member_id,
+          workspace_id: log.workspace_id,
+          task_id: log.task_id,
+          member_name: memberData ? 
+            `${memberData.first_name} ${memberData.last_name}` : 
+            (log.member_name || null),
+          member_avatar_color: memberData?.avatar_color || null,
+        };
+      });
       
       return enrichedLogs.sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
       
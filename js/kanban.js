@@ -292,17 +292,35 @@ const kanbanView = {
             
             const taskId = parseInt(e.dataTransfer.getData('text/plain'));
             const newStatus = columnDef.id;
+            const { afterId, beforeId } = kanbanView.dropNeighbours(taskList, taskId, e.clientY);
             
-            kanbanView.moveTask(taskId, newStatus);
+            kanbanView.moveTask(taskId, newStatus, afterId, beforeId);
         });
 
         return column;
     },
 
     /**
-     * Move task to different status with backend integration - FIXED: Use async getTaskById
+     * Cards directly above and below the drop point, skipping the dragged card
      */
-    moveTask: async (taskId, newStatus) => {
+    dropNeighbours: (taskList, taskId, clientY) => {
+        const cards = [...taskList.querySelectorAll('.task-card')]
+            .filter(card => parseInt(card.dataset.taskId) !== taskId);
+        const below = cards.findIndex(card => {
+            const box = card.getBoundingClientRect();
+            return clientY < box.top + box.height / 2;
+        });
+        const index = below === -1 ? cards.length : below;
+        return {
+            afterId: index > 0 ? parseInt(cards[index - 1].dataset.taskId) : null,
+            beforeId: index < cards.length ? parseInt(cards[index].dataset.taskId) : null
+        };
+    },
+
+    /**
+     * Move task to a column, between two of its cards, with backend integration
+     */
+    moveTask: async (taskId, newStatus, afterId = null, beforeId = null) => {
         try {
             const task = await backendBridge.loadTask(taskId);
             if (!task) {
@@ -311,7 +329,6 @@ const kanbanView = {
             }
 
             const oldStatus = task.status;
-            if (oldStatus === newStatus) return;
 
             // Prevent moving tasks TO the temporary redistribution column
             if (newStatus === 'needs_redistribution') {
@@ -319,8 +336,10 @@ const kanbanView = {
                 return;
             }
 
-            // Update task status with backend integration
-            await updateTaskWithState(taskId, { status: newStatus });
+            // One PATCH stores both the column and the position within it
+            await backendBridge.moveTask(taskId, newStatus, afterId, beforeId);
+            const cached = window.app?.currentWorkflowTasks?.find(t => t.id == taskId);
+            if (cached) cached.status = newStatus;
 
             // Show notification
             const oldColumnTitle = oldStatus === 'needs_redistribution' ? 'Needs Redistribution' : 
@@ -329,7 +348,7 @@ const kanbanView = {
             
             if (oldStatus === 'needs_redistribution') {
                 kanbanView.showNotification(`Task redistributed to "${newColumnTitle}"`);
-            } else {
+            } else if (oldStatus !== newStatus) {
                 kanbanView.showNotification(`Task moved from "${oldColumnTitle}" to "${newColumnTitle}"`);
             }
 
@@ -339,6 +358,8 @@ const kanbanView = {
         } catch (error) {
             console.error('Failed to move task:', error);
             kanbanView.showNotification('Failed to move task', 'error');
+            // The board may be stale, e.g. after a concurrent move (409)
+            await kanbanView.render();
         }
     },
 
@@ -539,8 +560,8 @@ const kanbanView = {
             // Create columns
             currentColumns.forEach(columnDef => {
                 const columnTasks = allTasks.filter(task => task.status === columnDef.id);
-                const sortedTasks = this.sortTasks(columnTasks, 'priority');
-                const column = this.createColumn(columnDef, sortedTasks);
+                // Already in board order: the API returns each column sorted by rank
+                const column = this.createColumn(columnDef, columnTasks);
                 domElements.kanbanBoard.appendChild(column);
             });
 